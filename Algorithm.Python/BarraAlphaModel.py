@@ -10,9 +10,111 @@ Date: 2026-02-06
 
 from AlgorithmImports import *
 import json
+import numpy as np
 from pathlib import Path
 
 
+class ColumnarFactorData:
+    """
+    Columnar factor exposures: one float32 matrix [n_stocks, n_factors] per date.
+
+    All dates share one ts_code index and one factor order; missing values are
+    NaN. Compared with {date: {ts_code: {factor: value}}} this stores 4 bytes
+    per value instead of a boxed float plus dictionary entries, and lets a
+    day's scores be computed with a single matrix-vector product.
+    """
+
+    def __init__(self, ts_codes, factors, matrices):
+        """
+        Args:
+            ts_codes: Row labels shared by all matrices
+            factors: Column labels shared by all matrices
+            matrices: Dictionary of {date: array [len(ts_codes), len(factors)]}
+        """
+        self.ts_codes = list(ts_codes)
+        self.factors = list(factors)
+        self.matrices = matrices
+        self._code_index = {code: i for i, code in enumerate(self.ts_codes)}
+
+    @classmethod
+    def from_nested(cls, factor_data):
+        """
+        Convert {date: {ts_code: {factor: value}}} to columnar form.
+
+        Args:
+            factor_data: Nested dictionary of factor exposures
+
+        Returns:
+            ColumnarFactorData with the union of stocks and factors over all dates
+        """
+        ts_codes, factors = {}, {}
+        for factors_today in factor_data.values():
+            for ts_code, stock_factors in factors_today.items():
+                ts_codes.setdefault(ts_code, len(ts_codes))
+                for factor_name in stock_factors:
+                    factors.setdefault(factor_name, len(factors))
+
+        matrices = {}
+        for current_date, factors_today in factor_data.items():
+            matrix = np.full((len(ts_codes), len(factors)), np.nan, dtype=np.float32)
+            for ts_code, stock_factors in factors_today.items():
+                row = matrix[ts_codes[ts_code]]
+                for factor_name, value in stock_factors.items():
+                    if value is not None:
+                        row[factors[factor_name]] = value
+            matrices[current_date] = matrix
+
+        return cls(ts_codes, factors, matrices)
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Wrap a FactorModel.FactorStore without copying.
+
+        Each date's matrix is a view into the store's memory map, so pages are
+        read from disk only when a date is scored.
+        """
+        matrices = {d: store.get_cross_section(d) for d in store.dates}
+        return cls(store.ts_codes, store.factors, matrices)
+
+    def __contains__(self, current_date):
+        return current_date in self.matrices
+
+    def get(self, current_date):
+        """Matrix of a date, or None if the date is missing."""
+        return self.matrices.get(current_date)
+
+    def code_offsets(self, ts_codes):
+        """Row offsets of several ts_codes (-1 for stocks not in the index)."""
+        return np.array([self._code_index.get(code, -1) for code in ts_codes], dtype=np.int64)
+
+    def factor_offsets(self, factor_names):
+        """Column offsets of several factors (-1 for factors not stored)."""
+        index = {name: i for i, name in enumerate(self.factors)}
+        return np.array([index.get(name, -1) for name in factor_names], dtype=np.int64)
+
+    def weight_vector(self, factor_weights):
+        """Weights aligned to self.factors (0 for unweighted factors)."""
+        return np.array([factor_weights.get(f, 0.0) for f in self.factors], dtype=np.float64)
+
+    def as_dict(self, current_date):
+        """
+        One date as {ts_code: {factor: value}}, skipping NaN values.
+
+        Returns:
+            Dictionary, or None if the date is missing
+        """
+        matrix = self.get(current_date)
+        if matrix is None:
+            return None
+        result = {}
+        for ts_code, row in zip(self.ts_codes, matrix.tolist()):
+            stock_factors = {f: v for f, v in zip(self.factors, row) if not math.isnan(v)}
+            if stock_factors:
+                result[ts_code] = stock_factors
+        return result
+
+
 class BarraAlphaModel(AlphaModel):
     """
     Alpha model that generates insights based on Barra CNE5 factor exposures.
@@ -25,15 +127,23 @@ class BarraAlphaModel(AlphaModel):
         - factor_k is the standardized exposure to factor k
     """
 
-    def __init__(self, factor_data, factor_weights=None, insight_period=1):
+    def __init__(self, factor_data, factor_weights=None, insight_period=1, adaptive_weights=None,
+                 signal_smoother=None):
         """
         Initialize the Barra Alpha Model.
 
         Args:
-            factor_data: Dictionary of {date: {ts_code: {factor: value}}}
+            factor_data: ColumnarFactorData, or a dictionary of {date: {ts_code: {factor: value}}}
+                (converted to ColumnarFactorData)
             factor_weights: Dictionary of factor weights (default: equal weight)
             insight_period: Number of days for insight period (default: 1)
+            adaptive_weights: FactorModel.AdaptiveFactorWeights fed with each day's exposures
+                and prices; when given, its weights replace factor_weights
+            signal_smoother: FactorModel.SignalSmoother; when given, scores are EWMA-smoothed
+                and the top-N cut uses its entry/exit rank bands
         """
+        if not isinstance(factor_data, ColumnarFactorData):
+            factor_data = ColumnarFactorData.from_nested(factor_data)
         self.factor_data = factor_data
         self.insight_period = timedelta(days=insight_period)
 
@@ -51,10 +161,17 @@ class BarraAlphaModel(AlphaModel):
             }
         else:
             self.factor_weights = factor_weights
+        self.adaptive_weights = adaptive_weights
+        self.signal_smoother = signal_smoother
 
         # Track last update time
         self.last_update = None
 
+        # Active symbols and their rows in factor_data, rebuilt on universe changes
+        self._active_symbols = None
+        self._active_rows = None
+        self._active_slots = None
+
     def Update(self, algorithm, data):
         """
         Generate insights based on current factor exposures.
@@ -80,24 +197,13 @@ class BarraAlphaModel(AlphaModel):
             algorithm.Debug(f"No factor data available for {current_date}")
             return insights
 
-        factors_today = self.factor_data[current_date]
-
         # Calculate alpha scores for all active securities
-        alpha_scores = {}
-
-        for symbol in algorithm.ActiveSecurities.Keys:
-            ts_code = symbol.Value
-
-            if ts_code not in factors_today:
-                continue
-
-            stock_factors = factors_today[ts_code]
-
-            # Calculate weighted alpha score
-            score = self._calculate_alpha_score(stock_factors)
+        symbols, rows = self._get_active_rows(algorithm)
+        self._observe(algorithm, self.factor_data.get(current_date), symbols, rows)
+        scores = self._smooth(self._calculate_alpha_scores(self.factor_data.get(current_date), rows))
 
-            if score is not None and not math.isnan(score):
-                alpha_scores[symbol] = score
+        alpha_scores = {symbol: float(score) for symbol, score in zip(symbols, scores)
+                        if not math.isnan(score)}
 
         # Generate insights for top/bottom stocks
         if len(alpha_scores) > 0:
@@ -105,35 +211,94 @@ class BarraAlphaModel(AlphaModel):
 
         return insights
 
-    def _calculate_alpha_score(self, stock_factors):
+    def _get_active_rows(self, algorithm):
         """
-        Calculate alpha score for a stock based on factor exposures.
+        Get the active symbols and their rows in factor_data.
+
+        Returns:
+            Tuple (symbols, rows) of the symbols present in factor_data
+        """
+        if self._active_symbols is None:
+            symbols = list(algorithm.ActiveSecurities.Keys)
+            rows = self.factor_data.code_offsets([symbol.Value for symbol in symbols])
+            found = rows >= 0
+            self._active_symbols = [symbol for symbol, ok in zip(symbols, found) if ok]
+            self._active_rows = rows[found]
+            if self.signal_smoother is not None:
+                self._active_slots = self.signal_smoother.positions([s.Value for s in self._active_symbols])
+        return self._active_symbols, self._active_rows
+
+    def _smooth(self, scores):
+        """EWMA-smooth the active securities' scores if a signal smoother is configured."""
+        if self.signal_smoother is None:
+            return scores
+        return self.signal_smoother.smooth(self._active_slots, scores)
+
+    def _select_top(self, sorted_stocks, count):
+        """
+        Take the top `count` of (symbol, score) pairs sorted by descending score.
+
+        With a signal smoother, stocks already selected are kept until they
+        drop out of its exit band, so the selection churns less.
+        """
+        if self.signal_smoother is None:
+            return sorted_stocks[:count]
+        positions = self.signal_smoother.positions([symbol.Value for symbol, _ in sorted_stocks])
+        scores = np.array([score for _, score in sorted_stocks], dtype=np.float64)
+        keep = self.signal_smoother.select(positions, scores, count)
+        return [item for item, selected in zip(sorted_stocks, keep) if selected]
+
+    def _observe(self, algorithm, matrix, symbols, rows):
+        """Feed today's exposures and prices of the active stocks to the adaptive weights."""
+        if self.adaptive_weights is None:
+            return
+        cols = self.factor_data.factor_offsets(self.adaptive_weights.factors)
+        exposures = matrix[rows][:, np.maximum(cols, 0)].astype(np.float64)
+        exposures[:, cols < 0] = np.nan
+        prices = np.array([algorithm.Securities[symbol].Price for symbol in symbols], dtype=np.float64)
+        self.adaptive_weights.update([symbol.Value for symbol in symbols], exposures, prices)
+
+    def _current_weights(self):
+        """Adaptive weights if configured, otherwise the static factor weights."""
+        if self.adaptive_weights is not None:
+            return self.adaptive_weights.get_weights()
+        return self.factor_weights
+
+    def _calculate_alpha_scores(self, matrix, rows):
+        """
+        Calculate alpha scores for several stocks based on factor exposures.
+
+        NaN exposures are skipped: each stock's score is normalized by the total
+        absolute weight of the factors it has values for.
 
         Args:
-            stock_factors: Dictionary of factor values for the stock
+            matrix: Factor matrix of the date [n_stocks, n_factors]
+            rows: Rows of the stocks to score
 
         Returns:
-            Alpha score (float) or None if insufficient data
+            Array of alpha scores (NaN where no weighted factor is available)
         """
-        score = 0.0
-        total_weight = 0.0
+        weights = self.factor_data.weight_vector(self._current_weights())
+        return self._weighted_average(matrix[rows], weights)
 
-        for factor_name, weight in self.factor_weights.items():
-            if factor_name in stock_factors:
-                factor_value = stock_factors[factor_name]
+    @staticmethod
+    def _weighted_average(values, weights):
+        """
+        Weighted sum of each row's non-NaN values, divided by their total absolute weight.
 
-                # Skip NaN values
-                if factor_value is None or math.isnan(factor_value):
-                    continue
+        Args:
+            values: Array [n, k], NaN where missing
+            weights: Array [k]
 
-                score += weight * factor_value
-                total_weight += abs(weight)
+        Returns:
+            Array [n] (NaN for rows without any weighted value)
+        """
+        valid = ~np.isnan(values)
+        score = np.where(valid, values, 0.0) @ weights
+        total_weight = valid @ np.abs(weights)
 
-        # Normalize by total weight
-        if total_weight > 0:
-            return score / total_weight
-        else:
-            return None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total_weight > 0, score / total_weight, np.nan)
 
     def _generate_insights(self, algorithm, alpha_scores):
         """
@@ -157,7 +322,7 @@ class BarraAlphaModel(AlphaModel):
         num_short = max(1, num_stocks // 10)  # Bottom 10%
 
         # Long positions (high alpha scores)
-        for symbol, score in sorted_stocks[:num_long]:
+        for symbol, score in self._select_top(sorted_stocks, num_long):
             insights.append(Insight.Price(
                 symbol,
                 self.insight_period,
@@ -190,6 +355,11 @@ class BarraAlphaModel(AlphaModel):
             algorithm: The algorithm instance
             changes: SecurityChanges object
         """
+        # Active rows are rebuilt on the next update
+        self._active_symbols = None
+        self._active_rows = None
+        self._active_slots = None
+
         # Log additions and removals
         for security in changes.AddedSecurities:
             algorithm.Debug(f"Added to universe: {security.Symbol}")
@@ -197,6 +367,9 @@ class BarraAlphaModel(AlphaModel):
         for security in changes.RemovedSecurities:
             algorithm.Debug(f"Removed from universe: {security.Symbol}")
 
+        if self.signal_smoother is not None:
+            self.signal_smoother.release([security.Symbol.Value for security in changes.RemovedSecurities])
+
 
 class BarraAlphaModelWithConfig(BarraAlphaModel):
     """
@@ -208,7 +381,7 @@ class BarraAlphaModelWithConfig(BarraAlphaModel):
         Initialize with configuration file.
 
         Args:
-            factor_data: Dictionary of factor data
+            factor_data: ColumnarFactorData or dictionary of factor data
             config_path: Path to factor weights JSON file
             insight_period: Number of days for insight period
         """
@@ -249,7 +422,7 @@ class BarraLongOnlyAlphaModel(BarraAlphaModel):
         num_stocks = len(sorted_stocks)
         num_long = max(1, min(50, num_stocks // 5))  # Top 20%, max 50 stocks
 
-        for symbol, score in sorted_stocks[:num_long]:
+        for symbol, score in self._select_top(sorted_stocks, num_long):
             # Only generate insights for positive scores
             if score > 0:
                 insights.append(Insight.Price(
@@ -294,27 +467,13 @@ class BarraRankAlphaModel(BarraAlphaModel):
         if current_date not in self.factor_data:
             return insights
 
-        factors_today = self.factor_data[current_date]
-
-        # Calculate ranks for each factor
-        factor_ranks = self._calculate_factor_ranks(factors_today)
-
-        # Calculate alpha scores based on ranks
-        alpha_scores = {}
+        # Ranks are taken over all stocks of the day, scores only for active securities
+        symbols, rows = self._get_active_rows(algorithm)
+        self._observe(algorithm, self.factor_data.get(current_date), symbols, rows)
+        scores = self._smooth(self._calculate_rank_scores(self.factor_data.get(current_date), rows))
 
-        for symbol in algorithm.ActiveSecurities.Keys:
-            ts_code = symbol.Value
-
-            if ts_code not in factor_ranks:
-                continue
-
-            stock_ranks = factor_ranks[ts_code]
-
-            # Calculate weighted rank score
-            score = self._calculate_rank_score(stock_ranks)
-
-            if score is not None:
-                alpha_scores[symbol] = score
+        alpha_scores = {symbol: float(score) for symbol, score in zip(symbols, scores)
+                        if not math.isnan(score)}
 
         # Generate insights
         if len(alpha_scores) > 0:
@@ -322,74 +481,69 @@ class BarraRankAlphaModel(BarraAlphaModel):
 
         return insights
 
-    def _calculate_factor_ranks(self, factors_today):
+    @staticmethod
+    def _calculate_factor_ranks(values):
         """
-        Calculate percentile ranks for each factor.
+        Calculate percentile ranks of every column at once.
+
+        Tied values get the average of their ranks; NaN values are not ranked.
 
         Args:
-            factors_today: Dictionary of {ts_code: {factor: value}}
+            values: Array [n_stocks, n_factors], NaN where missing
 
         Returns:
-            Dictionary of {ts_code: {factor: rank}}
+            Array [n_stocks, n_factors] of ranks from 0 to 1 (0.5 for a column
+            with a single value), NaN where the input is NaN
         """
-        import numpy as np
-
-        # Collect factor values for all stocks
-        factor_values = {}
-        for factor_name in self.factor_weights.keys():
-            values = []
-            ts_codes = []
-
-            for ts_code, factors in factors_today.items():
-                if factor_name in factors:
-                    value = factors[factor_name]
-                    if value is not None and not math.isnan(value):
-                        values.append(value)
-                        ts_codes.append(ts_code)
-
-            if len(values) > 0:
-                # Calculate percentile ranks (0 to 1)
-                ranks = np.argsort(np.argsort(values)) / (len(values) - 1) if len(values) > 1 else [0.5] * len(values)
-                factor_values[factor_name] = dict(zip(ts_codes, ranks))
-
-        # Reorganize by ts_code
-        factor_ranks = {}
-        for ts_code in factors_today.keys():
-            factor_ranks[ts_code] = {}
-            for factor_name in self.factor_weights.keys():
-                if factor_name in factor_values and ts_code in factor_values[factor_name]:
-                    factor_ranks[ts_code][factor_name] = factor_values[factor_name][ts_code]
-
-        return factor_ranks
-
-    def _calculate_rank_score(self, stock_ranks):
+        n, k = values.shape
+        if n == 0 or k == 0:
+            return np.full(values.shape, np.nan)
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+
+        # Sort each factor's values (NaN replaced by inf: NaN makes argsort several times
+        # slower) and work on the flattened [n_factors * n_stocks] sorted order
+        filled = np.where(valid, values, np.inf).T
+        flat_order = (np.argsort(filled, axis=1) + (np.arange(k) * n)[:, None]).ravel()
+        ordered = filled.ravel()[flat_order]
+
+        # Runs of equal values within a factor share the average of their positions
+        starts = np.empty(n * k, dtype=bool)
+        np.not_equal(ordered[1:], ordered[:-1], out=starts[1:])
+        starts[::n] = True
+        run_first = np.flatnonzero(starts)
+        run_last = np.append(run_first[1:], n * k) - 1
+        column = run_first // n
+        first = run_first - column * n
+        # The run of inf padding must not stretch the rank of real values past the last one
+        last = np.minimum(run_last - column * n, count[column] - 1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            run_rank = np.where(count[column] > 1, (first + last) / (2.0 * (count[column] - 1)), 0.5)
+
+        ranks = np.empty(n * k)
+        ranks[flat_order] = run_rank[np.cumsum(starts) - 1]
+        ranks = ranks.reshape(k, n).T
+        ranks[~valid] = np.nan
+        return ranks
+
+    def _calculate_rank_scores(self, matrix, rows):
         """
-        Calculate alpha score based on factor ranks.
+        Calculate rank-based alpha scores.
+
+        Ranks are mapped to -1..1 and combined with the signed factor weights,
+        so a negative weight prefers low ranks.
 
         Args:
-            stock_ranks: Dictionary of {factor: rank}
+            matrix: Factor matrix of the date [n_stocks, n_factors]
+            rows: Rows of the stocks to score
 
         Returns:
-            Rank-based alpha score
+            Array of alpha scores (NaN where no weighted factor is available)
         """
-        score = 0.0
-        total_weight = 0.0
-
-        for factor_name, weight in self.factor_weights.items():
-            if factor_name in stock_ranks:
-                rank = stock_ranks[factor_name]
+        weights = self.factor_data.weight_vector(self._current_weights())
+        weighted = np.flatnonzero(weights)
 
-                # Convert rank to score (-1 to 1)
-                # For negative weights, invert the rank
-                if weight < 0:
-                    rank_score = -(rank - 0.5) * 2
-                else:
-                    rank_score = (rank - 0.5) * 2
-
-                score += abs(weight) * rank_score
-                total_weight += abs(weight)
-
-        if total_weight > 0:
-            return score / total_weight
-        else:
-            return None
+        ranks = self._calculate_factor_ranks(matrix[:, weighted])
+        rank_scores = (ranks[rows] - 0.5) * 2
+        return self._weighted_average(rank_scores, weights[weighted])
@@ -27,6 +27,10 @@ Key features:
 
 from AlgorithmImports import *
 from FactorModel.BarraCNE5Model import BarraCNE5Model
+from FactorModel.IndexConstituents import IndexConstituents
+from FactorModel.AdaptiveFactorWeights import AdaptiveFactorWeights
+from FactorModel.SignalSmoother import SignalSmoother
+from FactorModel.FactorCovariance import FactorCovariance
 from datetime import timedelta
 import json
 import pandas as pd
@@ -41,7 +45,10 @@ class BarraAlphaModel(AlphaModel):
     with pre-specified weights. The alpha score is then converted into price insights.
     """
 
-    def __init__(self, factor_model: BarraCNE5Model, factor_weights: dict, insight_period: timedelta = None):
+    def __init__(self, factor_model: BarraCNE5Model, factor_weights: dict, insight_period: timedelta = None,
+                 adaptive_weights: Optional[AdaptiveFactorWeights] = None,
+                 signal_smoother: Optional[SignalSmoother] = None,
+                 selection_count: Optional[int] = None):
         """
         Initialize the Barra alpha model.
 
@@ -49,12 +56,34 @@ class BarraAlphaModel(AlphaModel):
             factor_model: BarraCNE5Model instance for accessing factor data
             factor_weights: Dictionary mapping factor names to weights (e.g., {'momentum': 0.3, 'size': -0.2})
             insight_period: Duration for which insights are valid (default: 30 days)
+            adaptive_weights: Rolling-IC weights fed with each day's exposures and prices;
+                when given, they replace factor_weights
+            signal_smoother: EWMA smoothing of alpha scores across days; insights are only
+                emitted for the stocks it selects by smoothed |alpha| (with hysteresis)
+            selection_count: Entry band of the smoother's selection (default: the top
+                10% of the scored securities)
         """
         self.factor_model = factor_model
         self.factor_weights = factor_weights
+        self.adaptive_weights = adaptive_weights
+        self.signal_smoother = signal_smoother
+        self.selection_count = selection_count
         self.insight_period = insight_period or timedelta(days=30)
+        self._last_reload_check = None
+        self._last_observed = None  # date of the last observation fed to adaptive_weights
+        self._last_smoothed = None  # date of the last observation fed to signal_smoother
+        # Active securities and aligned per-security state; _positions maps a symbol to its row
         self.securities = []
-        self.last_emit_date = {}
+        self._positions = {}
+        self._ts_codes = []
+        self._last_emit = np.empty(0)  # UTC timestamp of the last insight, -inf if none
+        self._slots = np.empty(0, dtype=np.int64)  # signal_smoother slot of each row
+
+        # Alphas of the active securities and the rows to emit insights for,
+        # computed once per (date, model version)
+        self._alpha_key = None
+        self._alphas = None
+        self._signals = None
 
         # Validate factor weights
         style_factors = set(factor_model.get_style_factors())
@@ -78,54 +107,99 @@ class BarraAlphaModel(AlphaModel):
         insights = []
         current_date = algorithm.Time.date()
 
-        # Get factor data for current date
-        factor_df = self.factor_model.get_factor_data(current_date)
-
-        if factor_df is None:
-            # Try previous trading day if today's data not available
-            for i in range(1, 6):
-                prev_date = current_date - timedelta(days=i)
-                factor_df = self.factor_model.get_factor_data(prev_date)
-                if factor_df is not None:
-                    break
-
-        if factor_df is None:
+        # Switch to a reloaded model once a day, on the algorithm thread and before
+        # any reads of this step, so alpha and portfolio construction see one version
+        if current_date != self._last_reload_check:
+            self._last_reload_check = current_date
+            if self.factor_model.apply_pending_reload():
+                algorithm.debug(f"Factor model reloaded: version {self.factor_model.version}, "
+                                f"estimated {self.factor_model.get_estimation_date()}")
+
+        # Exposures are constant within a day: score once per day (and again after a
+        # reload or a universe change) and reuse the alphas for the day's other slices
+        key = (current_date, self.factor_model.version)
+        if key != self._alpha_key:
+            self._alpha_key = key
+            self._alphas, self._signals = self._score(current_date)
+        if self._alphas is None:
             return insights
+        alphas = self._alphas
 
-        # Generate insights for each security
-        for security in self.securities:
-            if security.price == 0:
-                continue
-
-            symbol = security.symbol
-            ts_code = self._symbol_to_ts_code(symbol)
-
-            if ts_code not in factor_df.index:
-                continue
-
-            # Check if we should emit new insight
-            if not self._should_emit_insight(algorithm.utc_time, symbol):
-                continue
-
-            # Calculate composite alpha score
-            alpha = self._calculate_alpha(factor_df.loc[ts_code])
+        now = algorithm.utc_time.timestamp()
+        # Only emit if alpha is significant and the previous insight has expired
+        emit = self._signals & self._should_emit_insight(now)
 
+        for i in np.flatnonzero(emit):
             # Convert alpha to insight direction and magnitude
-            if abs(alpha) > 0.01:  # Only emit if alpha is significant
-                direction = InsightDirection.UP if alpha > 0 else InsightDirection.DOWN
-                magnitude = min(abs(alpha), 1.0)  # Cap magnitude at 100%
+            alpha = alphas[i]
+            direction = InsightDirection.UP if alpha > 0 else InsightDirection.DOWN
+            magnitude = min(abs(float(alpha)), 1.0)  # Cap magnitude at 100%
+
+            insights.append(Insight.price(
+                self.securities[i].symbol,
+                self.insight_period,
+                direction,
+                magnitude,
+                magnitude  # Use magnitude as confidence
+            ))
+
+        self._last_emit[emit] = now
+        return insights
 
-                insights.append(Insight.price(
-                    symbol,
-                    self.insight_period,
-                    direction,
-                    magnitude,
-                    magnitude  # Use magnitude as confidence
-                ))
+    def _score(self, current_date) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Align the day's factor frame with the active securities and score them.
 
-                self.last_emit_date[symbol] = algorithm.utc_time
+        Args:
+            current_date: Algorithm date
 
-        return insights
+        Returns:
+            Tuple (alphas, signals) aligned with self.securities: the (smoothed) alpha
+            scores and the rows to emit insights for; (None, None) if there is no factor data
+        """
+        # Get factor data for current date, or the latest trading day within 5 days
+        factor_df = self.factor_model.get_factor_data_asof(current_date, timedelta(days=5))
+
+        if factor_df is None or not self.securities:
+            return None, None
+
+        prices = np.fromiter((security.price for security in self.securities), dtype=float,
+                             count=len(self.securities))
+
+        if self.adaptive_weights is not None:
+            factors = self.adaptive_weights.factors
+            exposures = factor_df.reindex(index=self._ts_codes, columns=factors).to_numpy(dtype=float)
+            if current_date != self._last_observed:
+                # Pairs yesterday's exposures with today's returns and refreshes the weights
+                self.adaptive_weights.update(self._ts_codes, exposures, prices)
+                self._last_observed = current_date
+            weights = self.adaptive_weights.get_weight_vector()
+        else:
+            factors = [f for f in self.factor_weights if f in factor_df.columns]
+            exposures = factor_df.reindex(index=self._ts_codes, columns=factors).to_numpy(dtype=float)
+            weights = np.array([self.factor_weights[f] for f in factors], dtype=float)
+        alphas = self._calculate_alpha(exposures, weights)
+
+        if self.signal_smoother is None:
+            return alphas, (prices != 0) & (np.abs(alphas) > 0.01)
+
+        # One EWMA step and one selection per day; re-scoring later in the same day
+        # (reload or universe change) reuses them instead of stepping again
+        new_day = current_date != self._last_smoothed
+        if new_day:
+            alphas = self.signal_smoother.smooth(self._slots, alphas)
+        else:
+            alphas = self.signal_smoother.current(self._slots, alphas)
+
+        significant = (prices != 0) & (np.abs(alphas) > 0.01)
+        if new_day:
+            # Held stocks stay selected until they drop out of the wider exit band
+            scored = int((~np.isnan(alphas)).sum())
+            count = self.selection_count if self.selection_count is not None else max(1, scored // 10)
+            strength = np.where(significant, np.abs(alphas), np.nan)
+            self.signal_smoother.select(self._slots, strength, count)
+            self._last_smoothed = current_date
+        return alphas, significant & self.signal_smoother.selected(self._slots)
 
     def on_securities_changed(self, algorithm: QCAlgorithm, changes: SecurityChanges) -> None:
         """
@@ -135,52 +209,78 @@ class BarraAlphaModel(AlphaModel):
             algorithm: The algorithm instance
             changes: Security additions and removals
         """
-        for added in changes.added_securities:
-            if added not in self.securities:
-                self.securities.append(added)
-
-        for removed in changes.removed_securities:
-            if removed in self.securities:
-                self.securities.remove(removed)
-            if removed.symbol in self.last_emit_date:
-                del self.last_emit_date[removed.symbol]
+        # Cached alphas are aligned with the rows, which change below
+        self._alpha_key = None
+
+        added = 0
+        for security in changes.added_securities:
+            if security.symbol not in self._positions:
+                self._positions[security.symbol] = len(self.securities)
+                self.securities.append(security)
+                self._ts_codes.append(self._symbol_to_ts_code(security.symbol))
+                added += 1
+        if added:
+            self._last_emit = np.concatenate([self._last_emit, np.full(added, -np.inf)])
+            if self.signal_smoother is not None:
+                new_slots = self.signal_smoother.positions(self._ts_codes[-added:])
+                self._slots = np.concatenate([self._slots, new_slots])
+
+        for security in changes.removed_securities:
+            i = self._positions.pop(security.symbol, None)
+            if i is None:
+                continue
+            # Move the last row into the removed slot so removal is O(1)
+            last = len(self.securities) - 1
+            if i != last:
+                moved = self.securities[last]
+                self.securities[i] = moved
+                self._ts_codes[i] = self._ts_codes[last]
+                self._last_emit[i] = self._last_emit[last]
+                if self.signal_smoother is not None:
+                    self._slots[i] = self._slots[last]
+                self._positions[moved.symbol] = i
+            self.securities.pop()
+            self._ts_codes.pop()
+            self._last_emit = self._last_emit[:last]
+            self._slots = self._slots[:last]
+
+        if self.signal_smoother is not None:
+            self.signal_smoother.release([self._symbol_to_ts_code(s.symbol) for s in changes.removed_securities])
+
+    def _should_emit_insight(self, now: float) -> np.ndarray:
+        """
+        Check which securities should emit a new insight.
 
-    def _should_emit_insight(self, utc_time: datetime, symbol: Symbol) -> bool:
-        """Check if we should emit a new insight for this symbol."""
-        last_emit = self.last_emit_date.get(symbol)
-        if last_emit is None:
-            return True
+        Args:
+            now: Current UTC timestamp
 
+        Returns:
+            Boolean array aligned with self.securities
+        """
         # Only emit if previous insight has expired
-        return (utc_time - last_emit) >= self.insight_period
+        return (now - self._last_emit) >= self.insight_period.total_seconds()
 
-    def _calculate_alpha(self, factor_row: pd.Series) -> float:
+    def _calculate_alpha(self, exposures: np.ndarray, weights: np.ndarray) -> np.ndarray:
         """
-        Calculate composite alpha score from factor exposures.
+        Calculate composite alpha scores from factor exposures.
 
         Args:
-            factor_row: Series containing factor exposures for a single security
+            exposures: Factor exposures [n_securities, n_factors], NaN where missing
+            weights: Factor weights [n_factors]
 
         Returns:
-            Composite alpha score
+            Composite alpha scores [n_securities] (NaN where no factor is available)
         """
-        alpha = 0.0
-        total_weight = 0.0
+        valid = ~np.isnan(exposures)
+        alpha = np.where(valid, exposures, 0.0) @ weights
+        total_weight = valid @ np.abs(weights)
 
-        for factor, weight in self.factor_weights.items():
-            if factor in factor_row and pd.notna(factor_row[factor]):
-                alpha += weight * factor_row[factor]
-                total_weight += abs(weight)
-
-        # Normalize by total weight if any weights were applied
-        if total_weight > 0:
-            alpha = alpha / total_weight
+        # Normalize by total weight; securities without any exposure get no score
+        alpha = np.divide(alpha, total_weight, out=np.full_like(alpha, np.nan), where=total_weight > 0)
 
         # Z-score style: normalize by dividing by approximate std
         # Most factors have std around 0.5-1.0 after winsorization
-        alpha = alpha / 0.5
-
-        return alpha
+        return alpha / 0.5
 
     def _symbol_to_ts_code(self, symbol: Symbol) -> str:
         """Convert LEAN Symbol to tushare ts_code format."""
@@ -288,79 +388,51 @@ class BarraPortfolioConstructionModel(PortfolioConstructionModel):
                  |w_i| <= max_position
                  industry_neutral constraints
         """
-        # Get current date's factor exposures
-        current_date = algorithm.time.date()
-        factor_df = self.factor_model.get_factor_data(current_date)
-
-        if factor_df is None:
+        # Get current date's factor exposures (style and industry factors),
+        # falling back to the latest trading day within 5 days
+        current_date = self.factor_model.asof(algorithm.time.date(), timedelta(days=5))
+        factors = self.factor_model.get_factor_list()
+        ts_codes = [self._symbol_to_ts_code(insight.symbol) for insight in insights]
+        exposure_data = None
+        if current_date is not None:
+            exposure_data = self.factor_model.get_exposure_matrix(current_date, ts_codes, factors)
+
+        if exposure_data is None:
             # Fall back to equal weight if no factor data
             n = len(insights)
             weight = 1.0 / n if n > 0 else 0
             return {i.symbol: weight for i in insights}
 
-        # Build alpha vector and exposure matrix
-        symbols = []
-        alphas = []
-        exposures = []
-
-        industry_factors = self.factor_model.get_industry_factors()
-
-        for insight in insights:
-            ts_code = self._symbol_to_ts_code(insight.symbol)
-            if ts_code not in factor_df.index:
-                continue
-
-            symbols.append(insight.symbol)
-            # Alpha from insight (direction * magnitude * confidence)
-            alpha = float(insight.direction) * insight.magnitude * (insight.confidence or 1.0)
-            alphas.append(alpha)
-
-            # Get factor exposures (style factors only for risk calculation)
-            style_row = factor_df.loc[ts_code]
-            style_exposures = [style_row.get(f, 0) for f in self.factor_model.get_style_factors()]
-            exposures.append(style_exposures)
-
-        if not symbols:
+        exposures, valid = exposure_data
+        if not valid.any():
             return {}
 
+        # Alpha from insight (direction * magnitude * confidence)
+        alphas = np.array([float(i.direction) * i.magnitude * (i.confidence or 1.0) for i in insights])
+
+        symbols = [insight.symbol for insight, ok in zip(insights, valid) if ok]
+        ts_codes = [ts_code for ts_code, ok in zip(ts_codes, valid) if ok]
+        alphas = alphas[valid]
+        exposures = exposures[valid]
         n = len(symbols)
-        alphas = np.array(alphas)
-        exposures = np.array(exposures)
-
-        # Get factor covariance matrix
-        cov_dict = risk_params.get('factor_covariance', {})
-        style_factors = self.factor_model.get_style_factors()
-        k = len(style_factors)
-
-        # Build factor covariance matrix
-        F = np.zeros((k, k))
-        for i, f1 in enumerate(style_factors):
-            for j, f2 in enumerate(style_factors):
-                if f1 in cov_dict and f2 in cov_dict[f1]:
-                    F[i, j] = cov_dict[f1][f2]
-
-        # Calculate asset covariance: Σ = X*F*X' + D
-        # where D is diagonal matrix of specific risks
-        specific_variances = np.zeros(n)
-        for i, symbol in enumerate(symbols):
-            ts_code = self._symbol_to_ts_code(symbol)
-            specific_risk = self.factor_model.get_specific_risk(ts_code)
-            specific_variances[i] = specific_risk ** 2
 
-        # Σ = XFX' + diag(specific_variances)
-        asset_cov = exposures @ F @ exposures.T + np.diag(specific_variances)
+        # Factor covariance matrix (cached by the factor model); factors missing
+        # from the risk parameters have zero covariance
+        F = self.factor_model.get_factor_covariance_array(factors)
 
-        # Add regularization for numerical stability
-        asset_cov += np.eye(n) * 1e-6
+        # Asset covariance Σ = XFX' + D, where D is diagonal matrix of specific risks.
+        # Kept in factored form: solves cost O(nK²) instead of O(n³) for a dense inverse
+        specific_variances = self.factor_model.get_specific_variances(ts_codes)
 
         # Simple optimization: w = Σ^(-1) * α (normalized)
         # For more complex optimization, use cvxpy
         try:
-            inv_cov = np.linalg.inv(asset_cov)
-            raw_weights = inv_cov @ alphas
+            # Regularization (ridge) for numerical stability
+            asset_cov = FactorCovariance(exposures, F, specific_variances, ridge=1e-6)
+            raw_weights = asset_cov.solve(alphas)
 
             # Normalize to sum to 1 (long-only constraint)
-            sum_positive = sum(w for w in raw_weights if w > 0)
+            sum_positive = raw_weights[raw_weights > 0].sum()
             if sum_positive > 0:
                 weights = np.maximum(raw_weights, 0) / sum_positive
             else:
@@ -502,7 +574,7 @@ class BarraCNE5Algorithm(QCAlgorithm):
     Main algorithm class for Barra CNE5 factor-based trading strategy.
 
     This algorithm implements a complete factor-based trading system:
-    1. Uses CSI 300 as the universe
+    1. Uses point-in-time CSI 300 constituents as the universe
     2. Generates alpha from Barra style factors
     3. Optimizes portfolio using Barra risk model
     4. Rebalances monthly with risk controls
@@ -520,23 +592,42 @@ class BarraCNE5Algorithm(QCAlgorithm):
         # 2. Initialize Barra CNE5 factor model
         self.factor_model = BarraCNE5Model(
             factor_data_dir="/data/barra_factors/by_date",
-            risk_params_file="/data/barra_risk/risk_params_latest.json"
+            risk_params_file="/data/barra_risk/risk_params_latest.json",
+            factor_store_dir="/data/barra_factors/store"
         )
+        if self.live_mode:
+            # Pick up the nightly pipeline output; the alpha model applies it on the next day
+            self.factor_model.start_reload_watcher(interval=300)
 
         # 3. Load factor weights configuration
         self.factor_weights = self._load_factor_weights()
 
-        # 4. Load CSI 300 universe
-        universe_symbols = self._load_csi300_universe()
-
-        # 5. Set up universe selection
-        self.set_universe_selection(ManualUniverseSelectionModel(universe_symbols))
+        # 4. Load point-in-time CSI 300 constituents
+        self.constituents = self._load_index_constituents()
+
+        # 5. Set up universe selection: constituents as of each month start,
+        #    falling back to the static list when no history is available
+        if self.constituents is not None:
+            self.set_universe_selection(ScheduledUniverseSelectionModel(
+                self.date_rules.month_start(),
+                self.time_rules.at(0, 0),
+                self._select_constituents
+            ))
+            universe_size = len(self.constituents.get_members(self.start_date))
+        else:
+            universe_symbols = self._load_csi300_universe()
+            self.set_universe_selection(ManualUniverseSelectionModel(universe_symbols))
+            universe_size = len(universe_symbols)
 
         # 6. Set up Framework models
+        signal_smoother, selection_count = self._load_signal_smoother()
         self.set_alpha(BarraAlphaModel(
             self.factor_model,
             self.factor_weights,
-            timedelta(days=30)
+            timedelta(days=30),
+            adaptive_weights=self._load_adaptive_weights(),
+            signal_smoother=signal_smoother,
+            selection_count=selection_count
         ))
 
         self.set_portfolio_construction(BarraPortfolioConstructionModel(
@@ -566,7 +657,7 @@ class BarraCNE5Algorithm(QCAlgorithm):
         # Logging
         self.debug("Barra CNE5 Algorithm Initialized")
         self.debug(f"Factor weights: {self.factor_weights}")
-        self.debug(f"Universe size: {len(universe_symbols)}")
+        self.debug(f"Universe size: {universe_size}")
 
     def _load_factor_weights(self) -> dict:
         """Load factor weights from configuration file."""
@@ -594,6 +685,76 @@ class BarraCNE5Algorithm(QCAlgorithm):
 
         return default_weights
 
+    def _load_config_section(self, name: str) -> Optional[dict]:
+        """Read an optional section of factor_weights.json."""
+        config_path = "/data/barra_config/factor_weights.json"
+        try:
+            if System.IO.file.exists(config_path):
+                with open(config_path, 'r') as f:
+                    return json.load(f).get(name)
+        except Exception as e:
+            self.debug(f"Failed to load '{name}' configuration: {e}")
+        return None
+
+    def _load_adaptive_weights(self) -> Optional[AdaptiveFactorWeights]:
+        """
+        Create rolling-IC factor weights if enabled in the configuration file.
+
+        The "adaptive_weights" section of factor_weights.json holds the
+        AdaptiveFactorWeights arguments, e.g. {"method": "mvo", "window": 60, "shrinkage": 0.3};
+        the static factor weights serve as the prior.
+        """
+        settings = self._load_config_section('adaptive_weights')
+        if not settings:
+            return None
+        try:
+            return AdaptiveFactorWeights(
+                self.factor_model.get_style_factors(),
+                prior_weights=self.factor_weights,
+                **settings
+            )
+        except Exception as e:
+            self.debug(f"Failed to create adaptive factor weights: {e}")
+            return None
+
+    def _load_signal_smoother(self) -> Tuple[Optional[SignalSmoother], Optional[int]]:
+        """
+        Create alpha score smoothing if enabled in the configuration file.
+
+        The "signal_smoothing" section of factor_weights.json holds the
+        SignalSmoother arguments plus an optional "count", the number of stocks
+        the alpha model selects, e.g. {"halflife": 5, "exit_buffer": 1.5, "count": 60}.
+
+        Returns:
+            Tuple (smoother, selection count); (None, None) when disabled
+        """
+        settings = self._load_config_section('signal_smoothing')
+        if not settings:
+            return None, None
+        settings = dict(settings)
+        count = settings.pop('count', None)
+        try:
+            return SignalSmoother(**settings), count
+        except Exception as e:
+            self.debug(f"Failed to create signal smoother: {e}")
+            return None, None
+
+    def _load_index_constituents(self) -> Optional[IndexConstituents]:
+        """Load point-in-time CSI 300 constituents built from index_weight history."""
+        config_path = "/data/barra_config/index_constituents.parquet"
+        try:
+            if System.IO.file.exists(config_path):
+                constituents = IndexConstituents.from_file(config_path, '000300.SH')
+                if constituents.snapshot_dates:
+                    return constituents
+        except Exception as e:
+            self.debug(f"Failed to load index constituents: {e}")
+        return None
+
+    def _select_constituents(self, date_time: datetime) -> list:
+        """Universe selector: CSI 300 constituents as of the selection date."""
+        return self._create_symbol_list(self.constituents.get_members(date_time))
+
     def _load_csi300_universe(self) -> list:
         """Load CSI 300 constituent stocks."""
         # Default CSI 300 sample (actual list should be loaded from file)
@@ -660,4 +821,5 @@ class BarraCNE5Algorithm(QCAlgorithm):
 
     def on_end_of_algorithm(self):
         """Called when algorithm ends."""
+        self.factor_model.close()
         self.debug("Barra CNE5 Algorithm completed")
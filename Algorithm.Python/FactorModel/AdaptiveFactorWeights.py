@@ -0,0 +1,230 @@
+# QUANTCONNECT.COM - Democratizing Finance, Empowering Individuals.
+# Lean Algorithmic Trading Engine v2.0. Copyright 2014 QuantConnect Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+FactorModel Framework - Adaptive Factor Weights
+
+This module derives alpha factor weights from rolling information
+coefficients (IC): the daily cross-sectional correlation between factor
+exposures and the next day's realised returns.
+"""
+
+from AlgorithmImports import *
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class AdaptiveFactorWeights:
+    """
+    Rolling IC estimates and the factor weights derived from them.
+
+    Each observation costs O(factors x stocks) for the ICs plus O(factors^2)
+    to roll the window: the running sum and sum of outer products are updated
+    by adding the new IC vector and subtracting the one leaving the window.
+    Weights are recomputed after every observation, so reading them at
+    rebalance time is free.
+
+    Methods:
+        'ic':   w proportional to mean IC
+        'icir': w proportional to mean IC / IC standard deviation
+        'mvo':  w proportional to inverse(IC covariance) @ mean IC, with the
+                covariance shrunk towards its diagonal by `shrinkage`
+
+    Weights are scaled so that their absolute values sum to 1. Until
+    `min_periods` observations are available, or while the ICs carry no
+    signal, the prior weights are used.
+    """
+
+    METHODS = ('ic', 'icir', 'mvo')
+
+    # Minimum number of stocks with both an exposure and a return for a factor's IC
+    MIN_STOCKS = 10
+
+    def __init__(self, factors: List[str], window: int = 60, method: str = 'icir',
+                 shrinkage: float = 0.0, min_periods: int = 20,
+                 prior_weights: Optional[Dict[str, float]] = None):
+        """
+        Initialize the adaptive weights.
+
+        Args:
+            factors: Factor names, in the column order of the exposures passed in
+            window: Number of daily ICs in the rolling window
+            method: 'ic', 'icir' or 'mvo'
+            shrinkage: Weight of the diagonal target in the IC covariance (0 to 1, 'mvo' only)
+            min_periods: Observations required before adaptive weights are used
+            prior_weights: Weights used until min_periods is reached (default: equal weight)
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"AdaptiveFactorWeights: Unknown method '{method}'")
+        if not 0.0 <= shrinkage <= 1.0:
+            raise ValueError("AdaptiveFactorWeights: shrinkage must be between 0 and 1")
+
+        self.factors = list(factors)
+        self.window = window
+        self.method = method
+        self.shrinkage = shrinkage
+        self.min_periods = max(2, min(min_periods, window))
+
+        k = len(self.factors)
+        self._ics = np.zeros((window, k))  # ring buffer of daily ICs
+        self._count = 0                    # observations in the window
+        self._next = 0                     # ring buffer slot for the next observation
+        self._sum = np.zeros(k)
+        self._outer_sum = np.zeros((k, k))
+
+        prior = prior_weights or {f: 1.0 for f in self.factors}
+        self._prior = self._normalize(np.array([prior.get(f, 0.0) for f in self.factors], dtype=float))
+        self._weights = self._prior
+
+        # Exposures and prices of the previous update() call, to pair with the next returns
+        self._last_index = None
+        self._last_exposures = None
+        self._last_prices = None
+
+    @staticmethod
+    def _normalize(weights: np.ndarray) -> np.ndarray:
+        total = np.abs(weights).sum()
+        return weights / total if total > 0 else weights
+
+    @classmethod
+    def information_coefficients(cls, exposures: np.ndarray, returns: np.ndarray) -> np.ndarray:
+        """
+        Cross-sectional Pearson correlation of each factor with returns.
+
+        Args:
+            exposures: Array [n_stocks, n_factors], NaN where missing
+            returns: Array [n_stocks], NaN where missing
+
+        Returns:
+            Array [n_factors]; 0 for factors with fewer than MIN_STOCKS observations
+            or no dispersion
+        """
+        valid = ~np.isnan(exposures) & ~np.isnan(returns)[:, None]
+        x = np.where(valid, exposures, 0.0)
+        r = np.where(valid, np.nan_to_num(returns)[:, None], 0.0)
+
+        n = valid.sum(axis=0)
+        sx, sr = x.sum(axis=0), r.sum(axis=0)
+        cov = n * (x * r).sum(axis=0) - sx * sr
+        var_x = n * (x * x).sum(axis=0) - sx * sx
+        var_r = n * (r * r).sum(axis=0) - sr * sr
+
+        denom = np.sqrt(var_x * var_r)
+        ok = (n >= cls.MIN_STOCKS) & (denom > 0)
+        return np.divide(cov, denom, out=np.zeros(len(n)), where=ok)
+
+    def add_observation(self, exposures: np.ndarray, forward_returns: np.ndarray) -> None:
+        """
+        Add one day's exposures and the returns realised over the following day.
+
+        Args:
+            exposures: Array [n_stocks, n_factors] in the order of self.factors
+            forward_returns: Array [n_stocks] of next-day returns for the same stocks
+        """
+        self.add_ic(self.information_coefficients(exposures, forward_returns))
+
+    def add_ic(self, ic: np.ndarray) -> None:
+        """
+        Add one day's IC vector to the rolling window and refresh the weights.
+
+        Args:
+            ic: Array [n_factors] in the order of self.factors
+        """
+        ic = np.asarray(ic, dtype=float)
+        if self._count == self.window:
+            old = self._ics[self._next]
+            self._sum -= old
+            self._outer_sum -= np.outer(old, old)
+        else:
+            self._count += 1
+
+        self._ics[self._next] = ic
+        self._sum += ic
+        self._outer_sum += np.outer(ic, ic)
+        self._next = (self._next + 1) % self.window
+
+        self._weights = self._compute_weights()
+
+    def update(self, ts_codes: List[str], exposures: np.ndarray, prices: np.ndarray) -> None:
+        """
+        Record today's cross-section and score yesterday's.
+
+        The returns from the previous call's prices to today's prices are paired
+        with the previous call's exposures; stocks are matched by ts_code, so the
+        universe may change between calls.
+
+        Args:
+            ts_codes: Stock codes of the rows
+            exposures: Array [n_stocks, n_factors] in the order of self.factors
+            prices: Array [n_stocks] of current prices (0 or NaN where unknown)
+        """
+        prices = np.where(prices > 0, prices, np.nan)
+
+        if self._last_index is not None:
+            rows = np.array([self._last_index.get(code, -1) for code in ts_codes], dtype=np.int64)
+            found = rows >= 0
+            if found.any():
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    returns = prices[found] / self._last_prices[rows[found]] - 1.0
+                self.add_observation(self._last_exposures[rows[found]], returns)
+
+        self._last_index = {code: i for i, code in enumerate(ts_codes)}
+        self._last_exposures = np.array(exposures, dtype=float)
+        self._last_prices = prices
+
+    def _compute_weights(self) -> np.ndarray:
+        if self._count < self.min_periods:
+            return self._prior
+
+        n = self._count
+        mean = self._sum / n
+        cov = (self._outer_sum - n * np.outer(mean, mean)) / (n - 1)
+        variance = np.clip(np.diag(cov), 0.0, None)
+
+        if self.method == 'ic':
+            weights = mean
+        elif self.method == 'icir':
+            std = np.sqrt(variance)
+            weights = np.divide(mean, std, out=np.zeros_like(mean), where=std > 0)
+        else:
+            target = np.diag(variance)
+            shrunk = (1.0 - self.shrinkage) * cov + self.shrinkage * target
+            try:
+                weights = np.linalg.solve(shrunk, mean)
+            except np.linalg.LinAlgError:
+                weights = np.linalg.lstsq(shrunk, mean, rcond=None)[0]
+
+        # No usable signal yet (e.g. all ICs zero): keep the prior
+        if not np.isfinite(weights).all() or not np.abs(weights).sum() > 0:
+            return self._prior
+        return self._normalize(weights)
+
+    @property
+    def num_observations(self) -> int:
+        """Number of daily ICs in the rolling window."""
+        return self._count
+
+    def get_ic_mean(self) -> Dict[str, float]:
+        """Mean IC of each factor over the window."""
+        mean = self._sum / self._count if self._count else np.zeros(len(self.factors))
+        return dict(zip(self.factors, mean.tolist()))
+
+    def get_weight_vector(self) -> np.ndarray:
+        """Current weights in the order of self.factors (read-only view)."""
+        weights = self._weights.view()
+        weights.setflags(write=False)
+        return weights
+
+    def get_weights(self) -> Dict[str, float]:
+        """Current weights by factor name."""
+        return dict(zip(self.factors, self._weights.tolist()))
@@ -21,10 +21,16 @@ This module implements the Barra CNE5 (China) factor model, which includes:
 
 from AlgorithmImports import *
 from .BaseFactorModel import BaseFactorModel
-from datetime import date, datetime
-from typing import Dict, List, Optional
+from .FactorStore import FactorStore
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 import json
+import queue
+import threading
 from pathlib import Path
 
 
@@ -38,8 +44,22 @@ class BarraCNE5Model(BaseFactorModel):
     Data files expected:
         - factor_data_dir/by_date/YYYYMMDD.parquet: Daily factor exposures
         - risk_params_file: JSON with covariance matrix and specific risks
+        - factor_store_dir (optional): memory-mapped exposure store; when present,
+          exposures are read from it instead of decoding parquet files
+
+    Factor frames are kept in an LRU cache bounded by a byte budget. After each
+    access a background thread loads the next trading day's file, so the next
+    day's lookup is normally a dictionary hit.
+
+    The reload watcher (see BaseFactorModel) also picks up a rebuilt store and
+    new by_date files; installing them clears the factor cache. Each prefetch
+    is tagged with the cache generation it was queued in, and a load that
+    finishes after the cache was cleared is dropped instead of cached.
     """
 
+    # Default memory budget of the factor cache (bytes)
+    DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
     # 10 Barra CNE5 style factors
     STYLE_FACTORS = [
         'size',                  # Market capitalization factor
@@ -91,16 +111,287 @@ class BarraCNE5Model(BaseFactorModel):
     # All factors combined
     ALL_FACTORS = STYLE_FACTORS + INDUSTRY_FACTORS
 
-    def __init__(self, factor_data_dir: str, risk_params_file: str):
+    def __init__(self, factor_data_dir: str, risk_params_file: str,
+                 cache_bytes: int = DEFAULT_CACHE_BYTES, prefetch: bool = True,
+                 factor_store_dir: Optional[str] = None):
         """
         Initialize Barra CNE5 factor model.
 
         Args:
             factor_data_dir: Directory containing factor data (e.g., /data/barra_factors/by_date/)
             risk_params_file: Path to risk parameters JSON (e.g., /data/barra_risk/risk_params_latest.json)
+            cache_bytes: Memory budget of the factor cache in bytes
+            prefetch: Load the next trading day's factor file on a background thread
+            factor_store_dir: Directory of the memory-mapped factor store (e.g., /data/barra_factors/store)
         """
         super().__init__(factor_data_dir, risk_params_file)
-        self._cache_size = 10  # Maximum number of cached days
+        self.factor_store_dir = Path(factor_store_dir) if factor_store_dir is not None else None
+        self._store = None
+        if factor_store_dir is not None and FactorStore.exists(factor_store_dir):
+            self._store = FactorStore(factor_store_dir)
+
+        self._factor_cache = OrderedDict()  # date -> DataFrame, least recently used first
+        self._cache_bytes = cache_bytes
+        self._cache_used = 0
+        self._entry_bytes = {}
+        self._cache_lock = threading.Lock()
+
+        self._trading_dates = None
+        self._trading_date_set = frozenset()
+        self._calendar_checked = None  # latest query date that triggered a re-listing
+        self._prefetch_enabled = prefetch
+        self._prefetch_queue = queue.Queue()
+        self._prefetch_thread = None
+        self._inflight = {}  # date -> threading.Event set when the load finishes
+        self._generation = 0  # incremented by clear_cache(); stale prefetches are dropped
+
+    def _load_factor_file(self, date: date) -> Optional[pd.DataFrame]:
+        """Read one by_date parquet file (or the store's cross-section) indexed by ts_code."""
+        if self._store is not None:
+            return self._store.get_frame(date)
+
+        date_str = date.strftime("%Y%m%d")
+        file_path = self.factor_data_dir / f"{date_str}.parquet"
+
+        if not file_path.exists():
+            return None
+
+        try:
+            # Read parquet file
+            df = pd.read_parquet(file_path)
+
+            # Set index to ts_code if not already
+            if 'ts_code' in df.columns and df.index.name != 'ts_code':
+                df = df.set_index('ts_code')
+            return df
+
+        except Exception as e:
+            Log.error(f"BarraCNE5Model: Failed to read factor data for {date_str}: {e}")
+            return None
+
+    def _cache_put(self, date: date, df: pd.DataFrame, generation: Optional[int] = None) -> None:
+        """
+        Insert a frame and evict least recently used entries over the byte budget.
+
+        A frame loaded for an older cache generation (see clear_cache) is discarded.
+        """
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._cache_lock:
+            if generation is not None and generation != self._generation:
+                return
+            if date in self._factor_cache:
+                return
+            self._factor_cache[date] = df
+            self._entry_bytes[date] = size
+            self._cache_used += size
+
+            # Always keep the entry just inserted, even if it alone exceeds the budget
+            while self._cache_used > self._cache_bytes and len(self._factor_cache) > 1:
+                evicted, _ = self._factor_cache.popitem(last=False)
+                self._cache_used -= self._entry_bytes.pop(evicted)
+
+    def _cache_get(self, date: date) -> Optional[pd.DataFrame]:
+        with self._cache_lock:
+            df = self._factor_cache.get(date)
+            if df is not None:
+                self._factor_cache.move_to_end(date)
+            return df
+
+    def get_trading_dates(self) -> List[date]:
+        """
+        Get the sorted dates that have a factor file.
+
+        The directory is listed once; call refresh_trading_dates() to pick up new files.
+
+        Returns:
+            Sorted list of dates
+        """
+        if self._trading_dates is None:
+            self.refresh_trading_dates()
+        return self._trading_dates
+
+    def _list_trading_dates(self, store: Optional[FactorStore]) -> List[date]:
+        if store is not None:
+            return sorted(store.dates)
+
+        dates = []
+        if self.factor_data_dir.exists():
+            for path in self.factor_data_dir.glob("*.parquet"):
+                try:
+                    dates.append(datetime.strptime(path.stem, "%Y%m%d").date())
+                except ValueError:
+                    continue
+        return sorted(dates)
+
+    def _set_trading_dates(self, dates: List[date]) -> None:
+        # Publish the set before the list: readers check the list first
+        self._trading_date_set = frozenset(dates)
+        self._trading_dates = dates
+
+    def refresh_trading_dates(self) -> None:
+        """Re-list the factor directory."""
+        self._set_trading_dates(self._list_trading_dates(self._store))
+
+    def _current_trading_dates(self, as_of: date) -> List[date]:
+        """
+        Get the trading dates, re-listing them when as_of is past the last one.
+
+        A file written after the calendar was listed would otherwise stay
+        invisible until a reload is applied. The directory is re-listed at
+        most once per new query date.
+        """
+        dates = self.get_trading_dates()
+        if (not dates or as_of > dates[-1]) and \
+                (self._calendar_checked is None or as_of > self._calendar_checked):
+            self._calendar_checked = as_of
+            self.refresh_trading_dates()
+            dates = self._trading_dates
+        return dates
+
+    def _reload_signature(self) -> tuple:
+        # A rebuilt store replaces meta.json; new by_date files change the directory's mtime
+        store_meta = self.factor_store_dir / FactorStore.META_FILE if self.factor_store_dir is not None else None
+        return super()._reload_signature() + (
+            self._mtime(store_meta) if store_meta is not None else None,
+            self._mtime(self.factor_data_dir),
+        )
+
+    def _build_reload(self) -> Dict:
+        state = super()._build_reload()
+        store = None
+        if self.factor_store_dir is not None and FactorStore.exists(self.factor_store_dir):
+            store = FactorStore(self.factor_store_dir)
+        state['store'] = store
+        state['trading_dates'] = self._list_trading_dates(store)
+        return state
+
+    def _install_reload(self, state: Dict) -> None:
+        super()._install_reload(state)
+        self._store = state['store']
+        self._set_trading_dates(state['trading_dates'])
+        self.clear_cache()
+
+    def asof(self, as_of, max_lag: Optional[timedelta] = None) -> Optional[date]:
+        """
+        Get the latest date with factor data on or before a date.
+
+        Uses bisect over the sorted trading dates (O(log n)); the directory is
+        only re-listed when as_of is past the last known trading date.
+
+        Args:
+            as_of: Query date (date, datetime or string)
+            max_lag: Maximum allowed distance between the query date and the result
+
+        Returns:
+            The factor date, or None if there is none (or it is older than max_lag)
+        """
+        as_of = self._to_date(as_of)
+        dates = self._current_trading_dates(as_of)
+        i = bisect_right(dates, as_of) - 1
+        if i < 0:
+            return None
+        if max_lag is not None and as_of - dates[i] > max_lag:
+            return None
+        return dates[i]
+
+    def get_factor_data_asof(self, as_of, max_lag: Optional[timedelta] = None) -> Optional[pd.DataFrame]:
+        """
+        Get factor exposures of the latest date on or before a date.
+
+        Args:
+            as_of: Query date (date, datetime or string)
+            max_lag: Maximum allowed staleness of the factor data
+
+        Returns:
+            DataFrame indexed by ts_code, or None if no factor date qualifies
+        """
+        factor_date = self.asof(as_of, max_lag)
+        if factor_date is None:
+            return None
+        return self.get_factor_data(factor_date)
+
+    def _prefetch_next(self, date: date) -> None:
+        """Queue the trading day after `date` for background loading."""
+        dates = self.get_trading_dates()
+        i = bisect_right(dates, date)
+        if i >= len(dates):
+            return
+        next_date = dates[i]
+
+        with self._cache_lock:
+            if next_date in self._factor_cache or next_date in self._inflight:
+                return
+            self._inflight[next_date] = threading.Event()
+            generation = self._generation
+
+        if self._prefetch_thread is None or not self._prefetch_thread.is_alive():
+            self._prefetch_thread = threading.Thread(target=self._prefetch_worker,
+                                                     name="BarraFactorPrefetch", daemon=True)
+            self._prefetch_thread.start()
+        self._prefetch_queue.put((next_date, generation))
+
+    def _prefetch_worker(self) -> None:
+        """Background loop loading queued dates into the cache."""
+        while True:
+            item = self._prefetch_queue.get()
+            if item is None:
+                return
+            date, generation = item
+            try:
+                df = self._load_factor_file(date)
+                if df is not None:
+                    self._cache_put(date, df, generation)
+            finally:
+                # After clear_cache() the entry belongs to a newer prefetch (or none)
+                with self._cache_lock:
+                    event = self._inflight.pop(date, None) if generation == self._generation else None
+                if event is not None:
+                    event.set()
+
+    def close(self) -> None:
+        """Stop the prefetch and reload watcher threads."""
+        self.stop_reload_watcher()
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            self._prefetch_queue.put(None)
+            self._prefetch_thread.join()
+        self._prefetch_thread = None
+
+    def clear_cache(self) -> None:
+        """
+        Clear the internal factor data cache.
+
+        Queued prefetches are dropped and running ones will not be cached;
+        callers waiting on a running prefetch are released and load the date
+        themselves.
+        """
+        while True:
+            try:
+                item = self._prefetch_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Keep the stop request for the worker
+                self._prefetch_queue.put(None)
+                break
+
+        with self._cache_lock:
+            self._generation += 1
+            self._factor_cache.clear()
+            self._entry_bytes.clear()
+            self._cache_used = 0
+            events = list(self._inflight.values())
+            self._inflight.clear()
+        for event in events:
+            event.set()
+
+    @staticmethod
+    def _to_date(value) -> date:
+        """Convert a date, datetime or string to a date."""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, str):
+            return pd.to_datetime(value).date()
+        return value
 
     def get_factor_data(self, date: date) -> Optional[pd.DataFrame]:
         """
@@ -115,43 +406,71 @@ class BarraCNE5Model(BaseFactorModel):
             Returns None if data file doesn't exist
         """
         # Convert date to proper format
-        if isinstance(date, datetime):
-            date = date.date()
-        elif isinstance(date, str):
-            date = pd.to_datetime(date).date()
+        date = self._to_date(date)
 
         # Check cache first
-        if date in self._factor_cache:
-            return self._factor_cache[date]
-
-        # Build file path: by_date/YYYYMMDD.parquet
-        date_str = date.strftime("%Y%m%d")
-        file_path = self.factor_data_dir / f"{date_str}.parquet"
+        df = self._cache_get(date)
 
-        if not file_path.exists():
-            return None
+        if df is None:
+            # A prefetch of this date may be running: wait for it instead of reading twice
+            with self._cache_lock:
+                event = self._inflight.get(date)
+            if event is not None:
+                event.wait()
+                df = self._cache_get(date)
 
-        try:
-            # Read parquet file
-            df = pd.read_parquet(file_path)
+        if df is None:
+            # Dates without a factor file are answered from the calendar, not the filesystem
+            self._current_trading_dates(date)
+            if date not in self._trading_date_set:
+                return None
+            df = self._load_factor_file(date)
+            if df is None:
+                return None
+            self._cache_put(date, df)
+
+        # The store needs no decode, so prefetching only pays off for parquet files
+        if self._prefetch_enabled and self._store is None:
+            self._prefetch_next(date)
+        return df
+
+    def get_exposure_matrix(self, date: date, symbols: List[str],
+                            factors: Optional[List[str]] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Get factor exposures of several securities as a matrix.
 
-            # Set index to ts_code if not already
-            if 'ts_code' in df.columns and df.index.name != 'ts_code':
-                df = df.set_index('ts_code')
+        Reads straight from the memory-mapped store when available (only the
+        requested rows are copied); otherwise uses the cached factor frame.
 
-            # Cache the result (with size limit)
-            if len(self._factor_cache) >= self._cache_size:
-                # Remove oldest entry
-                oldest_key = min(self._factor_cache.keys())
-                del self._factor_cache[oldest_key]
-            self._factor_cache[date] = df
+        Args:
+            date: Date to get exposures for
+            symbols: Security symbols (e.g., ['000001.SZ', '600000.SH'])
+            factors: Factor columns (default: all factors of the model)
 
-            return df
+        Returns:
+            Tuple (exposures [n, k], valid [n]), or None if no factor data is available
+        """
+        if self._store is None:
+            return super().get_exposure_matrix(date, symbols, factors)
 
-        except Exception as e:
-            Log.error(f"BarraCNE5Model: Failed to read factor data for {date_str}: {e}")
+        section = self._store.get_cross_section(self._to_date(date))
+        if section is None:
             return None
 
+        factors = list(factors) if factors is not None else self.get_factor_list()
+        rows = self._store.code_offsets(symbols)
+        cols = self._store.factor_offsets(factors)
+        in_store = rows >= 0
+        has_factor = cols >= 0
+
+        stock_rows = section[rows[in_store]]
+        valid = np.zeros(len(symbols), dtype=bool)
+        valid[in_store] = ~np.isnan(stock_rows).all(axis=1)
+
+        exposures = np.zeros((len(symbols), len(factors)))
+        exposures[np.ix_(in_store, has_factor)] = stock_rows[:, cols[has_factor]]
+        return np.nan_to_num(exposures, nan=0.0), valid
+
     def get_risk_params(self) -> Dict:
         """
         Get current risk model parameters.
@@ -202,6 +521,9 @@ class BarraCNE5Model(BaseFactorModel):
         Returns:
             Factor exposure value, or None if not available
         """
+        if self._store is not None:
+            return self._store.get_exposure(symbol, self._to_date(date), factor_name)
+
         df = self.get_factor_data(date)
         if df is None:
             return None
@@ -225,6 +547,12 @@ class BarraCNE5Model(BaseFactorModel):
         Returns:
             Dictionary mapping factor names to exposure values
         """
+        if self._store is not None:
+            values = self._store.get_stock_exposures(symbol, self._to_date(date))
+            if values is None or np.isnan(values).all():
+                return None
+            return dict(zip(self._store.factors, values.tolist()))
+
         df = self.get_factor_data(date)
         if df is None:
             return None
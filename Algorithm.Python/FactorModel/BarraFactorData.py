@@ -0,0 +1,122 @@
+# QUANTCONNECT.COM - Democratizing Finance, Empowering Individuals.
+# Lean Algorithmic Trading Engine v2.0. Copyright 2014 QuantConnect Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+FactorModel Framework - Barra Factor Exposures as LEAN Custom Data
+
+Factor exposures are delivered through the subscription system, so they are
+time-synchronised with prices in Slice, respect warm-up and use the engine's
+file caching. The CSV files are written by scripts/barra/export_factor_data.py:
+
+    {data_folder}/alternative/barra/factors/{ts_code}.csv   one file per stock
+        date,size,beta,...
+        20240102,0.123,-0.456,...
+    {data_folder}/alternative/barra/universe/{YYYYMMDD}.csv  one file per date
+        ts_code,size,beta,...
+        000001.SZ,0.123,-0.456,...
+
+Usage:
+    # per-stock exposures, available as data[symbol] with one property per factor
+    symbol = self.add_data(BarraFactorData, "000001.SZ", Resolution.DAILY).symbol
+
+    # daily cross-section for universe selection
+    self.add_universe(BarraFactorUniverse, "barra-cne5", Resolution.DAILY, self.select)
+"""
+
+from AlgorithmImports import *
+import os
+
+
+BARRA_DATA_DIR = os.path.join("alternative", "barra")
+
+
+def _parse_row(data, columns: list, values: list) -> None:
+    """Set one property per factor; empty fields are skipped."""
+    for name, value in zip(columns, values):
+        if value:
+            data[name] = float(value)
+
+
+class BarraFactorData(PythonData):
+    """
+    Daily factor exposures of a single stock.
+
+    The data point's time is the factor date and its end time the next day,
+    so exposures computed from a day's close are only visible after that close.
+    """
+
+    def __init__(self):
+        self._columns = None
+
+    def get_source(self, config: SubscriptionDataConfig, date: datetime, is_live_mode: bool) -> SubscriptionDataSource:
+        source = os.path.join(Globals.data_folder, BARRA_DATA_DIR, "factors", f"{config.symbol.value.upper()}.csv")
+        return SubscriptionDataSource(source, SubscriptionTransportMedium.LOCAL_FILE, FileFormat.CSV)
+
+    def reader(self, config: SubscriptionDataConfig, line: str, date: datetime, is_live_mode: bool) -> DynamicData:
+        if not line.strip():
+            return None
+
+        fields = line.strip().split(',')
+        if not fields[0].isdigit():
+            # Header line: factor names
+            self._columns = fields[1:]
+            return None
+        if self._columns is None:
+            return None
+
+        data = BarraFactorData()
+        data.symbol = config.symbol
+        data.time = datetime.strptime(fields[0], "%Y%m%d")
+        data.end_time = data.time + timedelta(1)
+        data.value = 0
+        _parse_row(data, self._columns, fields[1:])
+        return data
+
+
+class BarraFactorUniverse(PythonData):
+    """
+    Daily cross-section of factor exposures for universe selection.
+
+    Each line of a date's file becomes one data point whose symbol is the stock
+    (created like BarraCNE5Algorithm._create_symbol_list) and whose properties
+    are the factor exposures.
+    """
+
+    def __init__(self):
+        self._columns = None
+
+    def get_source(self, config: SubscriptionDataConfig, date: datetime, is_live_mode: bool) -> SubscriptionDataSource:
+        source = os.path.join(Globals.data_folder, BARRA_DATA_DIR, "universe", f"{date:%Y%m%d}.csv")
+        return SubscriptionDataSource(source, SubscriptionTransportMedium.LOCAL_FILE, FileFormat.CSV)
+
+    def reader(self, config: SubscriptionDataConfig, line: str, date: datetime, is_live_mode: bool) -> DynamicData:
+        if not line.strip():
+            return None
+
+        fields = line.strip().split(',')
+        if fields[0] == 'ts_code':
+            # Header line: factor names
+            self._columns = fields[1:]
+            return None
+        if self._columns is None:
+            return None
+
+        ts_code = fields[0]
+        data = BarraFactorUniverse()
+        data.symbol = Symbol.create(ts_code.split('.')[0], SecurityType.EQUITY, Market.CHINA)
+        data.time = date
+        data.end_time = date + timedelta(1)
+        data.value = 0
+        data["ts_code"] = ts_code
+        _parse_row(data, self._columns, fields[1:])
+        return data
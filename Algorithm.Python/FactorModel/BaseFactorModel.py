@@ -23,6 +23,8 @@ from abc import ABC, abstractmethod
 from datetime import date, datetime
 from typing import Dict, List, Optional, Tuple
 import json
+import numpy as np
+import threading
 from pathlib import Path
 
 
@@ -37,8 +39,20 @@ class BaseFactorModel(ABC):
         - get_factor_data(date): Get factor exposures for a specific date
         - get_risk_params(): Get current risk model parameters
         - get_factor_list(): Get list of all factors in the model
+
+    Batch accessors (get_exposure_matrix, get_specific_variances,
+    get_factor_covariance_array) return numpy arrays so that portfolio
+    construction can work on whole cross-sections at once.
+
+    For live trading, start_reload_watcher() polls the source files and loads
+    new versions on a background thread. Loaded data is staged in a back
+    buffer and only switched in by apply_pending_reload(), so the algorithm
+    decides when a new model takes effect and never waits for file I/O.
     """
 
+    # Specific risk assumed for securities missing from the risk model
+    DEFAULT_SPECIFIC_RISK = 0.03
+
     def __init__(self, factor_data_dir: str, risk_params_file: str):
         """
         Initialize the factor model.
@@ -51,6 +65,15 @@ class BaseFactorModel(ABC):
         self.risk_params_file = Path(risk_params_file)
         self._risk_params = None
         self._factor_cache = {}
+        self._specific_risk_series = None
+        self._covariance_arrays = {}
+
+        self._version = 0
+        self._pending_reload = None  # back buffer filled by the reload watcher
+        self._reload_lock = threading.Lock()
+        self._watcher_thread = None
+        self._watcher_stop = threading.Event()
+
         self._load_risk_params()
 
     @abstractmethod
@@ -92,13 +115,102 @@ class BaseFactorModel(ABC):
         """
         pass
 
+    def _read_risk_params(self) -> Dict:
+        """Read risk parameters from JSON file (empty dict if missing)."""
+        if not self.risk_params_file.exists():
+            return {}
+        with open(self.risk_params_file, 'r') as f:
+            return json.load(f)
+
+    def _set_risk_params(self, risk_params: Dict) -> None:
+        """Install risk parameters and drop arrays derived from the old ones."""
+        self._risk_params = risk_params
+        self._specific_risk_series = None
+        self._covariance_arrays = {}
+
     def _load_risk_params(self) -> None:
         """Load risk parameters from JSON file."""
-        if self.risk_params_file.exists():
-            with open(self.risk_params_file, 'r') as f:
-                self._risk_params = json.load(f)
-        else:
-            self._risk_params = {}
+        self._set_risk_params(self._read_risk_params())
+
+    @property
+    def version(self) -> int:
+        """Number of reloads applied since construction (0 = data loaded at start)."""
+        return self._version
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload_signature(self) -> tuple:
+        """Cheap fingerprint of the source files; a change triggers a reload."""
+        return (self._mtime(self.risk_params_file),)
+
+    def _build_reload(self) -> Dict:
+        """Load a new version of the model's data (runs on the watcher thread)."""
+        return {'risk_params': self._read_risk_params()}
+
+    def _install_reload(self, state: Dict) -> None:
+        """Switch to data produced by _build_reload (runs on the caller's thread)."""
+        self._set_risk_params(state['risk_params'])
+
+    def start_reload_watcher(self, interval: float = 60.0) -> None:
+        """
+        Poll the source files and stage new versions on a background thread.
+
+        Args:
+            interval: Seconds between polls
+        """
+        if self._watcher_thread is not None and self._watcher_thread.is_alive():
+            return
+        self._watcher_stop.clear()
+        self._watcher_thread = threading.Thread(target=self._watch_loop, args=(interval,),
+                                                name=f"{type(self).__name__}Reload", daemon=True)
+        self._watcher_thread.start()
+
+    def stop_reload_watcher(self) -> None:
+        """Stop the reload watcher thread."""
+        if self._watcher_thread is not None and self._watcher_thread.is_alive():
+            self._watcher_stop.set()
+            self._watcher_thread.join()
+        self._watcher_thread = None
+
+    def _watch_loop(self, interval: float) -> None:
+        signature = self._reload_signature()
+        while not self._watcher_stop.wait(interval):
+            current = self._reload_signature()
+            if current == signature:
+                continue
+            try:
+                state = self._build_reload()
+            except Exception as e:
+                # Files may be caught mid-write; the signature is kept so the next poll retries
+                Log.error(f"{type(self).__name__}: Reload failed: {e}")
+                continue
+            with self._reload_lock:
+                self._pending_reload = state
+            signature = current
+
+    def apply_pending_reload(self) -> bool:
+        """
+        Switch to the version staged by the reload watcher, if any.
+
+        Only references are swapped, so this never blocks on I/O. Call it at a
+        point where the whole step should see one model, e.g. at the start of
+        the alpha model's update.
+
+        Returns:
+            True if a new version was installed (version is incremented)
+        """
+        with self._reload_lock:
+            state, self._pending_reload = self._pending_reload, None
+        if state is None:
+            return False
+        self._install_reload(state)
+        self._version += 1
+        return True
 
     def get_style_factors(self) -> List[str]:
         """
@@ -131,7 +243,82 @@ class BaseFactorModel(ABC):
         """
         risk_params = self.get_risk_params()
         specific_risks = risk_params.get('specific_risks', {})
-        return specific_risks.get(symbol, 0.03)  # Default 3% if not found
+        return specific_risks.get(symbol, self.DEFAULT_SPECIFIC_RISK)  # Default 3% if not found
+
+    def get_specific_variances(self, symbols: List[str]) -> np.ndarray:
+        """
+        Get specific variances for a list of securities.
+
+        Args:
+            symbols: Security symbols (e.g., ['000001.SZ', '600000.SH'])
+
+        Returns:
+            Array of shape [n] with squared specific risks (default risk for missing securities)
+        """
+        if self._specific_risk_series is None:
+            specific_risks = self.get_risk_params().get('specific_risks', {})
+            self._specific_risk_series = pd.Series(specific_risks, dtype=float)
+
+        risks = self._specific_risk_series.reindex(symbols).to_numpy(dtype=float)
+        risks = np.where(np.isnan(risks), self.DEFAULT_SPECIFIC_RISK, risks)
+        return risks ** 2
+
+    def get_factor_covariance_array(self, factors: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Get the factor covariance matrix as a cached ndarray.
+
+        Args:
+            factors: Factor order of the result (default: factors in the risk parameters)
+
+        Returns:
+            Array of shape [k, k]; covariances missing from the risk parameters are 0
+        """
+        key = tuple(factors) if factors is not None else None
+        cached = self._covariance_arrays.get(key)
+        if cached is not None:
+            return cached
+
+        cov_dict = self.get_risk_params().get('factor_covariance', {})
+        names = list(factors) if factors is not None else list(cov_dict.keys())
+        position = {name: i for i, name in enumerate(names)}
+
+        matrix = np.zeros((len(names), len(names)))
+        for factor1, row in cov_dict.items():
+            i = position.get(factor1)
+            if i is None:
+                continue
+            for factor2, value in row.items():
+                j = position.get(factor2)
+                if j is not None:
+                    matrix[i, j] = value
+
+        matrix.setflags(write=False)
+        self._covariance_arrays[key] = matrix
+        return matrix
+
+    def get_exposure_matrix(self, date: date, symbols: List[str],
+                            factors: Optional[List[str]] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Get factor exposures of several securities as a matrix.
+
+        Args:
+            date: Date to get exposures for
+            symbols: Security symbols (e.g., ['000001.SZ', '600000.SH'])
+            factors: Factor columns (default: all factors of the model)
+
+        Returns:
+            Tuple (exposures, valid): exposures has shape [n, k] with missing values set to 0,
+            valid is a boolean array of shape [n] marking securities present on the date.
+            Returns None if no factor data is available for the date.
+        """
+        df = self.get_factor_data(date)
+        if df is None:
+            return None
+
+        factors = list(factors) if factors is not None else self.get_factor_list()
+        valid = pd.Index(symbols).isin(df.index)
+        exposures = df.reindex(index=symbols, columns=factors).to_numpy(dtype=float)
+        return np.nan_to_num(exposures, nan=0.0), np.asarray(valid)
 
     def get_factor_covariance(self) -> pd.DataFrame:
         """
@@ -146,15 +333,8 @@ class BaseFactorModel(ABC):
         if not cov_dict:
             return pd.DataFrame()
 
-        # Convert nested dict to DataFrame
         factors = list(cov_dict.keys())
-        cov_matrix = pd.DataFrame(index=factors, columns=factors)
-
-        for i, factor1 in enumerate(factors):
-            for j, factor2 in enumerate(factors):
-                cov_matrix.iloc[i, j] = cov_dict[factor1].get(factor2, 0.0)
-
-        return cov_matrix
+        return pd.DataFrame(self.get_factor_covariance_array(), index=factors, columns=factors)
 
     def clear_cache(self) -> None:
         """Clear the internal factor data cache."""
@@ -0,0 +1,107 @@
+# QUANTCONNECT.COM - Democratizing Finance, Empowering Individuals.
+# Lean Algorithmic Trading Engine v2.0. Copyright 2014 QuantConnect Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+FactorModel Framework - Factor-Structured Covariance Operator
+
+This module represents the asset covariance of a factor model,
+    Σ = X F Xᵀ + D
+without forming the n x n matrix: products and solves work on the
+exposures X [n, K], the factor covariance F [K, K] and the specific
+variances D [n] directly.
+"""
+
+from AlgorithmImports import *
+import numpy as np
+
+
+class FactorCovariance:
+    """
+    Implicit asset covariance Σ = X F Xᵀ + D.
+
+    F is factored once as L Lᵀ (eigenvalues below zero are clipped, so an
+    estimated F that is slightly indefinite is made positive semi-definite),
+    giving Σ = D + B Bᵀ with B = X L. Solves use the Woodbury identity
+
+        Σ⁻¹ b = D⁻¹ b - D⁻¹ B (I + Bᵀ D⁻¹ B)⁻¹ Bᵀ D⁻¹ b
+
+    where the K x K capacitance matrix I + Bᵀ D⁻¹ B is symmetric with
+    eigenvalues >= 1, so its Cholesky factorisation is always stable.
+    Products use the same factored form, so wᵀ Σ w is never negative.
+    Setup is O(n K²); each product or solve afterwards is O(n K).
+    """
+
+    def __init__(self, exposures: np.ndarray, factor_cov: np.ndarray, specific_var: np.ndarray,
+                 ridge: float = 1e-6):
+        """
+        Build the operator.
+
+        Args:
+            exposures: Factor exposures X [n, K] (no NaN)
+            factor_cov: Factor covariance F [K, K]
+            specific_var: Specific variances [n]
+            ridge: Added to every specific variance for numerical stability
+        """
+        self.exposures = np.asarray(exposures, dtype=np.float64)
+        self.factor_cov = np.asarray(factor_cov, dtype=np.float64)
+        self.specific_var = np.asarray(specific_var, dtype=np.float64) + ridge
+        if (self.specific_var <= 0).any():
+            raise ValueError("FactorCovariance: specific variances must be positive")
+
+        # F = L Lᵀ from the symmetric part's non-negative eigenvalues
+        eigvals, eigvecs = np.linalg.eigh((self.factor_cov + self.factor_cov.T) / 2)
+        keep = eigvals > eigvals.max(initial=0.0) * 1e-12
+        self._loadings = self.exposures @ (eigvecs[:, keep] * np.sqrt(eigvals[keep]))  # B = X L
+
+        self._inv_d = 1.0 / self.specific_var
+        scaled = self._loadings * self._inv_d[:, None]  # D⁻¹ B
+        capacitance = np.eye(self._loadings.shape[1]) + self._loadings.T @ scaled
+        self._chol = np.linalg.cholesky(capacitance)
+        self._scaled_loadings = scaled
+
+    @property
+    def n(self) -> int:
+        """Number of assets."""
+        return len(self.specific_var)
+
+    def dot(self, w: np.ndarray) -> np.ndarray:
+        """Σ w."""
+        return self._loadings @ (self._loadings.T @ w) + self.specific_var * w
+
+    def quad(self, w: np.ndarray) -> float:
+        """wᵀ Σ w (portfolio variance)."""
+        f = self._loadings.T @ w
+        return float(f @ f + np.sum(self.specific_var * w * w))
+
+    def factor_exposure(self, w: np.ndarray) -> np.ndarray:
+        """Portfolio factor exposures Xᵀ w."""
+        return self.exposures.T @ w
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """
+        Σ⁻¹ b via the Woodbury identity.
+
+        Args:
+            b: Vector [n] or matrix [n, m]
+
+        Returns:
+            Solution with the same shape as b
+        """
+        d_inv_b = b * (self._inv_d if b.ndim == 1 else self._inv_d[:, None])
+        rhs = self._loadings.T @ d_inv_b
+        y = np.linalg.solve(self._chol.T, np.linalg.solve(self._chol, rhs))
+        return d_inv_b - self._scaled_loadings @ y
+
+    def to_dense(self) -> np.ndarray:
+        """Dense n x n matrix (for testing and small universes only)."""
+        return self._loadings @ self._loadings.T + np.diag(self.specific_var)
@@ -0,0 +1,156 @@
+# QUANTCONNECT.COM - Democratizing Finance, Empowering Individuals.
+# Lean Algorithmic Trading Engine v2.0. Copyright 2014 QuantConnect Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+FactorModel Framework - Memory-Mapped Factor Store
+
+This module reads the factor exposure store written by
+scripts/barra/build_factor_store.py:
+    exposures.npy: float32 array [n_dates, n_stocks, n_factors], NaN where missing
+    meta.json:     version, dates (YYYYMMDD), ts_codes, factors
+"""
+
+from AlgorithmImports import *
+from datetime import date, datetime
+from typing import List, Optional
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+class FactorStore:
+    """
+    Memory-mapped factor exposure history.
+
+    The array is opened with numpy.load(mmap_mode='r'), so only the pages
+    that are touched are read from disk. Dates and ts_codes are resolved to
+    integer offsets through dictionaries; cross-sections are zero-copy views.
+    """
+
+    EXPOSURES_FILE = "exposures.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, store_dir: str):
+        """
+        Open a factor store.
+
+        Args:
+            store_dir: Directory containing exposures.npy and meta.json
+        """
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / self.META_FILE, 'r') as f:
+            meta = json.load(f)
+
+        self.version = meta.get('version')
+        self.dates = [datetime.strptime(d, "%Y%m%d").date() for d in meta['dates']]
+        self.ts_codes = list(meta['ts_codes'])
+        self.factors = list(meta['factors'])
+
+        self._date_index = {d: i for i, d in enumerate(self.dates)}
+        self._code_index = {code: i for i, code in enumerate(self.ts_codes)}
+        self._factor_index = {name: i for i, name in enumerate(self.factors)}
+        self._exposures = np.load(self.store_dir / self.EXPOSURES_FILE, mmap_mode='r')
+
+        # Guards against opening the two files across a rebuild's directory swap
+        expected = (len(self.dates), len(self.ts_codes), len(self.factors))
+        if self._exposures.shape != expected:
+            raise ValueError(f"FactorStore: exposures shape {self._exposures.shape} "
+                             f"does not match meta.json {expected}")
+
+    @staticmethod
+    def exists(store_dir: str) -> bool:
+        """Check whether a store has been built in the directory."""
+        path = Path(store_dir)
+        return (path / FactorStore.META_FILE).exists() and (path / FactorStore.EXPOSURES_FILE).exists()
+
+    def date_offset(self, as_of: date) -> Optional[int]:
+        """Row offset of a date, or None if the date is not stored."""
+        return self._date_index.get(as_of)
+
+    def code_offset(self, ts_code: str) -> Optional[int]:
+        """Column offset of a ts_code, or None if the stock is not stored."""
+        return self._code_index.get(ts_code)
+
+    def factor_offset(self, factor_name: str) -> Optional[int]:
+        """Offset of a factor, or None if the factor is not stored."""
+        return self._factor_index.get(factor_name)
+
+    def code_offsets(self, ts_codes: List[str]) -> np.ndarray:
+        """Column offsets of several ts_codes (-1 for stocks not stored)."""
+        return np.array([self._code_index.get(code, -1) for code in ts_codes], dtype=np.int64)
+
+    def factor_offsets(self, factor_names: List[str]) -> np.ndarray:
+        """Offsets of several factors (-1 for factors not stored)."""
+        return np.array([self._factor_index.get(name, -1) for name in factor_names], dtype=np.int64)
+
+    def get_cross_section(self, as_of: date) -> Optional[np.ndarray]:
+        """
+        Get all exposures on a date.
+
+        Args:
+            as_of: Date to read
+
+        Returns:
+            Read-only view of shape [n_stocks, n_factors] (columns ordered as self.factors),
+            or None if the date is not stored
+        """
+        i = self._date_index.get(as_of)
+        if i is None:
+            return None
+        return self._exposures[i]
+
+    def get_exposure(self, ts_code: str, as_of: date, factor_name: str) -> Optional[float]:
+        """
+        Get a single exposure.
+
+        Returns:
+            Exposure value, or None if the date, stock or factor is missing or the value is NaN
+        """
+        i = self._date_index.get(as_of)
+        j = self._code_index.get(ts_code)
+        k = self._factor_index.get(factor_name)
+        if i is None or j is None or k is None:
+            return None
+        value = self._exposures[i, j, k]
+        return None if np.isnan(value) else float(value)
+
+    def get_stock_exposures(self, ts_code: str, as_of: date) -> Optional[np.ndarray]:
+        """
+        Get all factor exposures of one stock on a date.
+
+        Returns:
+            Read-only view of shape [n_factors], or None if missing
+        """
+        i = self._date_index.get(as_of)
+        j = self._code_index.get(ts_code)
+        if i is None or j is None:
+            return None
+        return self._exposures[i, j]
+
+    def get_frame(self, as_of: date) -> Optional[pd.DataFrame]:
+        """
+        Get a date's exposures as a DataFrame indexed by ts_code.
+
+        Stocks with no data on the date (all factors NaN) are dropped, matching
+        the rows of the by_date parquet file the store was built from.
+
+        Returns:
+            DataFrame with one column per factor, or None if the date is not stored
+        """
+        values = self.get_cross_section(as_of)
+        if values is None:
+            return None
+        present = ~np.isnan(values).all(axis=1)
+        index = pd.Index(np.asarray(self.ts_codes, dtype=object)[present], name='ts_code')
+        return pd.DataFrame(values[present], index=index, columns=self.factors)
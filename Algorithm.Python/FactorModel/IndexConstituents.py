@@ -0,0 +1,125 @@
+# QUANTCONNECT.COM - Democratizing Finance, Empowering Individuals.
+# Lean Algorithmic Trading Engine v2.0. Copyright 2014 QuantConnect Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+FactorModel Framework - Point-in-Time Index Constituents
+
+This module provides as-of lookups of index membership built from the
+interval table written by scripts/barra/build_index_constituents.py:
+    index_code, ts_code, in_date, out_date, weight
+"""
+
+from AlgorithmImports import *
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, List, Optional
+import pandas as pd
+from pathlib import Path
+
+
+class IndexConstituents:
+    """
+    Point-in-time constituents of a single index.
+
+    Each snapshot date starts a period that lasts until the next snapshot date.
+    Lookups bisect over the sorted snapshot dates, so each query is O(log n)
+    and only returns stocks that were members on that date.
+    """
+
+    def __init__(self, intervals: pd.DataFrame, index_code: str):
+        """
+        Initialize from an interval table.
+
+        Args:
+            intervals: DataFrame with columns index_code, ts_code, in_date, out_date, weight
+            index_code: Index to load (e.g., '000300.SH')
+        """
+        self.index_code = index_code
+        df = intervals[intervals['index_code'] == index_code]
+
+        self._dates = []        # sorted snapshot dates
+        self._end_dates = []    # end of each snapshot period (None if still current)
+        self._weights = []      # {ts_code: weight} for each snapshot
+        for in_date, group in df.groupby('in_date', sort=True):
+            out_dates = group['out_date'].dropna()
+            self._dates.append(self._to_date(in_date))
+            self._end_dates.append(self._to_date(out_dates.iloc[0]) if len(out_dates) else None)
+            self._weights.append(dict(zip(group['ts_code'], group['weight'].astype(float))))
+
+    @classmethod
+    def from_file(cls, path: str, index_code: str = '000300.SH') -> 'IndexConstituents':
+        """
+        Load constituents from the parquet interval table.
+
+        Args:
+            path: Path to index_constituents.parquet
+            index_code: Index to load
+
+        Returns:
+            IndexConstituents instance
+        """
+        return cls(pd.read_parquet(Path(path)), index_code)
+
+    @staticmethod
+    def _to_date(value) -> date:
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return pd.to_datetime(str(value)).date()
+
+    @property
+    def snapshot_dates(self) -> List[date]:
+        """Sorted snapshot dates."""
+        return list(self._dates)
+
+    def _snapshot(self, as_of) -> Optional[Dict[str, float]]:
+        as_of = self._to_date(as_of)
+        i = bisect_right(self._dates, as_of) - 1
+        if i < 0:
+            return None
+        end = self._end_dates[i]
+        if end is not None and as_of >= end:
+            return None
+        return self._weights[i]
+
+    def get_weights(self, as_of) -> Dict[str, float]:
+        """
+        Get constituent weights on a date.
+
+        Args:
+            as_of: Query date (date, datetime or 'YYYYMMDD' string)
+
+        Returns:
+            Dictionary mapping ts_code to index weight (empty before the first snapshot)
+        """
+        snapshot = self._snapshot(as_of)
+        return dict(snapshot) if snapshot else {}
+
+    def get_members(self, as_of) -> List[str]:
+        """
+        Get constituents on a date.
+
+        Args:
+            as_of: Query date (date, datetime or 'YYYYMMDD' string)
+
+        Returns:
+            Sorted list of ts_codes
+        """
+        snapshot = self._snapshot(as_of)
+        return sorted(snapshot) if snapshot else []
+
+    def is_member(self, ts_code: str, as_of) -> bool:
+        """Check whether a stock was a constituent on a date."""
+        snapshot = self._snapshot(as_of)
+        return bool(snapshot) and ts_code in snapshot
@@ -0,0 +1,164 @@
+# QUANTCONNECT.COM - Democratizing Finance, Empowering Individuals.
+# Lean Algorithmic Trading Engine v2.0. Copyright 2014 QuantConnect Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+FactorModel Framework - Alpha Signal Smoothing
+
+This module damps day-to-day noise in composite alpha scores so that small
+changes in exposures do not flip which stocks are selected.
+"""
+
+from AlgorithmImports import *
+from typing import Dict, List
+import numpy as np
+
+
+class SignalSmoother:
+    """
+    EWMA smoothing of alpha scores with hysteresis on top-N selection.
+
+    Every key (ts_code or symbol) owns a slot in fixed-size numpy arrays
+    holding its smoothed score and whether it is currently selected; the
+    arrays double in size only when all slots are taken. Removed keys give
+    their slot back for reuse.
+
+    Selection uses two rank bands: a stock enters when it ranks within the
+    top `count`, and once selected it stays until it falls below
+    `count * exit_buffer`.
+    """
+
+    def __init__(self, halflife: float = 5.0, exit_buffer: float = 1.5, capacity: int = 1024):
+        """
+        Initialize the smoother.
+
+        Args:
+            halflife: Half-life of the EWMA in updates (1 = no memory beyond half weight on today)
+            exit_buffer: Exit rank as a multiple of the entry rank (>= 1; 1 disables hysteresis)
+            capacity: Initial number of slots
+        """
+        if halflife <= 0:
+            raise ValueError("SignalSmoother: halflife must be positive")
+        if exit_buffer < 1.0:
+            raise ValueError("SignalSmoother: exit_buffer must be at least 1")
+
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.exit_buffer = exit_buffer
+
+        self._slots: Dict = {}
+        self._free: List[int] = []
+        self._smoothed = np.full(capacity, np.nan)
+        self._selected = np.zeros(capacity, dtype=bool)
+
+    def positions(self, keys: list) -> np.ndarray:
+        """
+        Get the slots of several keys, assigning slots to new keys.
+
+        Args:
+            keys: ts_codes or symbols
+
+        Returns:
+            Array of slot positions
+        """
+        slots = self._slots
+        result = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            slot = slots.get(key)
+            if slot is None:
+                slot = self._allocate()
+                slots[key] = slot
+            result[i] = slot
+        return result
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+
+        slot = len(self._slots)
+        if slot >= len(self._smoothed):
+            grow = len(self._smoothed) or 1
+            self._smoothed = np.concatenate([self._smoothed, np.full(grow, np.nan)])
+            self._selected = np.concatenate([self._selected, np.zeros(grow, dtype=bool)])
+        return slot
+
+    def release(self, keys: list) -> None:
+        """Forget the state of keys that left the universe and free their slots."""
+        for key in keys:
+            slot = self._slots.pop(key, None)
+            if slot is not None:
+                self._smoothed[slot] = np.nan
+                self._selected[slot] = False
+                self._free.append(slot)
+
+    def smooth(self, positions: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """
+        Blend today's scores into the smoothed scores.
+
+        A slot's first score is taken as is; a NaN score leaves the slot unchanged.
+
+        Args:
+            positions: Slots of the scores
+            scores: Today's raw scores
+
+        Returns:
+            Smoothed scores aligned with positions
+        """
+        previous = self._smoothed[positions]
+        blended = self.decay * previous + (1.0 - self.decay) * scores
+        smoothed = np.where(np.isnan(previous), scores, np.where(np.isnan(scores), previous, blended))
+        self._smoothed[positions] = smoothed
+        return smoothed
+
+    def current(self, positions: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """
+        Get the smoothed scores without blending in a new observation.
+
+        For re-scoring within the same period (e.g. after a universe change):
+        slots without a smoothed score yet take `scores` as their first one.
+
+        Args:
+            positions: Slots of the scores
+            scores: Current raw scores
+
+        Returns:
+            Smoothed scores aligned with positions
+        """
+        previous = self._smoothed[positions]
+        smoothed = np.where(np.isnan(previous), scores, previous)
+        self._smoothed[positions] = smoothed
+        return smoothed
+
+    def selected(self, positions: np.ndarray) -> np.ndarray:
+        """Selection state of the slots as of the last select() call."""
+        return self._selected[positions]
+
+    def select(self, positions: np.ndarray, scores: np.ndarray, count: int) -> np.ndarray:
+        """
+        Select the top-ranked stocks with hysteresis.
+
+        Args:
+            positions: Slots of the candidates
+            scores: Candidate scores (higher is better; NaN never selected)
+            count: Entry band: new stocks must rank within the top `count`
+
+        Returns:
+            Boolean mask aligned with positions
+        """
+        ranks = np.empty(len(scores), dtype=np.int64)
+        ranks[np.argsort(np.where(np.isnan(scores), np.inf, -scores), kind='stable')] = np.arange(len(scores))
+
+        held = self._selected[positions]
+        exit_count = int(np.ceil(count * self.exit_buffer))
+        selected = ~np.isnan(scores) & np.where(held, ranks < exit_count, ranks < count)
+
+        self._selected[positions] = selected
+        return selected
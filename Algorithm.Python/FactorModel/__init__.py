@@ -4,7 +4,14 @@
 # A factor model framework for LEAN algorithmic trading engine
 # Supports Barra CNE5, CNE6 and custom factor models
 
+from .AdaptiveFactorWeights import AdaptiveFactorWeights
 from .BaseFactorModel import BaseFactorModel
 from .BarraCNE5Model import BarraCNE5Model
+from .BarraFactorData import BarraFactorData, BarraFactorUniverse
+from .FactorCovariance import FactorCovariance
+from .FactorStore import FactorStore
+from .IndexConstituents import IndexConstituents
+from .SignalSmoother import SignalSmoother
 
-__all__ = ['BaseFactorModel', 'BarraCNE5Model']
+__all__ = ['AdaptiveFactorWeights', 'BaseFactorModel', 'BarraCNE5Model', 'BarraFactorData', 'BarraFactorUniverse',
+           'FactorCovariance', 'FactorStore', 'IndexConstituents', 'SignalSmoother']
@@ -2,14 +2,25 @@
 """
 扫描多层嵌套目录结构，提取所有parquet文件的表结构信息
 生成 tushare-dir.json 文件，包含每个parquet文件的路径和列结构
+
+只读取parquet文件尾部的元数据: 空值列由各行组的统计信息 (null_count) 判断，
+仅当统计信息缺失时才读取对应列的数据。文件在线程池中并行处理，
+结果按文件的 (size, mtime) 缓存，未修改的文件不再打开。
 """
 
 import os
 import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pyarrow.parquet as pq
 
 
+# 默认缓存文件
+CACHE_FILE = Path(__file__).parent / ".parquet_schema_cache.json"
+
+
 def find_parquet_files(root_dir):
     """
     递归查找所有parquet文件
@@ -27,14 +38,83 @@ def find_parquet_files(root_dir):
         print(f"警告: 目录不存在 - {root_dir}")
         return parquet_files
     
-    # 递归查找所有.parquet文件
-    for parquet_file in root_path.rglob("*.parquet"):
-        if parquet_file.is_file():
-            parquet_files.append(str(parquet_file))
+    # 用 os.scandir 迭代遍历, 比 rglob 少一次 stat
+    stack = [str(root_path)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".parquet") and entry.is_file():
+                        parquet_files.append(entry.path)
+        except OSError as e:
+            print(f"无法读取目录 {current}: {e}")
     
+    parquet_files.sort()
     return parquet_files
 
 
+def find_null_columns(parquet_file, field_names):
+    """
+    根据行组统计信息找出全部为空的列
+    
+    统计信息缺失 (或列为嵌套类型) 时只读取这些列的数据来判断。
+    
+    Args:
+        parquet_file: pq.ParquetFile 对象
+        field_names: 顶层列名列表
+        
+    Returns:
+        list: 空值列名列表
+    """
+    metadata = parquet_file.metadata
+    num_rows = metadata.num_rows
+    if num_rows == 0:
+        return list(field_names)
+    
+    # 顶层列名 -> 叶子列序号 (扁平列只有一个叶子, 且路径等于列名)
+    leaves = {}
+    for i in range(metadata.num_columns):
+        path = metadata.schema.column(i).path
+        leaves.setdefault(path.split(".")[0], []).append((i, path))
+    
+    null_columns = []
+    unknown = []
+    for name in field_names:
+        columns = leaves.get(name, [])
+        if len(columns) != 1 or columns[0][1] != name:
+            unknown.append(name)
+            continue
+        
+        index = columns[0][0]
+        null_count = 0
+        for rg in range(metadata.num_row_groups):
+            stats = metadata.row_group(rg).column(index).statistics
+            if stats is None or not stats.has_null_count:
+                null_count = None
+                break
+            null_count += stats.null_count
+        
+        if null_count is None:
+            unknown.append(name)
+        elif null_count == num_rows:
+            null_columns.append(name)
+    
+    # 统计信息缺失的列: 读取数据判断
+    if unknown:
+        table = parquet_file.read(columns=unknown)
+        for name in unknown:
+            column_data = table.column(name)
+            if column_data.null_count == len(column_data):
+                null_columns.append(name)
+    
+    # 保持列在schema中的顺序
+    order = {name: i for i, name in enumerate(field_names)}
+    return sorted(null_columns, key=order.get)
+
+
 def get_parquet_schema(file_path):
     """
     读取parquet文件的表结构信息
@@ -47,25 +127,20 @@ def get_parquet_schema(file_path):
     """
     try:
         # 读取parquet文件的schema - 使用 to_arrow_schema() 转换为Arrow schema
+        # 打开文件只解析尾部元数据, 不读取数据页
         parquet_file = pq.ParquetFile(file_path)
         schema = parquet_file.schema.to_arrow_schema()
         
-        # 读取数据以检查空值
-        table = parquet_file.read()
-        
-        # 提取列名和类型信息，并检查空值
+        # 提取列名和类型信息
         columns = []
-        null_columns = []
         for field in schema:
             columns.append({
                 "name": field.name,
                 "type": str(field.type)
             })
-            
-            # 检查该列是否所有值都为空
-            column_data = table.column(field.name)
-            if len(column_data) == 0 or column_data.null_count == len(column_data):
-                null_columns.append(field.name)
+        
+        # 检查全部为空的列
+        null_columns = find_null_columns(parquet_file, schema.names)
         
         return columns, null_columns
     except Exception as e:
@@ -73,7 +148,82 @@ def get_parquet_schema(file_path):
         return None, None
 
 
-def generate_schema_json(root_dirs, output_file, null_value_file):
+class SchemaCache:
+    """
+    按文件 (size, mtime) 缓存的schema扫描结果
+    
+    缓存文件格式: {文件绝对路径: {"size", "mtime_ns", "columns", "null_columns"}}
+    """
+    
+    def __init__(self, path):
+        """
+        加载缓存文件 (不存在或损坏时从空缓存开始)
+        
+        Args:
+            path: 缓存文件路径, None表示不使用缓存
+        """
+        self.path = Path(path) if path is not None else None
+        self.entries = {}
+        self.hits = 0
+        self._lock = threading.Lock()
+        
+        if self.path is not None and self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"缓存文件无效, 重新扫描: {e}")
+    
+    def get_schema(self, file_path):
+        """
+        获取文件的schema (缓存命中时不打开文件)
+        
+        Args:
+            file_path: parquet文件路径
+            
+        Returns:
+            tuple: (列信息列表, 空值列名列表)，读取失败返回(None, None)
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            print(f"读取文件失败 {file_path}: {str(e)}")
+            return None, None
+        
+        entry = self.entries.get(file_path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            with self._lock:
+                self.hits += 1
+            return entry["columns"], entry["null_columns"]
+        
+        columns, null_columns = get_parquet_schema(file_path)
+        if columns is not None:
+            with self._lock:
+                self.entries[file_path] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "columns": columns,
+                    "null_columns": null_columns,
+                }
+        return columns, null_columns
+    
+    def save(self, keep_paths):
+        """
+        保存缓存 (只保留本次扫描到的文件)
+        
+        Args:
+            keep_paths: 本次扫描到的文件路径集合
+        """
+        if self.path is None:
+            return
+        entries = {p: e for p, e in self.entries.items() if p in keep_paths}
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def generate_schema_json(root_dirs, output_file, null_value_file, max_workers=16, cache_file=CACHE_FILE):
     """
     生成包含所有parquet文件schema信息的JSON文件，并输出空值列名
     
@@ -81,9 +231,13 @@ def generate_schema_json(root_dirs, output_file, null_value_file):
         root_dirs: 要扫描的根目录列表
         output_file: 输出JSON文件路径
         null_value_file: 输出空值列名的文件路径
+        max_workers: 并行读取元数据的线程数
+        cache_file: 缓存文件路径, None表示不使用缓存
     """
     schema_dict = {}
     null_value_dict = {}
+    cache = SchemaCache(cache_file)
+    scanned = set()
     
     # 如果传入的是字符串，转为列表
     if isinstance(root_dirs, str):
@@ -94,12 +248,14 @@ def generate_schema_json(root_dirs, output_file, null_value_file):
         print(f"扫描目录: {root_dir}")
         parquet_files = find_parquet_files(root_dir)
         print(f"找到 {len(parquet_files)} 个parquet文件")
+        scanned.update(parquet_files)
         
-        # 提取每个文件的schema
-        for file_path in parquet_files:
-            print(f"处理: {file_path}")
-            schema, null_columns = get_parquet_schema(file_path)
-            
+        # 并行提取每个文件的schema (map保持文件顺序)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(cache.get_schema, parquet_files)
+            file_results = list(zip(parquet_files, results))
+        
+        for file_path, (schema, null_columns) in file_results:
             if schema is not None:
                 # 使用相对路径作为key（相对于项目根目录）
                 try:
@@ -115,6 +271,8 @@ def generate_schema_json(root_dirs, output_file, null_value_file):
                 if null_columns:
                     null_value_dict[rel_path] = null_columns
     
+    cache.save(scanned)
+    
     # 写入JSON文件
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(schema_dict, f, ensure_ascii=False, indent=2)
@@ -128,7 +286,7 @@ def generate_schema_json(root_dirs, output_file, null_value_file):
             f.write("\n")
     
     print(f"\n生成完成! 输出文件: {output_file}")
-    print(f"共处理 {len(schema_dict)} 个parquet文件")
+    print(f"共处理 {len(schema_dict)} 个parquet文件 (缓存命中 {cache.hits} 个)")
     if null_value_dict:
         print(f"空值列名输出文件: {null_value_file}")
         print(f"发现 {len(null_value_dict)} 个文件包含空值列")
@@ -136,6 +294,11 @@ def generate_schema_json(root_dirs, output_file, null_value_file):
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="生成parquet文件的schema信息")
+    parser.add_argument('--workers', type=int, default=16, help='并行读取元数据的线程数')
+    parser.add_argument('--no-cache', action='store_true', help='不使用缓存, 重新读取所有文件')
+    args = parser.parse_args()
+    
     # 设置要扫描的目录
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
@@ -164,7 +327,9 @@ def main():
     null_value_file = script_dir / "null-value.txt"
     
     # 生成schema JSON文件和空值列名文件
-    generate_schema_json(existing_dirs, str(output_file), str(null_value_file))
+    generate_schema_json(existing_dirs, str(output_file), str(null_value_file),
+                         max_workers=args.workers,
+                         cache_file=None if args.no_cache else CACHE_FILE)
 
 
 if __name__ == "__main__":
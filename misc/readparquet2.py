@@ -1,32 +1,211 @@
-import pandas as pd
+import argparse
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def execute_parquet_to_txt_export(input_path, output_path, delimiter='\t'):
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# 每个记录批次的行数, 决定流式导出时的内存上限
+DEFAULT_BATCH_SIZE = 65536
+
+# 过滤条件表达式: 列名 比较符 值, 例如 trade_date>=20230101
+FILTER_PATTERN = re.compile(r'^\s*(\w+)\s*(==|=|!=|>=|<=|>|<)\s*(.*?)\s*$')
+
+
+def parse_filter(condition, schema):
+    """
+    将过滤条件解析为 pyarrow 表达式
+
+    参数:
+    condition (str | tuple): 文本条件, 形如 "ts_code=000001.SZ" 或 "trade_date>=20230101";
+        也可以是 (列名, 比较符, 值) 元组
+    schema (pa.Schema): 源文件的 Arrow schema, 用于把值转换为列的类型
+
+    返回:
+    tuple: (列名, pc.Expression)
+    """
+    if isinstance(condition, str):
+        match = FILTER_PATTERN.match(condition)
+        if match is None:
+            raise ValueError(f"无法解析过滤条件: {condition}")
+        name, op, raw_value = match.groups()
+    else:
+        name, op, raw_value = condition
+    if name not in schema.names:
+        raise ValueError(f"过滤条件中的列不存在: {name}")
+
+    value = pa.scalar(raw_value).cast(schema.field(name).type)
+    field = pc.field(name)
+    return name, {
+        '=': field == value,
+        '==': field == value,
+        '!=': field != value,
+        '>': field > value,
+        '>=': field >= value,
+        '<': field < value,
+        '<=': field <= value,
+    }[op]
+
+
+def _column_casts(parquet_file, columns):
+    """
+    按整个文件确定需要统一类型的列
+
+    整数列有空值时 pandas 读成 float64, 而逐批转换时没有空值的批次仍是整数,
+    同一列会混出 "1" 和 "1.0"。这里根据各行组统计中的 null_count 找出有空值的整数列,
+    导出时统一转为 float64; 没有统计信息的行组单独读取该列计数。
+
+    参数:
+    parquet_file (pq.ParquetFile): 源文件
+    columns (list): 导出的列, None 表示全部列
+
+    返回:
+    dict: {列名: 目标 Arrow 类型}
+    """
+    schema = parquet_file.schema_arrow
+    names = columns if columns is not None else schema.names
+    candidates = {name for name in names if pa.types.is_integer(schema.field(name).type)}
+    metadata = parquet_file.metadata
+
+    nullable = set()
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            name = column.path_in_schema
+            if name not in candidates or name in nullable:
+                continue
+            stats = column.statistics
+            if stats is not None and stats.has_null_count:
+                null_count = stats.null_count
+            else:
+                null_count = parquet_file.read_row_group(i, columns=[name]).column(0).null_count
+            if null_count:
+                nullable.add(name)
+
+    return {name: pa.float64() for name in nullable}
+
+
+def _encode(table, columns, delimiter, header, casts=None):
+    """把一个数据块格式化为分隔文本 (与 DataFrame.to_csv 的输出格式一致)"""
+    if columns is not None:
+        table = table.select(columns)
+    for name, target in (casts or {}).items():
+        index = table.schema.get_field_index(name)
+        if index >= 0:
+            table = table.set_column(index, name, table.column(index).cast(target))
+    return table.to_pandas().to_csv(sep=delimiter, index=False, header=header)
+
+
+def _iter_tables(parquet_file, read_columns, expression, batch_size):
+    """按记录批次流式读取, 每次只有一个批次在内存中"""
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=read_columns):
+        table = pa.Table.from_batches([batch])
+        if expression is not None:
+            table = table.filter(expression)
+        if table.num_rows:
+            yield table
+
+
+def execute_parquet_to_txt_export(input_path, output_path, delimiter='\t', columns=None,
+                                  filters=None, batch_size=DEFAULT_BATCH_SIZE, workers=1):
     """
     执行 Parquet 到 TXT 的数据转换作业
-    
+
+    按记录批次流式读取并增量写出, 内存占用与文件大小无关。
+    workers > 1 时按行组并行转换, 写出顺序与行组顺序一致,
+    同时在途的行组数不超过 2 * workers。
+
     参数:
     input_path (str): 源 Parquet 文件路径
     output_path (str): 目标文本文件路径
     delimiter (str): 文本数据分隔符，默认为制表符
+    columns (list): 导出的列, None 表示全部列
+    filters (list): 过滤条件 (文本或 (列名, 比较符, 值) 元组), 多个条件取逻辑与
+    batch_size (int): 每个记录批次的行数
+    workers (int): 并行转换的线程数
+
+    返回:
+    int: 导出的行数
     """
-    # 建立底层解析引擎并加载二进制数据
-    # 要求环境已安装 pyarrow 或 fastparquet
-    data_frame = pd.read_parquet(input_path)
-
-    # 实施持久化转换
-    # 排除行索引以维持数据块的纯净度
-    data_frame.to_csv(
-        output_path, 
-        sep=delimiter, 
-        index=False, 
-        encoding='utf-8'
-    )
+    parquet_file = pq.ParquetFile(input_path)
+    schema = parquet_file.schema_arrow
+    if columns is not None:
+        columns = list(columns)
+
+    expression = None
+    filter_columns = []
+    for condition in filters or []:
+        name, item = parse_filter(condition, schema)
+        filter_columns.append(name)
+        expression = item if expression is None else expression & item
+
+    # 过滤条件用到但不导出的列也需要读取
+    read_columns = None
+    if columns is not None:
+        read_columns = columns + [c for c in dict.fromkeys(filter_columns) if c not in columns]
+
+    # 每列的输出类型按整个文件确定, 与整表读入 pandas 一致
+    casts = _column_casts(parquet_file, columns)
+
+    rows = 0
+    with open(output_path, 'w', encoding='utf-8', newline='') as output:
+        # 列头单独写出, 数据块都不带列头
+        output.write(_encode(schema.empty_table(), columns, delimiter, header=True))
+
+        if workers <= 1 or parquet_file.num_row_groups <= 1:
+            for table in _iter_tables(parquet_file, read_columns, expression, batch_size):
+                output.write(_encode(table, columns, delimiter, header=False, casts=casts))
+                rows += table.num_rows
+        else:
+            # ParquetFile 不保证线程安全, 每个线程打开自己的句柄
+            local = threading.local()
+
+            def convert(index):
+                if not hasattr(local, 'parquet_file'):
+                    local.parquet_file = pq.ParquetFile(input_path)
+                table = local.parquet_file.read_row_group(index, columns=read_columns)
+                if expression is not None:
+                    table = table.filter(expression)
+                if table.num_rows == 0:
+                    return 0, ''
+                return table.num_rows, _encode(table, columns, delimiter, header=False, casts=casts)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                next_group = 0
+                while next_group < parquet_file.num_row_groups or pending:
+                    while next_group < parquet_file.num_row_groups and len(pending) < 2 * workers:
+                        pending.append(executor.submit(convert, next_group))
+                        next_group += 1
+                    # 按行组顺序写出
+                    n_rows, text = pending.popleft().result()
+                    output.write(text)
+                    rows += n_rows
+
+    return rows
+
 
 if __name__ == "__main__":
     # 配置输入与输出参数
     SOURCE_FILE = "/home/project/tushare-downloader/tushare_data/index_basic/data.parquet"
     TARGET_FILE = 'output_data.txt'
 
-    # 启动转换流程
-    execute_parquet_to_txt_export(SOURCE_FILE, TARGET_FILE)
+    parser = argparse.ArgumentParser(description="Parquet 导出为分隔文本")
+    parser.add_argument('input', nargs='?', default=SOURCE_FILE, help='源 Parquet 文件路径')
+    parser.add_argument('output', nargs='?', default=TARGET_FILE, help='目标文本文件路径')
+    parser.add_argument('--delimiter', default='\t', help='分隔符, 默认为制表符')
+    parser.add_argument('--columns', nargs='+', help='导出的列')
+    parser.add_argument('--filter', action='append', dest='filters',
+                        help='过滤条件, 如 ts_code=000001.SZ, 可重复')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每个记录批次的行数')
+    parser.add_argument('--workers', type=int, default=1, help='按行组并行转换的线程数')
+    args = parser.parse_args()
 
+    # 启动转换流程
+    execute_parquet_to_txt_export(args.input, args.output, delimiter=args.delimiter,
+                                  columns=args.columns, filters=args.filters,
+                                  batch_size=args.batch_size, workers=args.workers)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+测试 readparquet2.py 的流式导出与整表导出结果一致
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from readparquet2 import execute_parquet_to_txt_export
+
+
+def _write_sample(path: Path, write_statistics: bool = True) -> None:
+    # 空值只出现在部分行组中: 第一个行组的整数列没有空值
+    table = pa.table({
+        'ts_code': ['000001.SZ', '000002.SZ', '000003.SZ', '000004.SZ', None, '000006.SZ', '000007.SZ'],
+        'vol': pa.array([1, 2, 3, None, 5, 6, 7], type=pa.int64()),
+        'amount': pa.array([10, 20, 30, 40, 50, 60, 70], type=pa.int32()),
+        'close': [1.5, None, 3.25, 4.0, 5.0, 6.0, None],
+    })
+    pq.write_table(table, path, row_group_size=3, write_statistics=write_statistics)
+
+
+def test_streamed_export_matches_pandas():
+    """测试多行组、含空值时逐批导出与 pd.read_parquet().to_csv 的输出相同"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for write_statistics in (True, False):
+            source = Path(tmp) / "data.parquet"
+            _write_sample(source, write_statistics)
+            expected = pd.read_parquet(source).to_csv(sep='\t', index=False)
+
+            for workers in (1, 2):
+                output = Path(tmp) / f"out_{workers}.txt"
+                rows = execute_parquet_to_txt_export(str(source), str(output), batch_size=3,
+                                                     workers=workers)
+                assert rows == 7
+                assert output.read_text(encoding='utf-8') == expected
+
+            # 只导出部分列时类型同样按整个文件确定
+            output = Path(tmp) / "out_columns.txt"
+            execute_parquet_to_txt_export(str(source), str(output), columns=['vol'], batch_size=3)
+            assert output.read_text(encoding='utf-8') == pd.read_parquet(source)[['vol']].to_csv(
+                sep='\t', index=False)
+
+
+if __name__ == "__main__":
+    test_streamed_export_matches_pandas()
+    print("✓ 所有测试通过")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+构建内存映射的因子暴露存储
+
+功能:
+    把 by_date/*.parquet 的全部历史写成一个 float32 三维数组 (日期 × 股票 × 因子),
+    回测时用 numpy memmap 零拷贝读取, 不再解码parquet。
+    缺失的 (日期, 股票) 为 NaN。
+
+执行方式:
+    python build_factor_store.py [--workers 8]
+
+输入:
+    /data/barra_factors/by_date/{date}.parquet
+
+输出:
+    /data/barra_factors/store/exposures.npy   float32 [n_dates, n_stocks, n_factors]
+    /data/barra_factors/store/meta.json       version, dates (YYYYMMDD), ts_codes, factors
+"""
+
+import argparse
+import json
+import logging
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+FACTOR_DIR = DATA_ROOT / "barra_factors/by_date"
+STORE_DIR = DATA_ROOT / "barra_factors/store"
+
+EXPOSURES_FILE = "exposures.npy"
+META_FILE = "meta.json"
+
+# 非因子列
+KEY_COLUMNS = {'ts_code', 'trade_date'}
+
+logger = logging.getLogger(__name__)
+
+
+def list_factor_files(factor_dir: Path = FACTOR_DIR) -> Dict[str, Path]:
+    """
+    列出所有按日期存储的因子文件
+
+    Returns:
+        {YYYYMMDD: 路径}, 按日期排序
+    """
+    files = {}
+    for path in Path(factor_dir).glob("*.parquet"):
+        if len(path.stem) == 8 and path.stem.isdigit():
+            files[path.stem] = path
+    return dict(sorted(files.items()))
+
+
+def collect_universe(files: Dict[str, Path], max_workers: int = 8) -> Tuple[List[str], List[str]]:
+    """
+    收集全部股票代码和因子列 (只读取ts_code列和schema)
+
+    Returns:
+        (排序后的股票代码列表, 因子列表 (按列首次出现的顺序))
+    """
+    def read_codes(path: Path):
+        table = pq.read_table(path, columns=['ts_code'])
+        return pq.read_schema(path).names, table.column('ts_code').to_numpy(zero_copy_only=False)
+
+    codes = set()
+    factors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for names, values in executor.map(read_codes, files.values()):
+            for name in names:
+                if name not in KEY_COLUMNS and name not in factors:
+                    factors.append(name)
+            codes.update(values.tolist())
+    return sorted(codes), factors
+
+
+def build_store(factor_dir: Path = FACTOR_DIR, store_dir: Path = STORE_DIR,
+                max_workers: int = 8) -> Dict:
+    """
+    全量构建因子存储
+
+    先写到临时目录, 完成后替换旧存储, 读取方不会看到写了一半的数组。
+
+    Args:
+        factor_dir: by_date 因子目录
+        store_dir: 存储输出目录
+        max_workers: 并发读取线程数
+
+    Returns:
+        meta 字典
+    """
+    files = list_factor_files(factor_dir)
+    if not files:
+        raise FileNotFoundError(f"没有找到因子文件: {factor_dir}")
+
+    ts_codes, factors = collect_universe(files, max_workers)
+    dates = list(files)
+    code_index = pd.Index(ts_codes)
+    logger.info(f"{len(dates)} 个交易日, {len(ts_codes)} 只股票, {len(factors)} 个因子")
+
+    store_dir = Path(store_dir)
+    tmp_dir = store_dir.with_name(store_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    exposures = np.lib.format.open_memmap(tmp_dir / EXPOSURES_FILE, mode='w+', dtype=np.float32,
+                                          shape=(len(dates), len(ts_codes), len(factors)))
+    exposures[:] = np.nan
+
+    def read(path: Path) -> pd.DataFrame:
+        df = pd.read_parquet(path)
+        return df.reindex(columns=['ts_code'] + factors)
+
+    # executor.map 按日期顺序返回, 同时最多有 max_workers 个文件在读取
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for i, df in enumerate(executor.map(read, files.values())):
+            positions = code_index.get_indexer(df['ts_code'])
+            exposures[i, positions, :] = df[factors].to_numpy(dtype=np.float32, na_value=np.nan)
+
+    exposures.flush()
+    del exposures
+
+    meta = {
+        'version': datetime.now().strftime('%Y%m%d%H%M%S%f'),
+        'dates': dates,
+        'ts_codes': ts_codes,
+        'factors': factors,
+        'dtype': 'float32',
+    }
+    with open(tmp_dir / META_FILE, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    # 替换旧存储
+    old_dir = store_dir.with_name(store_dir.name + ".old")
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if store_dir.exists():
+        store_dir.rename(old_dir)
+    tmp_dir.rename(store_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建内存映射的因子暴露存储")
+    parser.add_argument('--input', type=Path, default=FACTOR_DIR, help='by_date 因子目录')
+    parser.add_argument('--output', type=Path, default=STORE_DIR, help='存储输出目录')
+    parser.add_argument('--workers', type=int, default=8, help='并发读取线程数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    meta = build_store(args.input, args.output, args.workers)
+    size_mb = (args.output / EXPOSURES_FILE).stat().st_size / 1024 ** 2
+    logger.info(f"已保存到: {args.output} ({size_mb:.1f} MB, 版本 {meta['version']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+构建指数成分股时点表 (point-in-time)
+
+功能:
+    把 index_weight 的全部历史快照转换为区间表, 每行表示一只股票在相邻两次快照之间的成分权重:
+        index_code, ts_code, in_date, out_date, weight
+    in_date 为快照日期 (含), out_date 为下一次快照日期 (不含), 最后一次快照的 out_date 为空。
+    回测按日期查询成分股时不再使用当前成分股名单, 避免幸存者偏差。
+
+执行方式:
+    python build_index_constituents.py [--indexes 000300.SH 000905.SH 000852.SH]
+
+输入:
+    /data/tushare_data/index_weight/**/data.parquet
+
+输出:
+    /data/barra_config/index_constituents.parquet
+    /data/barra_config/csi300.txt (最新一期沪深300成分股, 兼容旧的静态名单)
+"""
+
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+TUSHARE_DATA_DIR = DATA_ROOT / "tushare_data"
+INDEX_WEIGHT_DIR = TUSHARE_DATA_DIR / "index_weight"
+OUTPUT_DIR = DATA_ROOT / "barra_config"
+OUTPUT_FILE = OUTPUT_DIR / "index_constituents.parquet"
+
+# 默认指数: 沪深300 / 中证500 / 中证1000
+DEFAULT_INDEXES = ['000300.SH', '000905.SH', '000852.SH']
+
+# 深市代码的同一指数, 统一为沪市代码
+INDEX_ALIASES = {
+    '399300.SZ': '000300.SH',
+    '399905.SZ': '000905.SH',
+    '399852.SZ': '000852.SH',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def load_index_weights(index_codes: Sequence[str], index_weight_dir: Path = INDEX_WEIGHT_DIR,
+                       max_workers: int = 8) -> pd.DataFrame:
+    """
+    读取指定指数的全部 index_weight 历史
+
+    Args:
+        index_codes: 指数代码列表 (沪市代码)
+        index_weight_dir: index_weight 数据目录
+        max_workers: 并发读取线程数
+
+    Returns:
+        DataFrame[index_code, ts_code, trade_date, weight], 同一快照内按股票去重
+    """
+    files = sorted(Path(index_weight_dir).rglob("*.parquet"))
+    wanted = set(index_codes)
+    codes = list(wanted | {alias for alias, code in INDEX_ALIASES.items() if code in wanted})
+
+    def read(path: Path) -> Optional[pd.DataFrame]:
+        try:
+            df = pd.read_parquet(path, columns=['index_code', 'con_code', 'trade_date', 'weight'],
+                                 filters=[('index_code', 'in', codes)])
+        except Exception as e:
+            logger.warning(f"读取失败 {path}: {e}")
+            return None
+        return df if len(df) > 0 else None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = [df for df in executor.map(read, files) if df is not None]
+
+    if not frames:
+        return pd.DataFrame(columns=['index_code', 'ts_code', 'trade_date', 'weight'])
+
+    df = pd.concat(frames, ignore_index=True).dropna(subset=['con_code', 'trade_date'])
+    df['index_code'] = df['index_code'].replace(INDEX_ALIASES)
+    df['trade_date'] = df['trade_date'].astype(str)
+    df = df.rename(columns={'con_code': 'ts_code'})
+    return df.drop_duplicates(subset=['index_code', 'trade_date', 'ts_code'], keep='last')
+
+
+def build_intervals(weights: pd.DataFrame) -> pd.DataFrame:
+    """
+    把成分股快照转换为区间表
+
+    Args:
+        weights: DataFrame[index_code, ts_code, trade_date, weight]
+
+    Returns:
+        DataFrame[index_code, ts_code, in_date, out_date, weight], 按 (index_code, in_date, ts_code) 排序
+    """
+    intervals = []
+    for index_code, group in weights.groupby('index_code', sort=True):
+        snapshots = sorted(group['trade_date'].unique())
+        next_snapshot = dict(zip(snapshots, snapshots[1:] + [None]))
+        out = group[['ts_code', 'trade_date', 'weight']].rename(columns={'trade_date': 'in_date'})
+        out.insert(0, 'index_code', index_code)
+        out['out_date'] = out['in_date'].map(next_snapshot)
+        intervals.append(out)
+
+    columns = ['index_code', 'ts_code', 'in_date', 'out_date', 'weight']
+    if not intervals:
+        return pd.DataFrame(columns=columns)
+    result = pd.concat(intervals, ignore_index=True)[columns]
+    return result.sort_values(['index_code', 'in_date', 'ts_code']).reset_index(drop=True)
+
+
+def latest_members(intervals: pd.DataFrame, index_code: str) -> List[str]:
+    """最新一期的成分股 (out_date 为空的区间)"""
+    current = intervals[(intervals['index_code'] == index_code) & intervals['out_date'].isna()]
+    return sorted(current['ts_code'].unique())
+
+
+def save_constituents(intervals: pd.DataFrame, output_file: Path = OUTPUT_FILE) -> Dict[str, int]:
+    """
+    保存区间表, 并更新最新一期沪深300名单 csi300.txt
+
+    Returns:
+        {index_code: 最新成分股数}
+    """
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = output_file.with_suffix('.tmp')
+    intervals.to_parquet(tmp_file, index=False)
+    tmp_file.replace(output_file)
+
+    counts = {code: len(latest_members(intervals, code)) for code in intervals['index_code'].unique()}
+
+    csi300 = latest_members(intervals, '000300.SH')
+    if csi300:
+        with open(output_file.parent / "csi300.txt", 'w') as f:
+            for stock in csi300:
+                f.write(stock + '\n')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建指数成分股时点表")
+    parser.add_argument('--indexes', nargs='+', default=DEFAULT_INDEXES, help='指数代码')
+    parser.add_argument('--output', type=Path, default=OUTPUT_FILE, help='输出文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    weights = load_index_weights(args.indexes)
+    logger.info(f"读取 {len(weights)} 条成分权重, {weights['trade_date'].nunique()} 个快照")
+
+    intervals = build_intervals(weights)
+    counts = save_constituents(intervals, args.output)
+    for code, count in counts.items():
+        n_snapshots = intervals.loc[intervals['index_code'] == code, 'in_date'].nunique()
+        logger.info(f"{code}: {n_snapshots} 个快照, 最新成分股 {count} 只")
+    logger.info(f"已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
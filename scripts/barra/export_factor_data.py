@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+导出因子暴露为LEAN自定义数据 (BarraFactorData / BarraFactorUniverse)
+
+功能:
+    1. 按股票导出: by_stock/{ts_code}.parquet -> factors/{ts_code}.csv (每行一个交易日)
+    2. 按日期导出: by_date/{date}.parquet -> universe/{date}.csv (每行一只股票)
+    只重写源文件比CSV更新的文件, 每日运行只产生增量写入
+
+执行方式:
+    python export_factor_data.py [--output LEAN数据目录] [--workers 8] [--force]
+
+输入:
+    /data/barra_factors/by_stock/{ts_code}.parquet
+    /data/barra_factors/by_date/{date}.parquet
+
+输出:
+    {LEAN Data}/alternative/barra/factors/{ts_code}.csv
+    {LEAN Data}/alternative/barra/universe/{YYYYMMDD}.csv
+"""
+
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+FACTOR_BY_STOCK_DIR = DATA_ROOT / "barra_factors/by_stock"
+FACTOR_BY_DATE_DIR = DATA_ROOT / "barra_factors/by_date"
+LEAN_DATA_DIR = Path(__file__).resolve().parents[2] / "Data"
+BARRA_DATA_SUBDIR = Path("alternative") / "barra"
+
+# 因子列表 (CSV列顺序)
+STYLE_FACTORS = [
+    'size', 'beta', 'momentum', 'volatility', 'non_linear_size',
+    'book_to_price', 'liquidity', 'earnings_yield', 'growth', 'leverage'
+]
+
+INDUSTRY_FACTORS = [
+    'ind_petrochemical', 'ind_coal', 'ind_nonferrous', 'ind_utilities', 'ind_steel',
+    'ind_chemicals', 'ind_building_materials', 'ind_construction', 'ind_transportation',
+    'ind_automobiles', 'ind_machinery', 'ind_defense', 'ind_electrical_equipment',
+    'ind_electronics', 'ind_computers', 'ind_communications', 'ind_consumer_appliances',
+    'ind_light_manufacturing', 'ind_textiles_apparel', 'ind_food_beverage',
+    'ind_agriculture', 'ind_banking', 'ind_non_bank_finance', 'ind_real_estate',
+    'ind_commerce_retail', 'ind_social_services', 'ind_media', 'ind_pharmaceuticals',
+    'ind_environmental', 'ind_comprehensive'
+]
+
+ALL_FACTORS = STYLE_FACTORS + INDUSTRY_FACTORS
+
+# 数值格式
+FLOAT_FORMAT = '%.6g'
+
+logger = logging.getLogger(__name__)
+
+
+def is_stale(source: Path, target: Path) -> bool:
+    """目标文件不存在或比源文件旧"""
+    return not target.exists() or target.stat().st_mtime_ns < source.stat().st_mtime_ns
+
+
+def write_csv(df: pd.DataFrame, target: Path) -> None:
+    """原子写入CSV (LEAN读取时不会看到写了一半的文件)"""
+    tmp_path = target.with_name(f".{target.name}.tmp")
+    df.to_csv(tmp_path, index=False, float_format=FLOAT_FORMAT)
+    os.replace(tmp_path, target)
+
+
+def export_stock(source: Path, target: Path) -> int:
+    """
+    导出单只股票的因子历史
+
+    Returns:
+        行数
+    """
+    df = pd.read_parquet(source)
+    factors = [f for f in ALL_FACTORS if f in df.columns]
+    out = df[['trade_date'] + factors].rename(columns={'trade_date': 'date'})
+    out['date'] = pd.to_datetime(out['date'].astype(str)).dt.strftime('%Y%m%d')
+    out = out.drop_duplicates(subset='date', keep='last').sort_values('date')
+    write_csv(out, target)
+    return len(out)
+
+
+def export_date(source: Path, target: Path) -> int:
+    """
+    导出单个交易日的因子截面
+
+    Returns:
+        行数
+    """
+    df = pd.read_parquet(source)
+    if 'ts_code' not in df.columns:
+        df = df.reset_index()
+    factors = [f for f in ALL_FACTORS if f in df.columns]
+    out = df[['ts_code'] + factors].sort_values('ts_code')
+    write_csv(out, target)
+    return len(out)
+
+
+def export_all(by_stock_dir: Path = FACTOR_BY_STOCK_DIR, by_date_dir: Path = FACTOR_BY_DATE_DIR,
+               lean_data_dir: Path = LEAN_DATA_DIR, max_workers: int = 8,
+               force: bool = False) -> Dict[str, int]:
+    """
+    导出按股票和按日期的CSV文件 (只处理有变化的源文件)
+
+    Args:
+        by_stock_dir: 按股票存储的因子目录
+        by_date_dir: 按日期存储的因子目录
+        lean_data_dir: LEAN数据根目录
+        max_workers: 并发线程数
+        force: 忽略修改时间, 全部重写
+
+    Returns:
+        {'stocks': 导出的股票文件数, 'dates': 导出的日期文件数}
+    """
+    output = Path(lean_data_dir) / BARRA_DATA_SUBDIR
+    (output / "factors").mkdir(parents=True, exist_ok=True)
+    (output / "universe").mkdir(parents=True, exist_ok=True)
+
+    jobs: List = []
+    for source in sorted(Path(by_stock_dir).glob("*.parquet")):
+        target = output / "factors" / f"{source.stem.upper()}.csv"
+        if force or is_stale(source, target):
+            jobs.append((export_stock, source, target, 'stocks'))
+    for source in sorted(Path(by_date_dir).glob("*.parquet")):
+        target = output / "universe" / f"{source.stem}.csv"
+        if force or is_stale(source, target):
+            jobs.append((export_date, source, target, 'dates'))
+
+    counts = {'stocks': 0, 'dates': 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(kind, source, executor.submit(func, source, target)) for func, source, target, kind in jobs]
+        for kind, source, future in futures:
+            try:
+                future.result()
+                counts[kind] += 1
+            except Exception as e:
+                logger.error(f"导出失败 {source}: {e}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出因子暴露为LEAN自定义数据")
+    parser.add_argument('--output', type=Path, default=LEAN_DATA_DIR, help='LEAN数据根目录')
+    parser.add_argument('--workers', type=int, default=8, help='并发线程数')
+    parser.add_argument('--force', action='store_true', help='全部重写')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    counts = export_all(lean_data_dir=args.output, max_workers=args.workers, force=args.force)
+    logger.info(f"导出完成: {counts['stocks']} 个股票文件, {counts['dates']} 个日期文件 "
+                f"-> {args.output / BARRA_DATA_SUBDIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@
 生成CSI300成分股列表
 
 功能:
-    从index_weight数据提取沪深300成分股列表
+    从index_weight数据提取沪深300成分股列表 (仅最新成分股)
+
+    回测需要按日期查询成分股时使用 build_index_constituents.py 生成的时点表
 
 输出:
     /data/barra_config/csi300.txt
@@ -32,15 +34,16 @@ for date_dir in date_dirs[:5]:  # 检查最近5个交易日
         df = pd.read_parquet(date_dir / "data.parquet")
 
         # 提取000300.SH (沪市) 和 399300.SZ (深市)
-        df_sh = df[df['index_code'] == '000300.SH'][['con_code']].dropna()
-        df_sz = df[df['index_code'] == '399300.SZ'][['con_code']].dropna()
+        df_sh = df[df['index_code'] == '000300.SH']['con_code'].dropna()
+        df_sz = df[df['index_code'] == '399300.SZ']['con_code'].dropna()
 
         csi300_stocks.update(df_sh.tolist())
         csi300_stocks.update(df_sz.tolist())
 
         if len(csi300_stocks) >= 300:
             break
-    except:
+    except Exception as e:
+        print(f"读取失败 {date_dir}: {e}")
         continue
 
 print(f"找到 {len(csi300_stocks)} 只CSI300成分股")
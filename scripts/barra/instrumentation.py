@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Barra CNE5 流水线性能埋点 - 按阶段记录耗时、吞吐、内存和IO
+
+功能:
+    1. 每个阶段记录: 墙钟时间、CPU时间 (本进程 + 已结束的子进程)、行数/秒、
+       峰值RSS、块设备读写字节数、并行进程利用率
+    2. 每个阶段结束时以JSON行追加到 barra_reports/perf_metrics.jsonl
+    3. 汇总最近两次运行的各阶段指标, 供 step5 报告对比
+
+说明:
+    只使用标准库 (resource), 不依赖psutil。
+    本进程与子进程的读写字节数都来自 getrusage 的 ru_inblock / ru_oublock,
+    即实际落到块设备的IO (命中页缓存的读取不计入), 两者口径一致, 可以相加。
+    子进程 (multiprocessing.Pool) 的CPU时间和块IO来自 RUSAGE_CHILDREN,
+    只包含阶段内已结束并被回收的子进程, 因此进程池应在阶段内关闭。
+    run_pipeline.py 通过环境变量 BARRA_RUN_ID 为同一次调度的所有步骤设置相同的运行ID。
+
+用法:
+    perf = PerfRecorder('step3')
+    with perf.phase('regression', workers=4) as phase:
+        ...
+        phase['rows'] = len(dates)
+    perf.finish()
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+REPORTS_DIR = DATA_ROOT / "barra_reports"
+PERF_LOG_FILE = REPORTS_DIR / "perf_metrics.jsonl"
+
+RUN_ID_ENV = "BARRA_RUN_ID"
+
+# ru_maxrss 在Linux上单位为KB, 在macOS上为字节
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# ru_inblock / ru_oublock 的块大小
+_BLOCK_SIZE = 512
+
+
+def take_snapshot() -> Dict[str, float]:
+    """
+    采集当前进程及其已回收子进程的资源计数
+
+    Returns:
+        资源计数字典 (累计值, 用于计算阶段差值)
+    """
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        'wall': time.perf_counter(),
+        'cpu': self_usage.ru_utime + self_usage.ru_stime,
+        'children_cpu': child_usage.ru_utime + child_usage.ru_stime,
+        'read_bytes': self_usage.ru_inblock * _BLOCK_SIZE,
+        'write_bytes': self_usage.ru_oublock * _BLOCK_SIZE,
+        'children_read_bytes': child_usage.ru_inblock * _BLOCK_SIZE,
+        'children_write_bytes': child_usage.ru_oublock * _BLOCK_SIZE,
+        'peak_rss': self_usage.ru_maxrss * _MAXRSS_UNIT,
+        'children_peak_rss': child_usage.ru_maxrss * _MAXRSS_UNIT
+    }
+
+
+def phase_metrics(start: Dict[str, float], end: Dict[str, float],
+                  rows: Optional[int] = None, workers: Optional[int] = None) -> Dict:
+    """
+    根据阶段开始/结束的资源计数计算阶段指标
+
+    Args:
+        start: 阶段开始时的 take_snapshot()
+        end: 阶段结束时的 take_snapshot()
+        rows: 阶段处理的行数 (或股票数、日期数)
+        workers: 阶段使用的并行进程数
+
+    Returns:
+        指标字典
+    """
+    wall = end['wall'] - start['wall']
+    cpu = end['cpu'] - start['cpu']
+    children_cpu = end['children_cpu'] - start['children_cpu']
+
+    metrics = {
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu, 4),
+        'children_cpu_s': round(children_cpu, 4),
+        'read_bytes': int(end['read_bytes'] - start['read_bytes']),
+        'write_bytes': int(end['write_bytes'] - start['write_bytes']),
+        'children_read_bytes': int(end['children_read_bytes'] - start['children_read_bytes']),
+        'children_write_bytes': int(end['children_write_bytes'] - start['children_write_bytes']),
+        # 峰值为进程生命周期内的最大值, 不是阶段内的增量
+        'peak_rss_mb': round(end['peak_rss'] / 2**20, 1),
+        'children_peak_rss_mb': round(end['children_peak_rss'] / 2**20, 1),
+        'rows': rows,
+        'rows_per_s': round(rows / wall, 2) if rows and wall > 0 else None,
+        'workers': workers,
+        'worker_utilization': None
+    }
+
+    # 并行阶段: 子进程CPU时间占 (墙钟时间 × 进程数) 的比例
+    if workers and workers > 1 and wall > 0:
+        metrics['worker_utilization'] = round(children_cpu / (wall * workers), 3)
+
+    return metrics
+
+
+class PerfRecorder:
+    """单个步骤的性能记录器"""
+
+    def __init__(self, step: str, log_file: Path = None, run_id: Optional[str] = None):
+        """
+        初始化记录器
+
+        Args:
+            step: 步骤名称 (如 step3)
+            log_file: JSON行文件路径, 默认为 PERF_LOG_FILE
+            run_id: 运行ID, 默认取环境变量 BARRA_RUN_ID, 否则为当前时间
+        """
+        self.step = step
+        self.log_file = Path(log_file) if log_file is not None else PERF_LOG_FILE
+        self.run_id = run_id or os.environ.get(RUN_ID_ENV) or datetime.now().strftime('%Y%m%dT%H%M%S')
+        self.records: List[Dict] = []
+        self._start = take_snapshot()
+
+    @contextmanager
+    def phase(self, name: str, rows: Optional[int] = None,
+              workers: Optional[int] = None) -> Iterator[Dict]:
+        """
+        记录一个阶段
+
+        Args:
+            name: 阶段名称
+            rows: 处理的行数 (也可在阶段内设置 phase['rows'])
+            workers: 并行进程数
+
+        Yields:
+            可写字典: 阶段内设置 'rows' / 'workers' 及其他附加字段
+        """
+        extra = {'rows': rows, 'workers': workers}
+        start = take_snapshot()
+        status = 'success'
+        try:
+            yield extra
+        except BaseException:
+            status = 'failed'
+            raise
+        finally:
+            end = take_snapshot()
+            rows, workers = extra.pop('rows'), extra.pop('workers')
+            record = {'phase': name, 'status': status}
+            record.update(phase_metrics(start, end, rows, workers))
+            record.update(extra)
+            self._emit(record)
+
+    def finish(self, rows: Optional[int] = None) -> Dict:
+        """
+        记录整个步骤的总指标
+
+        Args:
+            rows: 步骤处理的总行数
+
+        Returns:
+            总指标记录
+        """
+        record = {'phase': 'total', 'status': 'success'}
+        record.update(phase_metrics(self._start, take_snapshot(), rows))
+        self._emit(record)
+        return record
+
+    def _emit(self, record: Dict) -> None:
+        """追加一条JSON行"""
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            'run_id': self.run_id,
+            'step': self.step,
+            'pid': os.getpid(),
+            **record
+        }
+        self.records.append(record)
+        try:
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+            # 单行写入以追加模式打开, 并发步骤的记录不会交错
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError:
+            pass
+
+
+def load_perf_records(log_file: Path = None) -> List[Dict]:
+    """
+    读取性能记录 (忽略损坏的行)
+
+    Args:
+        log_file: JSON行文件路径, 默认为 PERF_LOG_FILE
+
+    Returns:
+        记录列表 (按写入顺序)
+    """
+    log_file = Path(log_file) if log_file is not None else PERF_LOG_FILE
+    if not log_file.exists():
+        return []
+
+    records = []
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def summarize_perf(records: List[Dict]) -> List[Dict]:
+    """
+    汇总每个 (步骤, 阶段) 最近一次与上一次运行的指标
+
+    Args:
+        records: load_perf_records() 的返回值
+
+    Returns:
+        [{step, phase, run_id, wall_s, cpu_s, rows_per_s, peak_rss_mb, read_bytes, write_bytes,
+          worker_utilization, previous_wall_s, wall_change}], 按步骤和首次出现顺序排列
+    """
+    history: Dict[tuple, List[Dict]] = {}
+    for record in records:
+        if record.get('status') != 'success':
+            continue
+        history.setdefault((record['step'], record['phase']), []).append(record)
+
+    summary = []
+    for (step, phase), runs in sorted(history.items(), key=lambda item: item[0][0]):
+        latest = runs[-1]
+        previous = runs[-2] if len(runs) > 1 else None
+        row = {
+            'step': step,
+            'phase': phase,
+            'run_id': latest['run_id'],
+            'wall_s': latest['wall_s'],
+            'cpu_s': round(latest['cpu_s'] + latest.get('children_cpu_s', 0.0), 4),
+            'rows_per_s': latest.get('rows_per_s'),
+            'peak_rss_mb': max(latest.get('peak_rss_mb', 0.0), latest.get('children_peak_rss_mb', 0.0)),
+            'read_bytes': latest.get('read_bytes', 0) + latest.get('children_read_bytes', 0),
+            'write_bytes': latest.get('write_bytes', 0) + latest.get('children_write_bytes', 0),
+            'worker_utilization': latest.get('worker_utilization'),
+            'previous_wall_s': previous['wall_s'] if previous else None,
+            'wall_change': None
+        }
+        if previous and previous['wall_s'] > 0:
+            row['wall_change'] = round(latest['wall_s'] / previous['wall_s'] - 1.0, 4)
+        summary.append(row)
+
+    return summary
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Barra CNE5 验证报告图表渲染 - 并行渲染与磁盘缓存
+
+功能:
+    1. 图表渲染函数只接收numpy数组输入 (可pickle), 在进程池中并行执行
+    2. 以 (图表名称, 渲染版本, 输入数组内容) 的哈希作为缓存键,
+       渲染结果以base64文本缓存在磁盘上, 输入不变的图表直接复用
+
+被 step5_validate.py 调用。
+"""
+
+import base64
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # 非GUI后端
+import matplotlib.pyplot as plt
+
+# 修改任何渲染函数的绘图逻辑后递增, 使旧缓存失效
+CHART_RENDER_VERSION = 1
+
+# 图表任务: (渲染函数, {输入名称: numpy数组})
+ChartJob = Tuple[Callable[..., str], Dict[str, np.ndarray]]
+
+
+def _figure_to_base64(fig) -> str:
+    """将matplotlib图表保存为PNG并编码为base64"""
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=100)
+    plt.close(fig)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+def render_factor_distribution(factors: np.ndarray, **values: np.ndarray) -> str:
+    """
+    因子分布直方图 (2×5网格)
+
+    Args:
+        factors: 因子名称数组
+        values: {factor: 因子值数组}
+    """
+    fig, axes = plt.subplots(2, 5, figsize=(15, 8))
+    fig.suptitle('Barra CNE5 风格因子分布', fontsize=14)
+
+    for i, factor in enumerate(factors):
+        ax = axes[i // 5, i % 5]
+        factor_values = values.get(str(factor))
+        if factor_values is not None and len(factor_values) > 0:
+            ax.hist(factor_values, bins=50, alpha=0.7, edgecolor='black')
+            ax.set_title(f'{factor}')
+            ax.set_xlabel('Value')
+            ax.set_ylabel('Frequency')
+            ax.grid(True, alpha=0.3)
+
+    return _figure_to_base64(fig)
+
+
+def render_correlation_heatmap(factors: np.ndarray, corr: np.ndarray) -> str:
+    """
+    因子相关性热力图
+
+    Args:
+        factors: 因子名称数组
+        corr: 相关系数矩阵
+    """
+    import pandas as pd
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    sns.heatmap(pd.DataFrame(corr, index=factors, columns=factors),
+                annot=True, fmt='.2f', cmap='coolwarm', center=0,
+                square=True, linewidths=0.5, cbar_kws={"shrink": 0.8},
+                ax=ax)
+    ax.set_title('Barra CNE5 风格因子相关性矩阵', fontsize=14)
+
+    return _figure_to_base64(fig)
+
+
+def render_factor_returns(factors: np.ndarray, dates: np.ndarray, cumulative: np.ndarray) -> str:
+    """
+    因子累计收益率时间序列 (2×5网格)
+
+    Args:
+        factors: 因子名称数组
+        dates: 日期数组 (datetime64)
+        cumulative: 累计收益矩阵 (日期, 因子)
+    """
+    fig, axes = plt.subplots(2, 5, figsize=(15, 8))
+    fig.suptitle('Barra CNE5 风格因子收益率时间序列', fontsize=14)
+
+    for i, factor in enumerate(factors):
+        ax = axes[i // 5, i % 5]
+        ax.plot(dates, cumulative[:, i], linewidth=1)
+        ax.set_title(f'{factor}')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Cumulative Return')
+        ax.grid(True, alpha=0.3)
+
+    return _figure_to_base64(fig)
+
+
+def render_specific_risk(specific_risk: np.ndarray) -> str:
+    """
+    特质风险分布直方图
+
+    Args:
+        specific_risk: 特质风险数组
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.hist(specific_risk, bins=50, alpha=0.7, edgecolor='black')
+    ax.set_title('特质风险分布', fontsize=14)
+    ax.set_xlabel('Specific Risk')
+    ax.set_ylabel('Frequency')
+    mean = float(np.mean(specific_risk)) if len(specific_risk) > 0 else 0.0
+    ax.axvline(mean, color='red', linestyle='--', label=f'Mean: {mean:.4f}')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+    return _figure_to_base64(fig)
+
+
+def render_diagnostics(ic_factors: np.ndarray, ic_dates: np.ndarray, cumulative_ic: np.ndarray,
+                       bias_factors: np.ndarray, bias_dates: np.ndarray, factor_bias: np.ndarray,
+                       specific_bias: np.ndarray) -> str:
+    """
+    因子诊断图: 累计Rank IC与滚动偏差统计量
+
+    Args:
+        ic_factors: IC因子名称数组
+        ic_dates: IC日期数组 (datetime64)
+        cumulative_ic: 累计IC矩阵 (日期, 因子)
+        bias_factors: 偏差统计量因子名称数组
+        bias_dates: 偏差统计量日期数组 (datetime64)
+        factor_bias: 因子偏差统计量矩阵 (日期, 因子)
+        specific_bias: 特质风险偏差统计量中位数 (长度为0表示缺失)
+    """
+    fig, axes = plt.subplots(1, 2, figsize=(15, 5))
+
+    ax = axes[0]
+    for i, factor in enumerate(ic_factors):
+        ax.plot(ic_dates, cumulative_ic[:, i], linewidth=1, label=factor)
+    ax.set_title('累计 Rank IC')
+    ax.set_xlabel('Date')
+    ax.legend(fontsize=7, ncol=2)
+    ax.grid(True, alpha=0.3)
+
+    ax = axes[1]
+    for i, factor in enumerate(bias_factors):
+        ax.plot(bias_dates, factor_bias[:, i], linewidth=0.8, alpha=0.6, label=factor)
+    if len(specific_bias) > 0:
+        ax.plot(bias_dates, specific_bias, color='black', linewidth=1.5, label='specific (median)')
+    ax.axhline(1.0, color='red', linestyle='--', linewidth=1)
+    ax.set_title('滚动偏差统计量')
+    ax.set_xlabel('Date')
+    ax.legend(fontsize=7, ncol=2)
+    ax.grid(True, alpha=0.3)
+
+    return _figure_to_base64(fig)
+
+
+def chart_cache_key(name: str, render_func: Callable[..., str], inputs: Dict[str, np.ndarray]) -> str:
+    """
+    计算图表缓存键
+
+    Args:
+        name: 图表名称
+        render_func: 渲染函数
+        inputs: 渲染输入数组
+
+    Returns:
+        SHA-256十六进制摘要
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{name}|{render_func.__name__}|v{CHART_RENDER_VERSION}".encode('utf-8'))
+    for key in sorted(inputs):
+        array = np.ascontiguousarray(inputs[key])
+        digest.update(f"|{key}|{array.dtype.str}|{array.shape}|".encode('utf-8'))
+        if array.dtype.kind in ('U', 'S', 'O'):
+            digest.update('\x1f'.join(map(str, array.ravel())).encode('utf-8'))
+        else:
+            digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _render_job(job: ChartJob) -> str:
+    """进程池任务包装 (模块级函数, 可pickle)"""
+    render_func, inputs = job
+    return render_func(**inputs)
+
+
+def _write_cache(path: Path, content: str) -> None:
+    """原子写入缓存文件, 避免并发运行读到半写入的文件"""
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(content, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _read_cache(path: Path) -> Optional[str]:
+    """读取缓存文件; 文件损坏 (不是base64编码的PNG) 时删除并返回None"""
+    try:
+        content = path.read_text(encoding='utf-8')
+        if base64.b64decode(content, validate=True).startswith(PNG_SIGNATURE):
+            return content
+    except (OSError, ValueError):
+        pass
+    path.unlink(missing_ok=True)
+    return None
+
+
+def render_charts(jobs: Dict[str, Optional[ChartJob]], cache_dir: Path,
+                  n_workers: int = 4) -> Tuple[Dict[str, str], int]:
+    """
+    并行渲染图表并使用磁盘缓存
+
+    Args:
+        jobs: {图表名称: (渲染函数, 输入数组)}, 值为None表示无数据 (返回空字符串)
+        cache_dir: 缓存目录, 文件名为 {图表名称}_{缓存键}.b64
+        n_workers: 进程数 (<=1 时在当前进程渲染)
+
+    Returns:
+        ({图表名称: base64 PNG}, 缓存命中数)
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    charts = {}
+    pending = {}
+    hits = 0
+
+    for name, job in jobs.items():
+        if job is None:
+            charts[name] = ""
+            continue
+        cache_path = cache_dir / f"{name}_{chart_cache_key(name, *job)}.b64"
+        cached = _read_cache(cache_path) if cache_path.exists() else None
+        if cached is not None:
+            charts[name] = cached
+            hits += 1
+        else:
+            pending[name] = (job, cache_path)
+
+    if pending:
+        names = list(pending)
+        render_jobs = [pending[name][0] for name in names]
+        if n_workers > 1 and len(render_jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(render_jobs))) as executor:
+                rendered = list(executor.map(_render_job, render_jobs))
+        else:
+            rendered = [_render_job(job) for job in render_jobs]
+
+        for name, content in zip(names, rendered):
+            charts[name] = content
+            cache_path = pending[name][1]
+            # 同一图表的旧版本缓存不再可能命中, 清理掉
+            for stale in cache_dir.glob(f"{name}_*.b64"):
+                stale.unlink(missing_ok=True)
+            _write_cache(cache_path, content)
+
+    return {name: charts[name] for name in jobs}, hits
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Barra CNE5 因子收益率/残差存储 - 基础文件 + 按日期增量分区
+
+功能:
+    1. step3全量计算写入基础文件 factor_returns.parquet / residuals.parquet
+    2. step6增量更新只为新交易日写入小分区文件, 不重写基础文件:
+         factor_returns_inc/{date}.parquet (单行)
+         residuals_inc/{date}.parquet (当日横截面残差)
+    3. 读取时合并基础文件与增量分区, 同一日期以增量分区为准
+    4. 增量分区过多时可合并回基础文件 (compact_store)
+
+被 step3/step4/step5/step6 调用。
+"""
+
+import os
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+RISK_DIR = DATA_ROOT / "barra_risk"
+
+FACTOR_RETURNS_FILE = "factor_returns.parquet"
+RESIDUALS_FILE = "residuals.parquet"
+FACTOR_RETURNS_INC_DIR = "factor_returns_inc"
+RESIDUALS_INC_DIR = "residuals_inc"
+
+
+def _write_atomic(df: pd.DataFrame, path: Path) -> None:
+    """原子写入parquet文件, 避免读取方看到半写入的分区"""
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _read_partitions(partition_dir: Path) -> List[pd.DataFrame]:
+    """按日期顺序读取增量分区"""
+    if not partition_dir.exists():
+        return []
+    return [pd.read_parquet(f) for f in sorted(partition_dir.glob("*.parquet"))]
+
+
+def list_increment_dates(risk_dir: Path = RISK_DIR) -> List[str]:
+    """
+    列出已写入的增量日期
+
+    Args:
+        risk_dir: 风险模型目录
+
+    Returns:
+        日期列表 (YYYYMMDD)
+    """
+    partition_dir = Path(risk_dir) / FACTOR_RETURNS_INC_DIR
+    if not partition_dir.exists():
+        return []
+    return sorted(f.stem for f in partition_dir.glob("*.parquet"))
+
+
+def append_factor_returns(trade_date: str, factor_returns: pd.DataFrame,
+                          residuals: pd.DataFrame, risk_dir: Path = RISK_DIR) -> None:
+    """
+    写入单个交易日的因子收益率和残差分区 (重复写入同一日期会覆盖)
+
+    Args:
+        trade_date: 交易日期 (YYYYMMDD)
+        factor_returns: 单行因子收益率 (trade_date为datetime + 因子列)
+        residuals: 当日残差 (trade_date, ts_code, residual)
+        risk_dir: 风险模型目录
+    """
+    risk_dir = Path(risk_dir)
+    returns_dir = risk_dir / FACTOR_RETURNS_INC_DIR
+    residuals_dir = risk_dir / RESIDUALS_INC_DIR
+    returns_dir.mkdir(parents=True, exist_ok=True)
+    residuals_dir.mkdir(parents=True, exist_ok=True)
+
+    # 先写残差再写因子收益率: 因子收益率分区存在即表示该日期完整
+    _write_atomic(residuals, residuals_dir / f"{trade_date}.parquet")
+    _write_atomic(factor_returns, returns_dir / f"{trade_date}.parquet")
+
+
+def load_factor_returns(risk_dir: Path = RISK_DIR) -> pd.DataFrame:
+    """
+    加载因子收益率时间序列 (基础文件 + 增量分区)
+
+    Args:
+        risk_dir: 风险模型目录
+
+    Returns:
+        因子收益率DataFrame (trade_date为datetime, 按日期升序), 无数据返回空DataFrame
+    """
+    risk_dir = Path(risk_dir)
+    frames = []
+
+    base_file = risk_dir / FACTOR_RETURNS_FILE
+    if base_file.exists():
+        frames.append(pd.read_parquet(base_file))
+    frames.extend(_read_partitions(risk_dir / FACTOR_RETURNS_INC_DIR))
+
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    df['trade_date'] = pd.to_datetime(df['trade_date'])
+    return (df
+            .drop_duplicates(subset=['trade_date'], keep='last')
+            .sort_values('trade_date')
+            .reset_index(drop=True))
+
+
+def load_residuals(risk_dir: Path = RISK_DIR) -> pd.DataFrame:
+    """
+    加载股票残差 (基础文件 + 增量分区)
+
+    Args:
+        risk_dir: 风险模型目录
+
+    Returns:
+        残差DataFrame (trade_date为YYYYMMDD字符串, ts_code, residual), 无数据返回空DataFrame
+    """
+    risk_dir = Path(risk_dir)
+    frames = []
+
+    base_file = risk_dir / RESIDUALS_FILE
+    if base_file.exists():
+        frames.append(pd.read_parquet(base_file))
+    increments = _read_partitions(risk_dir / RESIDUALS_INC_DIR)
+
+    if not increments:
+        return frames[0] if frames else pd.DataFrame()
+
+    df = pd.concat(frames + increments, ignore_index=True)
+    df['trade_date'] = df['trade_date'].astype(str)
+    return df.drop_duplicates(subset=['trade_date', 'ts_code'], keep='last').reset_index(drop=True)
+
+
+def has_factor_returns(risk_dir: Path = RISK_DIR) -> bool:
+    """是否存在因子收益率数据 (基础文件或增量分区)"""
+    risk_dir = Path(risk_dir)
+    return (risk_dir / FACTOR_RETURNS_FILE).exists() or bool(list_increment_dates(risk_dir))
+
+
+def clear_increments(risk_dir: Path = RISK_DIR) -> int:
+    """
+    删除所有增量分区 (全量重算或合并后调用)
+
+    Args:
+        risk_dir: 风险模型目录
+
+    Returns:
+        删除的分区文件数
+    """
+    removed = 0
+    for name in (FACTOR_RETURNS_INC_DIR, RESIDUALS_INC_DIR):
+        partition_dir = Path(risk_dir) / name
+        if not partition_dir.exists():
+            continue
+        for f in partition_dir.glob("*.parquet"):
+            f.unlink()
+            removed += 1
+    return removed
+
+
+def compact_store(risk_dir: Path = RISK_DIR) -> int:
+    """
+    将增量分区合并回基础文件
+
+    Args:
+        risk_dir: 风险模型目录
+
+    Returns:
+        合并的增量日期数
+    """
+    risk_dir = Path(risk_dir)
+    n_dates = len(list_increment_dates(risk_dir))
+    if n_dates == 0:
+        return 0
+
+    _write_atomic(load_factor_returns(risk_dir), risk_dir / FACTOR_RETURNS_FILE)
+    _write_atomic(load_residuals(risk_dir), risk_dir / RESIDUALS_FILE)
+    clear_increments(risk_dir)
+    return n_dates
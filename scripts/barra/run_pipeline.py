@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Barra CNE5 流水线调度 - 按输入指纹跳过未变化的分区
+
+功能:
+    1. 将 step1-step5 组织为有向无环图 (DAG), 依赖满足的步骤并发执行
+    2. 为每个步骤计算输入指纹 (文件大小 + 修改时间 + 脚本内容与参数的哈希):
+         step1 按股票分区 (daily / daily_basic 行情文件)
+         step2 按股票分区 (by_stock 因子文件)
+         step3 按日期分区 (by_date 因子文件)
+         step4 / step5 为整体指纹
+    3. 与上次运行的清单 (manifest) 比较, 只把变化的分区传给步骤脚本
+       (--stocks-file / --dates-file), 无变化的步骤直接跳过
+    4. 每个步骤完成后更新清单, 记录输入指纹、执行模式和耗时
+
+说明:
+    脚本、参数或共享输入 (如 stock_basic、基准指数) 变化时整个步骤全量重跑。
+    修正单只股票的行情数据后重跑, 只会重算该股票的因子、更新其所在日期的by_date文件,
+    并只重算这些日期的因子收益率 (写入增量分区), 风险模型和验证报告整体重跑。
+    step6 (每日增量更新) 不在DAG中, 单独调度。
+
+执行方式:
+    python run_pipeline.py [--parallel N] [--max-concurrent N] [--force] [--dry-run]
+
+输出:
+    /data/barra_reports/pipeline_manifest.json (运行清单)
+    /data/barra_reports/pipeline/{step}.out (各步骤的标准输出)
+    /data/barra_reports/run_pipeline.log
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from instrumentation import RUN_ID_ENV
+
+# 配置路径
+SCRIPT_DIR = Path(__file__).resolve().parent
+DATA_ROOT = Path("/home/project/ccleana/data")
+TUSHARE_DATA_DIR = DATA_ROOT / "tushare_data"
+FACTOR_BY_STOCK_DIR = DATA_ROOT / "barra_factors/by_stock"
+FACTOR_BY_DATE_DIR = DATA_ROOT / "barra_factors/by_date"
+RISK_DIR = DATA_ROOT / "barra_risk"
+REPORTS_DIR = DATA_ROOT / "barra_reports"
+BENCHMARK_FILE = Path("/home/project/tushare-downloader/tushare_data/index_daily/ts_code=000300.SH/data.parquet")
+
+MANIFEST_FILE = REPORTS_DIR / "pipeline_manifest.json"
+WORK_DIR = REPORTS_DIR / "pipeline"
+
+# 清单格式版本, 格式变化时递增使旧清单失效
+MANIFEST_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+# 步骤定义
+#   script: 步骤脚本
+#   deps: 依赖的步骤
+#   modules: 脚本导入的本地模块 (内容变化时全量重跑)
+#   partition: 分区类型 (stock / date / None)
+#   partition_arg: 传递变化分区列表的参数
+PIPELINE_STEPS = {
+    'step1': {
+        'script': 'step1_calculate_factors.py',
+        'deps': [],
+        'modules': ['instrumentation.py'],
+        'partition': 'stock',
+        'partition_arg': '--stocks-file'
+    },
+    'step2': {
+        'script': 'step2_transpose_factors.py',
+        'deps': ['step1'],
+        'modules': ['instrumentation.py'],
+        'partition': 'stock',
+        'partition_arg': '--stocks-file'
+    },
+    'step3': {
+        'script': 'step3_factor_returns.py',
+        'deps': ['step2'],
+        'modules': ['risk_store.py', 'instrumentation.py'],
+        'partition': 'date',
+        'partition_arg': '--dates-file'
+    },
+    'step4': {
+        'script': 'step4_risk_model.py',
+        'deps': ['step3'],
+        'modules': ['risk_store.py', 'instrumentation.py'],
+        'partition': None
+    },
+    'step5_diagnostics': {
+        'script': 'step5_diagnostics.py',
+        'deps': ['step3'],
+        'modules': ['risk_store.py', 'instrumentation.py'],
+        'partition': None
+    },
+    'step5_validate': {
+        'script': 'step5_validate.py',
+        'deps': ['step4', 'step5_diagnostics'],
+        'modules': ['risk_store.py', 'report_charts.py', 'streaming_validator.py', 'instrumentation.py'],
+        'partition': None
+    }
+}
+
+
+def file_fingerprint(path: Path) -> str:
+    """
+    文件指纹: 大小 + 修改时间 (纳秒), 不读取文件内容
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        指纹字符串, 文件不存在返回 "missing"
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def combine_fingerprints(*parts: str) -> str:
+    """将多个指纹合并为一个短哈希"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()[:16]
+
+
+def directory_fingerprint(directory: Path, pattern: str = "*.parquet") -> str:
+    """目录下所有匹配文件的合并指纹"""
+    files = sorted(Path(directory).glob(pattern)) if Path(directory).exists() else []
+    return combine_fingerprints(*(f"{f.name}={file_fingerprint(f)}" for f in files))
+
+
+def code_fingerprint(step: str) -> str:
+    """步骤脚本及其本地模块的内容哈希"""
+    spec = PIPELINE_STEPS[step]
+    digest = hashlib.sha256()
+    for name in [spec['script']] + spec['modules']:
+        path = SCRIPT_DIR / name
+        digest.update(name.encode('utf-8'))
+        digest.update(path.read_bytes() if path.exists() else b'')
+    return digest.hexdigest()[:16]
+
+
+def partition_fingerprints(step: str) -> Dict[str, str]:
+    """
+    计算分区步骤的逐分区输入指纹
+
+    Args:
+        step: 步骤名称
+
+    Returns:
+        {分区键 (ts_code 或 YYYYMMDD): 指纹}
+    """
+    if step == 'step1':
+        daily_dir = TUSHARE_DATA_DIR / "daily"
+        if not daily_dir.exists():
+            return {}
+        fingerprints = {}
+        for stock_dir in daily_dir.iterdir():
+            if not stock_dir.is_dir():
+                continue
+            ts_code = stock_dir.name.replace('date=', '')
+            basic_file = TUSHARE_DATA_DIR / "daily_basic" / stock_dir.name / "data.parquet"
+            fingerprints[ts_code] = combine_fingerprints(
+                file_fingerprint(stock_dir / "data.parquet"), file_fingerprint(basic_file)
+            )
+        return fingerprints
+
+    if step == 'step2':
+        source_dir = FACTOR_BY_STOCK_DIR
+    elif step == 'step3':
+        source_dir = FACTOR_BY_DATE_DIR
+    else:
+        raise ValueError(f"{step} 不是分区步骤")
+
+    if not source_dir.exists():
+        return {}
+    return {f.stem: file_fingerprint(f) for f in source_dir.glob("*.parquet")}
+
+
+def shared_fingerprint(step: str, step_args: List[str]) -> str:
+    """
+    步骤的共享输入指纹: 脚本内容 + 参数 + 非分区输入
+
+    Args:
+        step: 步骤名称
+        step_args: 传给步骤脚本的参数 (不含分区列表)
+
+    Returns:
+        指纹字符串
+    """
+    parts = [f"v{MANIFEST_VERSION}", code_fingerprint(step), ' '.join(step_args)]
+
+    if step == 'step1':
+        parts += [file_fingerprint(TUSHARE_DATA_DIR / "stock_basic/data.parquet"),
+                  file_fingerprint(BENCHMARK_FILE)]
+    elif step in ('step4', 'step5_diagnostics'):
+        parts += [file_fingerprint(RISK_DIR / "factor_returns.parquet"),
+                  file_fingerprint(RISK_DIR / "residuals.parquet"),
+                  directory_fingerprint(RISK_DIR / "factor_returns_inc"),
+                  directory_fingerprint(RISK_DIR / "residuals_inc")]
+        if step == 'step5_diagnostics':
+            parts.append(directory_fingerprint(FACTOR_BY_DATE_DIR))
+    elif step == 'step5_validate':
+        parts += [directory_fingerprint(FACTOR_BY_STOCK_DIR),
+                  directory_fingerprint(FACTOR_BY_DATE_DIR),
+                  file_fingerprint(RISK_DIR / "risk_params_latest.json"),
+                  file_fingerprint(RISK_DIR / "specific_risks.parquet"),
+                  directory_fingerprint(RISK_DIR / "diagnostics")]
+
+    return combine_fingerprints(*parts)
+
+
+def plan_step(step: str, previous: Optional[Dict], step_args: List[str], force: bool = False) -> Dict:
+    """
+    根据上次运行的清单决定步骤的执行方式
+
+    Args:
+        step: 步骤名称
+        previous: 清单中该步骤上次成功运行的记录 (None表示没有)
+        step_args: 传给步骤脚本的参数
+        force: 强制全量重跑
+
+    Returns:
+        {
+            'mode': 'full' / 'partial' / 'skip',
+            'shared': 共享输入指纹,
+            'partitions': {分区键: 指纹} (仅分区步骤),
+            'changed': [变化的分区键]
+        }
+    """
+    spec = PIPELINE_STEPS[step]
+    shared = shared_fingerprint(step, step_args)
+    partitions = partition_fingerprints(step) if spec['partition'] else {}
+    plan = {'mode': 'full', 'shared': shared, 'partitions': partitions, 'changed': sorted(partitions)}
+
+    if force or previous is None or previous.get('shared') != shared:
+        return plan
+
+    if not spec['partition']:
+        plan['mode'] = 'skip'
+        return plan
+
+    old_partitions = previous.get('partitions', {})
+    changed = sorted(key for key, fp in partitions.items() if old_partitions.get(key) != fp)
+    plan['changed'] = changed
+
+    if not changed:
+        plan['mode'] = 'skip'
+    elif len(changed) < len(partitions):
+        plan['mode'] = 'partial'
+
+    return plan
+
+
+class PipelineRunner:
+    """DAG调度器: 依赖满足的步骤在线程池中并发执行 (每个步骤是一个子进程)"""
+
+    def __init__(self, step_args: Dict[str, List[str]], max_concurrent: int = 2,
+                 force: bool = False, dry_run: bool = False):
+        """
+        初始化调度器
+
+        Args:
+            step_args: {步骤名称: 传给脚本的参数}
+            max_concurrent: 最多同时运行的步骤数
+            force: 强制全量重跑所有步骤
+            dry_run: 只输出计划, 不执行
+        """
+        self.step_args = step_args
+        self.max_concurrent = max_concurrent
+        self.force = force
+        self.dry_run = dry_run
+        self.run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict:
+        """加载上次运行的清单"""
+        if MANIFEST_FILE.exists():
+            with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+            logger.warning("清单版本不匹配, 所有步骤将全量重跑")
+        return {'version': MANIFEST_VERSION, 'steps': {}}
+
+    def _save_manifest(self) -> None:
+        """原子写入清单"""
+        self.manifest['updated'] = datetime.now().isoformat()
+        tmp_path = MANIFEST_FILE.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, MANIFEST_FILE)
+
+    def _build_command(self, step: str, plan: Dict) -> List[str]:
+        """构建步骤脚本的命令行"""
+        spec = PIPELINE_STEPS[step]
+        command = [sys.executable, str(SCRIPT_DIR / spec['script'])] + self.step_args.get(step, [])
+
+        if plan['mode'] == 'partial':
+            list_file = WORK_DIR / f"{step}_{spec['partition']}s.txt"
+            list_file.write_text('\n'.join(plan['changed']) + '\n', encoding='utf-8')
+            command += [spec['partition_arg'], str(list_file)]
+
+        return command
+
+    def run_step(self, step: str) -> Dict:
+        """
+        规划并执行单个步骤 (在依赖全部完成后调用, 以便读取上游的最新输出)
+
+        Args:
+            step: 步骤名称
+
+        Returns:
+            步骤运行记录
+        """
+        previous = self.manifest['steps'].get(step)
+        if previous is not None and previous.get('status') != 'success':
+            previous = None
+        plan = plan_step(step, previous, self.step_args.get(step, []), self.force)
+
+        record = {
+            'status': 'success',
+            'mode': plan['mode'],
+            'shared': plan['shared'],
+            'partitions': plan['partitions'],
+            'changed': len(plan['changed']) if plan['mode'] != 'skip' else 0,
+            'run_id': self.run_id,
+            'started': datetime.now().isoformat(),
+            'duration': 0.0
+        }
+
+        if plan['mode'] == 'skip':
+            logger.info(f"[{step}] 输入未变化, 跳过")
+            return record
+
+        if plan['mode'] == 'partial':
+            logger.info(f"[{step}] 增量执行: {len(plan['changed'])}/{len(plan['partitions'])} 个分区变化")
+        else:
+            logger.info(f"[{step}] 全量执行")
+
+        command = self._build_command(step, plan)
+        if self.dry_run:
+            logger.info(f"[{step}] (dry-run) {' '.join(command)}")
+            record['status'] = 'planned'
+            return record
+
+        start = time.time()
+        env = dict(os.environ, **{RUN_ID_ENV: self.run_id})
+        with open(WORK_DIR / f"{step}.out", 'w', encoding='utf-8') as out:
+            result = subprocess.run(command, cwd=SCRIPT_DIR, env=env, stdout=out, stderr=subprocess.STDOUT)
+        record['duration'] = time.time() - start
+
+        if result.returncode != 0:
+            record['status'] = 'failed'
+            logger.error(f"[{step}] 失败 (返回码 {result.returncode}), 详见 {WORK_DIR / f'{step}.out'}")
+        else:
+            logger.info(f"[{step}] 完成, 耗时 {record['duration']:.1f}s")
+
+        return record
+
+    def run(self) -> Dict[str, str]:
+        """
+        按依赖顺序执行所有步骤
+
+        Returns:
+            {步骤名称: 状态 (success / skipped / failed / blocked / planned)}
+        """
+        WORK_DIR.mkdir(parents=True, exist_ok=True)
+
+        statuses = {}
+        pending = dict(PIPELINE_STEPS)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            while pending or running:
+                # 上游失败的步骤不再执行
+                for step in [s for s, spec in pending.items()
+                             if any(statuses.get(d) in ('failed', 'blocked') for d in spec['deps'])]:
+                    statuses[step] = 'blocked'
+                    del pending[step]
+                    logger.warning(f"[{step}] 上游步骤失败, 不执行")
+
+                ready = [s for s, spec in pending.items()
+                         if all(d in statuses for d in spec['deps'])]
+                for step in ready:
+                    running[executor.submit(self.run_step, step)] = step
+                    del pending[step]
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        logger.error(f"[{step}] 调度失败: {e}")
+                        record = {'status': 'failed'}
+
+                    if record['status'] == 'success':
+                        statuses[step] = 'skipped' if record['mode'] == 'skip' else 'success'
+                        self.manifest['steps'][step] = record
+                        if not self.dry_run:
+                            self._save_manifest()
+                    else:
+                        statuses[step] = record['status']
+
+        return statuses
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Barra CNE5 流水线调度 (跳过未变化的分区)")
+    parser.add_argument('--parallel', type=int, default=4, help='各步骤内部的并行进程数')
+    parser.add_argument('--max-concurrent', type=int, default=2, help='最多同时运行的步骤数')
+    parser.add_argument('--estimation-window', type=int, default=252, help='step4估计窗口 (天数)')
+    parser.add_argument('--half-life', type=int, default=90, help='step4/step5诊断的半衰期 (天数)')
+    parser.add_argument('--force', action='store_true', help='忽略清单, 全量重跑所有步骤')
+    parser.add_argument('--dry-run', action='store_true', help='只输出执行计划')
+    args = parser.parse_args()
+
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(REPORTS_DIR / "run_pipeline.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    step_args = {
+        'step1': ['--parallel', str(args.parallel)],
+        'step4': ['--estimation-window', str(args.estimation_window), '--half-life', str(args.half_life)],
+        'step5_diagnostics': ['--half-life', str(args.half_life)],
+        'step5_validate': ['--parallel', str(args.parallel)]
+    }
+
+    logger.info("=" * 60)
+    logger.info("Barra CNE5 流水线调度")
+    logger.info("=" * 60)
+
+    start = time.time()
+    runner = PipelineRunner(step_args, args.max_concurrent, args.force, args.dry_run)
+    statuses = runner.run()
+
+    logger.info("=" * 60)
+    for step, status in statuses.items():
+        logger.info(f"  {step}: {status}")
+    logger.info(f"总耗时: {time.time() - start:.1f}s, 清单: {MANIFEST_FILE}")
+    logger.info("=" * 60)
+
+    if any(status in ('failed', 'blocked') for status in statuses.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
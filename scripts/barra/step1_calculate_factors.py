@@ -9,7 +9,7 @@ Barra CNE5 因子计算脚本 - Step 1: 计算因子暴露矩阵
     3. 输出按股票存储的Parquet文件
 
 执行方式:
-    python step1_calculate_factors.py [--parallel N]
+    python step1_calculate_factors.py [--parallel N] [--stocks-file FILE]
 
 输入:
     /data/tushare_data/daily/{ts_code}.parquet
@@ -31,12 +31,14 @@ import os
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from instrumentation import PerfRecorder
+
 # 配置路径
 DATA_ROOT = Path("/home/project/ccleana/data")
 TUSHARE_DATA_DIR = DATA_ROOT / "tushare_data"
@@ -143,6 +145,20 @@ LIQUIDITY_MEDIUM = 63
 LIQUIDITY_LONG = 252
 
 
+def _read_since(path: Path, start_date: Optional[str] = None) -> pd.DataFrame:
+    """
+    读取tushare行情文件, 可选只保留 trade_date >= start_date 的行
+
+    Args:
+        path: parquet文件路径
+        start_date: 起始日期 (YYYYMMDD), None表示全部
+    """
+    if start_date is None:
+        return pd.read_parquet(path)
+    # trade_date 为 YYYYMMDD 字符串, 按字典序比较即按日期比较; 过滤条件下推到parquet读取
+    return pd.read_parquet(path, filters=[('trade_date', '>=', start_date)])
+
+
 class FactorCalculator:
     """Barra CNE5 因子计算器"""
 
@@ -175,20 +191,24 @@ class FactorCalculator:
         industry = self.get_stock_industry(ts_code)
         return {ind: 1 if ind == industry else 0 for ind in BARRA_INDUSTRIES}
 
-    def calculate_stock_factors(self, ts_code: str) -> Optional[pd.DataFrame]:
+    def calculate_stock_factors(self, ts_code: str, start_date: Optional[str] = None,
+                                extra_columns: Sequence[str] = ()) -> Optional[pd.DataFrame]:
         """
         计算单只股票的所有因子
 
         Args:
             ts_code: 股票代码 (如 000001.SZ)
+            start_date: 只加载该日期 (YYYYMMDD) 及之后的行情数据, None表示全部历史。
+                        增量更新时传入尾部窗口起点, 需覆盖至少 BETA_WINDOW 个交易日
+            extra_columns: 额外原样输出的行情列 (如 pct_chg, total_mv), 不做截断处理
 
         Returns:
             因子DataFrame，如果计算失败返回None
         """
         try:
             # 加载基础数据
-            daily = self._load_daily_data(ts_code)
-            daily_basic = self._load_daily_basic_data(ts_code)
+            daily = self._load_daily_data(ts_code, start_date)
+            daily_basic = self._load_daily_basic_data(ts_code, start_date)
 
             if daily is None or daily_basic is None:
                 logger.warning(f"数据缺失: {ts_code}")
@@ -243,7 +263,8 @@ class FactorCalculator:
                 ['trade_date', 'size', 'beta', 'momentum', 'volatility',
                  'non_linear_size', 'book_to_price', 'liquidity',
                  'earnings_yield', 'growth', 'leverage'] +
-                BARRA_INDUSTRIES
+                BARRA_INDUSTRIES +
+                [col for col in extra_columns if col in df.columns]
             )
 
             result = df[factor_cols].copy()
@@ -265,19 +286,19 @@ class FactorCalculator:
             logger.error(f"计算因子失败 {ts_code}: {e}")
             return None
 
-    def _load_daily_data(self, ts_code: str) -> Optional[pd.DataFrame]:
+    def _load_daily_data(self, ts_code: str, start_date: Optional[str] = None) -> Optional[pd.DataFrame]:
         """加载日行情数据"""
         path = TUSHARE_DATA_DIR / "daily" / f"date={ts_code}" / "data.parquet"
         if not path.exists():
             return None
-        return pd.read_parquet(path)
+        return _read_since(path, start_date)
 
-    def _load_daily_basic_data(self, ts_code: str) -> Optional[pd.DataFrame]:
+    def _load_daily_basic_data(self, ts_code: str, start_date: Optional[str] = None) -> Optional[pd.DataFrame]:
         """加载日行情基本面数据"""
         path = TUSHARE_DATA_DIR / "daily_basic" / f"date={ts_code}" / "data.parquet"
         if not path.exists():
             return None
-        return pd.read_parquet(path)
+        return _read_since(path, start_date)
 
     def _calc_size(self, df: pd.DataFrame) -> pd.Series:
         """计算市值因子: ln(total_mv)"""
@@ -444,6 +465,7 @@ def main():
     parser.add_argument('--parallel', type=int, default=4, help='并行进程数')
     parser.add_argument('--start-date', type=str, default='20200101', help='开始日期 (YYYYMMDD)')
     parser.add_argument('--end-date', type=str, default='20241231', help='结束日期 (YYYYMMDD)')
+    parser.add_argument('--stocks-file', type=str, help='只计算文件中列出的股票 (每行一个ts_code, 由run_pipeline.py生成)')
     args = parser.parse_args()
 
     logger.info("=" * 60)
@@ -452,9 +474,12 @@ def main():
     logger.info(f"并行进程数: {args.parallel}")
     logger.info(f"输出目录: {OUTPUT_DIR}")
 
+    perf = PerfRecorder('step1')
+
     # 加载基准数据
     logger.info("加载基准指数数据...")
-    benchmark_data = load_benchmark_data()
+    with perf.phase('load_benchmark'):
+        benchmark_data = load_benchmark_data()
     if benchmark_data is not None and len(benchmark_data) > 0:
         logger.info(f"基准指数数据加载成功: {len(benchmark_data)} 条记录")
     else:
@@ -472,6 +497,12 @@ def main():
         logger.error("找不到股票数据目录")
         return
 
+    if args.stocks_file:
+        with open(args.stocks_file, 'r', encoding='utf-8') as f:
+            selected = {line.strip() for line in f if line.strip()}
+        stock_codes = [ts_code for ts_code in stock_codes if ts_code in selected]
+        logger.info(f"只计算 {args.stocks_file} 中列出的股票")
+
     logger.info(f"共 {len(stock_codes)} 只股票")
 
     # 过滤股票: 只计算在指定日期范围内有数据的股票
@@ -484,16 +515,17 @@ def main():
     fail_count = 0
 
     # 使用多进程
-    with multiprocessing.Pool(processes=args.parallel) as pool:
-        # 使用imap_unordered以便实时显示进度
-        results = list(tqdm(
-            pool.starmap(
-                process_single_stock,
-                [(ts_code, calculator) for ts_code in stock_codes]
-            ),
-            total=len(stock_codes),
-            desc="计算因子"
-        ))
+    with perf.phase('compute_factors', rows=len(stock_codes), workers=args.parallel):
+        with multiprocessing.Pool(processes=args.parallel) as pool:
+            # 使用imap_unordered以便实时显示进度
+            results = list(tqdm(
+                pool.starmap(
+                    process_single_stock,
+                    [(ts_code, calculator) for ts_code in stock_codes]
+                ),
+                total=len(stock_codes),
+                desc="计算因子"
+            ))
 
     # 统计结果
     for ts_code, success in results:
@@ -528,6 +560,7 @@ def main():
     # 保存统计报告
     stats = {
         'timestamp': datetime.now().isoformat(),
+        'performance': perf.finish(rows=len(stock_codes)),
         'total_stocks': len(stock_codes),
         'successful': success_count,
         'failed': fail_count,
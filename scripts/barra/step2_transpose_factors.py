@@ -6,7 +6,9 @@ Barra CNE5 因子计算脚本 - Step 2: 转置因子数据
     将按股票存���的因子数据转置为按日期存储
 
 执行方式:
-    python step2_transpose_factors.py
+    python step2_transpose_factors.py [--stocks-file FILE]
+
+    指定 --stocks-file 时只加载列出的股票, 并将其行更新到已有的by_date文件中 (其余股票的行保持不变)
 
 输入:
     /data/barra_factors/by_stock/{ts_code}.parquet
@@ -16,18 +18,21 @@ Barra CNE5 因子计算脚本 - Step 2: 转置因子数据
     /data/barra_reports/step2_transpose.log
 """
 
+import argparse
 import json
 import logging
 import sys
 from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Set
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from instrumentation import PerfRecorder
+
 # 配置路径
 DATA_ROOT = Path("/home/project/ccleana/data")
 INPUT_DIR = DATA_ROOT / "barra_factors/by_stock"
@@ -68,16 +73,21 @@ FACTOR_COLUMNS = (
 )
 
 
-def load_all_factor_files() -> Dict[str, pd.DataFrame]:
+def load_all_factor_files(stock_codes: Optional[Set[str]] = None) -> Dict[str, pd.DataFrame]:
     """
     加载所有股票的因子数据
 
+    Args:
+        stock_codes: 只加载这些股票, None表示全部
+
     Returns:
         {ts_code: DataFrame} 字典
     """
     logger.info("加载因子数据文件...")
 
     factor_files = list(INPUT_DIR.glob("*.parquet"))
+    if stock_codes is not None:
+        factor_files = [f for f in factor_files if f.stem in stock_codes]
     logger.info(f"找到 {len(factor_files)} 个因子文件")
 
     stock_data = {}
@@ -180,23 +190,104 @@ def transpose_by_date(stock_data: Dict[str, pd.DataFrame],
         logger.warning(f"失败日期数: {len(failed_dates)}")
 
 
+def upsert_by_date(stock_data: Dict[str, pd.DataFrame]) -> int:
+    """
+    将部分股票的因子数据更新到已有的by_date文件中
+
+    对这些股票出现的每个日期: 读取已有文件, 删除这些股票的旧行, 追加新行。
+    其余日期文件中若仍有这些股票的旧行 (例如新数据的日期范围变短), 一并删除,
+    删除后为空的文件直接移除。
+
+    Args:
+        stock_data: {ts_code: DataFrame} 字典 (只包含需要更新的股票)
+
+    Returns:
+        更新的日期文件数
+    """
+    stock_codes = set(stock_data)
+    output_cols = ['ts_code'] + FACTOR_COLUMNS
+
+    frames = []
+    for ts_code, df in stock_data.items():
+        df = df.copy()
+        df['ts_code'] = ts_code
+        frames.append(df)
+    df_new = pd.concat(frames, ignore_index=True)
+    df_new['date_str'] = df_new['trade_date'].dt.strftime('%Y%m%d')
+
+    updated = 0
+    for date_str, df_date in tqdm(df_new.groupby('date_str'), desc="更新by_date文件"):
+        output_path = OUTPUT_DIR / f"{date_str}.parquet"
+        df_date = df_date[output_cols]
+
+        if output_path.exists():
+            df_existing = pd.read_parquet(output_path)
+            df_existing = df_existing[~df_existing['ts_code'].isin(stock_codes)]
+            df_date = pd.concat([df_existing, df_date], ignore_index=True)
+
+        df_date.to_parquet(output_path, index=False)
+        updated += 1
+
+    # 新数据未覆盖的日期: 只读ts_code列定位残留旧行
+    new_dates = set(df_new['date_str'])
+    stale = 0
+    for output_path in sorted(OUTPUT_DIR.glob("*.parquet")):
+        if output_path.stem in new_dates:
+            continue
+        codes = pd.read_parquet(output_path, columns=['ts_code'])['ts_code']
+        if not codes.isin(stock_codes).any():
+            continue
+
+        df_existing = pd.read_parquet(output_path)
+        df_existing = df_existing[~df_existing['ts_code'].isin(stock_codes)]
+        if df_existing.empty:
+            output_path.unlink()
+        else:
+            df_existing.to_parquet(output_path, index=False)
+        stale += 1
+
+    if stale:
+        logger.info(f"清理 {stale} 个日期文件中的旧行")
+    logger.info(f"更新 {updated} 个日期文件 ({len(stock_codes)} 只股票)")
+    return updated
+
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="转置Barra CNE5因子数据")
+    parser.add_argument('--stocks-file', type=str, help='只更新文件中列出的股票 (每行一个ts_code, 由run_pipeline.py生成)')
+    args = parser.parse_args()
+
     logger.info("=" * 60)
     logger.info("Barra CNE5 因子计算 - Step 2: 转置因子数据")
     logger.info("=" * 60)
     logger.info(f"输入目录: {INPUT_DIR}")
     logger.info(f"输出目录: {OUTPUT_DIR}")
 
-    # 加载所有因子数据
-    stock_data = load_all_factor_files()
+    stock_codes = None
+    if args.stocks_file:
+        with open(args.stocks_file, 'r', encoding='utf-8') as f:
+            stock_codes = {line.strip() for line in f if line.strip()}
+        logger.info(f"增量模式: 只更新 {len(stock_codes)} 只股票")
+
+    perf = PerfRecorder('step2')
+
+    # 加载因子数据
+    with perf.phase('load_by_stock') as phase:
+        stock_data = load_all_factor_files(stock_codes)
+        phase['rows'] = sum(len(df) for df in stock_data.values())
 
     if not stock_data:
         logger.error("没有找到任何因子数据，请先运行 step1_calculate_factors.py")
         return
 
     # 转置数据
-    transpose_by_date(stock_data)
+    with perf.phase('transpose' if stock_codes is None else 'upsert') as phase:
+        phase['rows'] = sum(len(df) for df in stock_data.values())
+        if stock_codes is None:
+            transpose_by_date(stock_data)
+        else:
+            upsert_by_date(stock_data)
 
     # 统计结果
     output_files = list(OUTPUT_DIR.glob("*.parquet"))
@@ -209,6 +300,7 @@ def main():
     # 保存统计报告
     stats = {
         'timestamp': datetime.now().isoformat(),
+        'performance': perf.finish(rows=sum(len(df) for df in stock_data.values())),
         'input_files': len(stock_data),
         'output_files': len(output_files),
         'input_directory': str(INPUT_DIR),
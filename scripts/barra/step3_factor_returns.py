@@ -8,7 +8,7 @@ Barra CNE5 因子计算脚本 - Step 3: 计算因子收益率
     使用加权��小二乘法 (WLS)，权重 = sqrt(market_cap)
 
 执行方式:
-    python step3_factor_returns.py
+    python step3_factor_returns.py [--dates-file FILE]
 
 输入:
     /data/barra_factors/by_date/{date}.parquet (因子暴露)
@@ -20,12 +20,13 @@ Barra CNE5 因子计算脚本 - Step 3: 计算因子收益率
     /data/barra_reports/step3_factor_returns.log
 """
 
+import argparse
 import json
 import logging
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from functools import partial
 
 import numpy as np
@@ -34,6 +35,9 @@ from tqdm import tqdm
 from multiprocessing import Pool, cpu_count
 import os
 
+from instrumentation import PerfRecorder
+from risk_store import append_factor_returns, clear_increments
+
 # 配置路径
 DATA_ROOT = Path("/home/project/ccleana/data")
 FACTOR_DATA_DIR = DATA_ROOT / "barra_factors/by_date"
@@ -313,10 +317,15 @@ def process_single_date(args: Tuple) -> Tuple:
         return (date_str, None, None, 2)  # 失败
 
 
-def calculate_factor_returns() -> Tuple[pd.DataFrame, pd.DataFrame]:
+def calculate_factor_returns(dates: Optional[Set[str]] = None,
+                             perf: Optional[PerfRecorder] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     计算所有交易日的因子收益率（使用多进程并行）
 
+    Args:
+        dates: 只计算这些交易日 (YYYYMMDD), None表示全部
+        perf: 性能记录器, None时新建
+
     Returns:
         (factor_returns_df, residuals_df)
     """
@@ -324,32 +333,40 @@ def calculate_factor_returns() -> Tuple[pd.DataFrame, pd.DataFrame]:
 
     # 获取所有日期文件
     date_files = sorted(FACTOR_DATA_DIR.glob("*.parquet"))
+    if dates is not None:
+        date_files = [f for f in date_files if f.stem in dates]
     logger.info(f"找到 {len(date_files)} 个交易日文件")
 
     # 确定使用的CPU核心数
     n_cores = min(cpu_count(), 4)  # 最多使用4核
     logger.info(f"检测到系统有 {cpu_count()} 个CPU核心，将使用 {n_cores} 个核心进行并行计算")
 
+    perf = perf or PerfRecorder('step3')
+
     # 1. 构建股票价格数据缓存（加载所有股票）
     logger.info("构建股票价格数据缓存...")
     stock_price_cache = {}
     daily_dir = TUSHARE_DATA_DIR / "daily"
-    if daily_dir.exists():
-        stock_dirs = [d for d in daily_dir.iterdir() if d.is_dir()]
-        logger.info(f"发现 {len(stock_dirs)} 只股票目录")
-        for stock_dir in tqdm(stock_dirs, desc="缓存价格数据"):
-            ts_code = stock_dir.name.replace('date=', '')
-            try:
-                df = pd.read_parquet(stock_dir / "data.parquet")
-                df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d', errors='coerce')
-                stock_price_cache[ts_code] = df[['trade_date', 'close', 'pct_chg']].copy()
-            except:
-                pass
+    with perf.phase('load_prices') as phase:
+        if daily_dir.exists():
+            stock_dirs = [d for d in daily_dir.iterdir() if d.is_dir()]
+            logger.info(f"发现 {len(stock_dirs)} 只股票目录")
+            for stock_dir in tqdm(stock_dirs, desc="缓存价格数据"):
+                ts_code = stock_dir.name.replace('date=', '')
+                try:
+                    df = pd.read_parquet(stock_dir / "data.parquet")
+                    df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d', errors='coerce')
+                    stock_price_cache[ts_code] = df[['trade_date', 'close', 'pct_chg']].copy()
+                except:
+                    pass
+        phase['rows'] = sum(len(df) for df in stock_price_cache.values())
 
     logger.info(f"成功缓存 {len(stock_price_cache)} 只股票的价格数据")
 
     # 2. 构建市值数据缓存（一次性加载所有股票市值）
-    market_cap_cache = build_market_cap_cache()
+    with perf.phase('load_market_caps') as phase:
+        market_cap_cache = build_market_cap_cache()
+        phase['rows'] = sum(len(df) for df in market_cap_cache.values())
 
     # 3. 准备任务参数
     tasks = [(f.stem, f) for f in date_files]
@@ -362,17 +379,18 @@ def calculate_factor_returns() -> Tuple[pd.DataFrame, pd.DataFrame]:
 
     logger.info(f"开始并行处理 {len(tasks)} 个交易日...")
 
-    with Pool(
-        processes=n_cores,
-        initializer=init_worker,
-        initargs=(stock_price_cache, market_cap_cache)
-    ) as pool:
-        # 使用 imap_unordered 以便实时显示进度
-        results = list(tqdm(
-            pool.imap_unordered(process_single_date, tasks),
-            total=len(tasks),
-            desc=f"计算因子收益率 [{n_cores}核并行]"
-        ))
+    with perf.phase('regression', rows=len(tasks), workers=n_cores):
+        with Pool(
+            processes=n_cores,
+            initializer=init_worker,
+            initargs=(stock_price_cache, market_cap_cache)
+        ) as pool:
+            # 使用 imap_unordered 以便实时显示进度
+            results = list(tqdm(
+                pool.imap_unordered(process_single_date, tasks),
+                total=len(tasks),
+                desc=f"计算因子收益率 [{n_cores}核并行]"
+            ))
 
     # 5. 收集结果
     for date_str, factor_returns, residuals, status in results:
@@ -406,30 +424,78 @@ def calculate_factor_returns() -> Tuple[pd.DataFrame, pd.DataFrame]:
     return factor_returns_df, residuals_df
 
 
+def save_date_increments(factor_returns_df: pd.DataFrame, residuals_df: pd.DataFrame) -> int:
+    """
+    将部分日期的计算结果写入增量分区 (不重写基础文件)
+
+    Args:
+        factor_returns_df: 因子收益率DataFrame
+        residuals_df: 残差DataFrame
+
+    Returns:
+        写入的日期数
+    """
+    residual_groups = dict(tuple(residuals_df.groupby('trade_date'))) if len(residuals_df) > 0 else {}
+
+    for i in range(len(factor_returns_df)):
+        df_returns = factor_returns_df.iloc[[i]]
+        date_str = df_returns['trade_date'].iloc[0].strftime('%Y%m%d')
+        df_residuals = residual_groups.get(date_str, pd.DataFrame(columns=['trade_date', 'ts_code', 'residual']))
+        append_factor_returns(date_str, df_returns, df_residuals, OUTPUT_DIR)
+
+    return len(factor_returns_df)
+
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="计算Barra CNE5因子收益率")
+    parser.add_argument('--dates-file', type=str,
+                        help='只重算文件中列出的交易日 (每行一个YYYYMMDD, 由run_pipeline.py生成), 结果写入增量分区')
+    args = parser.parse_args()
+
     logger.info("=" * 60)
     logger.info("Barra CNE5 因子计算 - Step 3: 计算因子收益率")
     logger.info("=" * 60)
     logger.info(f"输入目录: {FACTOR_DATA_DIR}")
     logger.info(f"输出目录: {OUTPUT_DIR}")
 
+    dates = None
+    if args.dates_file:
+        with open(args.dates_file, 'r', encoding='utf-8') as f:
+            dates = {line.strip() for line in f if line.strip()}
+        logger.info(f"增量模式: 只重算 {len(dates)} 个交易日")
+
+    perf = PerfRecorder('step3')
+
     # 计算因子收益率
-    factor_returns_df, residuals_df = calculate_factor_returns()
+    factor_returns_df, residuals_df = calculate_factor_returns(dates, perf)
 
     if len(factor_returns_df) == 0:
         logger.error("没有计算出任何因子收益率，请检查输入数据")
         return
 
-    # 保存因子收益率
-    factor_returns_path = OUTPUT_DIR / "factor_returns.parquet"
-    factor_returns_df.to_parquet(factor_returns_path, index=False)
-    logger.info(f"因子收益率已保存到: {factor_returns_path}")
+    if dates is not None:
+        with perf.phase('save_increments', rows=len(residuals_df)):
+            n_dates = save_date_increments(factor_returns_df, residuals_df)
+        perf.finish(rows=len(factor_returns_df))
+        logger.info(f"已写入 {n_dates} 个交易日的增量分区: {OUTPUT_DIR / 'factor_returns_inc'}")
+        return
+
+    with perf.phase('save', rows=len(residuals_df)):
+        # 保存因子收益率
+        factor_returns_path = OUTPUT_DIR / "factor_returns.parquet"
+        factor_returns_df.to_parquet(factor_returns_path, index=False)
+        logger.info(f"因子收益率已保存到: {factor_returns_path}")
 
-    # 保存残差
-    residuals_path = OUTPUT_DIR / "residuals.parquet"
-    residuals_df.to_parquet(residuals_path, index=False)
-    logger.info(f"残差已保存到: {residuals_path}")
+        # 保存残差
+        residuals_path = OUTPUT_DIR / "residuals.parquet"
+        residuals_df.to_parquet(residuals_path, index=False)
+        logger.info(f"残差已保存到: {residuals_path}")
+
+    # 全量结果已包含step6写入的增量日期, 清理增量分区
+    removed = clear_increments(OUTPUT_DIR)
+    if removed > 0:
+        logger.info(f"已清理 {removed} 个增量分区文件")
 
     # 输出统计信息
     logger.info("=" * 60)
@@ -448,6 +514,7 @@ def main():
     # 保存统计报告
     stats = {
         'timestamp': datetime.now().isoformat(),
+        'performance': perf.finish(rows=len(factor_returns_df)),
         'trading_days': len(factor_returns_df),
         'factor_returns_file': str(factor_returns_path),
         'residuals_file': str(residuals_path),
@@ -13,6 +13,7 @@ Barra CNE5 因子计算脚本 - Step 4: 估计风险模型
 输入:
     /data/barra_risk/factor_returns.parquet
     /data/barra_risk/residuals.parquet
+    /data/barra_risk/factor_returns_inc/, residuals_inc/ (step6增量分区)
 
 输出:
     /data/barra_risk/risk_params_latest.json
@@ -26,12 +27,15 @@ import logging
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
 from scipy.stats import pearsonr
 
+from instrumentation import PerfRecorder
+from risk_store import has_factor_returns, load_factor_returns, load_residuals
+
 # 配置路径
 DATA_ROOT = Path("/home/project/ccleana/data")
 INPUT_DIR = DATA_ROOT / "barra_risk"
@@ -225,47 +229,28 @@ def ensure_positive_definite(cov_matrix: pd.DataFrame) -> pd.DataFrame:
     return pd.DataFrame(cov_reg, index=cov_matrix.index, columns=cov_matrix.columns)
 
 
-def main():
-    """主函数"""
-    parser = argparse.ArgumentParser(description="估计Barra CNE5风险模型")
-    parser.add_argument('--estimation-window', type=int, default=252, help='估计窗口 (天数)')
-    parser.add_argument('--half-life', type=int, default=90, help='指数衰减半衰期 (天数)')
-    args = parser.parse_args()
-
-    logger.info("=" * 60)
-    logger.info("Barra CNE5 因子计算 - Step 4: 估计风险模型")
-    logger.info("=" * 60)
-    logger.info(f"估计窗口: {args.estimation_window} 天")
-    logger.info(f"半衰期: {args.half_life} 天")
-
-    # 加载因子收益率
-    factor_returns_path = INPUT_DIR / "factor_returns.parquet"
-    if not factor_returns_path.exists():
-        logger.error(f"找不到因子收益率文件: {factor_returns_path}")
-        logger.error("请先运行 step3_factor_returns.py")
-        return
-
-    factor_returns = pd.read_parquet(factor_returns_path)
-    factor_returns['trade_date'] = pd.to_datetime(factor_returns['trade_date'])
-    logger.info(f"加载因子收益率: {len(factor_returns)} 条记录")
-
-    # 加载残差
-    residuals_path = INPUT_DIR / "residuals.parquet"
-    if not residuals_path.exists():
-        logger.error(f"找不到残差文件: {residuals_path}")
-        return
+def build_risk_params(factor_returns: pd.DataFrame, residuals: pd.DataFrame,
+                      estimation_window: int = 252, half_life: int = 90) -> Tuple[Dict, Dict[str, float]]:
+    """
+    由因子收益率和残差估计完整的风险参数
 
-    residuals = pd.read_parquet(residuals_path)
-    logger.info(f"加载残差: {len(residuals)} 条记录")
+    Args:
+        factor_returns: 因子收益率时间序列 (trade_date为datetime)
+        residuals: 残差数据
+        estimation_window: 特质风险估计窗口
+        half_life: 指数衰减半衰期
 
+    Returns:
+        (risk_params, specific_risks) risk_params为JSON友好的嵌套字典
+    """
     # 估计因子协方差矩阵
-    factor_cov = estimate_factor_covariance(factor_returns, args.half_life)
+    factor_cov = estimate_factor_covariance(factor_returns, half_life)
 
     # 确保正定性
     factor_cov = ensure_positive_definite(factor_cov)
 
     # 估计特质风险
-    specific_risks = estimate_specific_risks(residuals, args.estimation_window, args.half_life)
+    specific_risks = estimate_specific_risks(residuals, estimation_window, half_life)
 
     # 计算因子波动率
     factor_vols = calculate_factor_volatility(factor_returns)
@@ -283,8 +268,8 @@ def main():
     # 构建风险参数
     risk_params = {
         'estimation_date': latest_date.strftime('%Y-%m-%d'),
-        'estimation_window': args.estimation_window,
-        'half_life': args.half_life,
+        'estimation_window': estimation_window,
+        'half_life': half_life,
         'num_factors': len(factor_cov),
         'num_stocks': len(specific_risks),
         'factor_covariance': factor_cov_nested,
@@ -292,13 +277,21 @@ def main():
         'specific_risks': {k: float(v) for k, v in specific_risks.items()}
     }
 
+    return risk_params, specific_risks
+
+
+def save_risk_params(risk_params: Dict, specific_risks: Dict[str, float]) -> Tuple[Path, Path]:
+    """
+    保存风险参数JSON与特质风险Parquet
+
+    Returns:
+        (risk_params_path, specific_risks_path)
+    """
     # 保存风险参数
     output_path = OUTPUT_DIR / "risk_params_latest.json"
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(risk_params, f, ensure_ascii=False, indent=2)
 
-    logger.info(f"风险参数已保存到: {output_path}")
-
     # 保存特质风险为Parquet
     specific_risks_df = pd.DataFrame([
         {'ts_code': k, 'specific_risk': v}
@@ -306,8 +299,58 @@ def main():
     ])
     specific_risks_path = OUTPUT_DIR / "specific_risks.parquet"
     specific_risks_df.to_parquet(specific_risks_path, index=False)
+
+    return output_path, specific_risks_path
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="估计Barra CNE5风险模型")
+    parser.add_argument('--estimation-window', type=int, default=252, help='估计窗口 (天数)')
+    parser.add_argument('--half-life', type=int, default=90, help='指数衰减半衰期 (天数)')
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("Barra CNE5 因子计算 - Step 4: 估计风险模型")
+    logger.info("=" * 60)
+    logger.info(f"估计窗口: {args.estimation_window} 天")
+    logger.info(f"半衰期: {args.half_life} 天")
+
+    # 加载因子收益率 (基础文件 + step6增量分区)
+    if not has_factor_returns(INPUT_DIR):
+        logger.error(f"找不到因子收益率文件: {INPUT_DIR / 'factor_returns.parquet'}")
+        logger.error("请先运行 step3_factor_returns.py")
+        return
+
+    perf = PerfRecorder('step4')
+
+    with perf.phase('load') as phase:
+        factor_returns = load_factor_returns(INPUT_DIR)
+        residuals = load_residuals(INPUT_DIR)
+        phase['rows'] = len(residuals)
+    logger.info(f"加载因子收益率: {len(factor_returns)} 条记录")
+
+    # 检查残差
+    if len(residuals) == 0:
+        logger.error(f"找不到残差文件: {INPUT_DIR / 'residuals.parquet'}")
+        return
+
+    logger.info(f"加载残差: {len(residuals)} 条记录")
+
+    # 估计风险模型并保存
+    with perf.phase('estimate', rows=len(residuals)):
+        risk_params, specific_risks = build_risk_params(
+            factor_returns, residuals, args.estimation_window, args.half_life
+        )
+    with perf.phase('save', rows=len(specific_risks)):
+        output_path, specific_risks_path = save_risk_params(risk_params, specific_risks)
+    logger.info(f"风险参数已保存到: {output_path}")
     logger.info(f"特质风险已保存到: {specific_risks_path}")
 
+    factor_cov = risk_params['factor_covariance']
+    factor_vols = risk_params['factor_volatility']
+    latest_date = factor_returns['trade_date'].max()
+
     # 输出统计信息
     logger.info("=" * 60)
     logger.info("风险模型估计完成!")
@@ -332,6 +375,7 @@ def main():
     # 保存统计报告
     stats = {
         'timestamp': datetime.now().isoformat(),
+        'performance': perf.finish(rows=len(residuals)),
         'estimation_date': latest_date.strftime('%Y-%m-%d'),
         'estimation_window': args.estimation_window,
         'half_life': args.half_life,
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Barra CNE5 因子诊断 - Step 5 补充: 因子有效性与风险预测偏差
+
+功能:
+    1. 因子Rank IC (暴露与下一交易日收益的横截面秩相关) 及 IC-IR
+    2. 因子暴露稳定性: 相邻交易日横截面自相关与分位数换手
+    3. Barra偏差统计量 (Bias Statistic): 因子风险与特质风险的滚动窗口偏差
+    所有计算在 (日期 × 股票 × 因子) 面板上向量化完成, 不做逐日期/逐股票循环
+
+执行方式:
+    python step5_diagnostics.py [--half-life N] [--bias-window N] [--ic-window N]
+
+输入:
+    /data/barra_factors/by_date/{date}.parquet (因子暴露)
+    /data/tushare_data/daily/{ts_code}.parquet (日收益率 pct_chg)
+    /data/barra_risk/factor_returns.parquet
+    /data/barra_risk/residuals.parquet
+
+输出:
+    /data/barra_risk/diagnostics/factor_ic.parquet (日期 × 因子 Rank IC)
+    /data/barra_risk/diagnostics/exposure_autocorr.parquet (日期 × 因子 暴露自相关)
+    /data/barra_risk/diagnostics/exposure_turnover.parquet (日期 × 因子 分位数换手)
+    /data/barra_risk/diagnostics/bias_stats.parquet (日期 × 偏差统计量)
+    /data/barra_risk/diagnostics/summary.parquet (每个因子一行的汇总)
+    /data/barra_reports/step5_diagnostics.log
+
+说明:
+    偏差统计量 B = std(r_t / σ_{t|t-1}), σ 为截至前一交易日的指数加权波动率预测。
+    B ≈ 1 表示风险预测准确, B > 1 低估风险, B < 1 高估风险。
+    图表由 step5_validate.py 读取本脚本输出后渲染到验证报告中。
+"""
+
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from instrumentation import PerfRecorder
+from risk_store import has_factor_returns, load_factor_returns, load_residuals
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+FACTOR_BY_DATE_DIR = DATA_ROOT / "barra_factors/by_date"
+TUSHARE_DATA_DIR = DATA_ROOT / "tushare_data"
+RISK_DIR = DATA_ROOT / "barra_risk"
+DIAGNOSTICS_DIR = RISK_DIR / "diagnostics"
+REPORTS_DIR = DATA_ROOT / "barra_reports"
+
+logger = logging.getLogger(__name__)
+
+# 因子列表
+STYLE_FACTORS = [
+    'size', 'beta', 'momentum', 'volatility', 'non_linear_size',
+    'book_to_price', 'liquidity', 'earnings_yield', 'growth', 'leverage'
+]
+
+# 计算横截面相关所需的最少股票数
+MIN_CROSS_SECTION = 50
+
+
+def load_exposure_panel(date_files: List[Path],
+                        factors: List[str] = STYLE_FACTORS) -> Tuple[List[str], pd.Index, np.ndarray]:
+    """
+    将by_date因子文件加载为稠密面板
+
+    Args:
+        date_files: by_date因子文件列表 (按日期排序)
+        factors: 因子列
+
+    Returns:
+        (dates, ts_codes, panel) panel形状为 (日期, 股票, 因子), float32, 缺失为NaN
+    """
+    frames = []
+    for file_path in date_files:
+        columns = [c for c in ['ts_code'] + factors if c in pq.ParquetFile(file_path).schema_arrow.names]
+        frames.append(pq.read_table(file_path, columns=columns).to_pandas())
+
+    dates = [f.stem for f in date_files]
+    ts_codes = pd.Index(sorted(set().union(*(df['ts_code'] for df in frames)))) if frames else pd.Index([])
+    panel = np.full((len(dates), len(ts_codes), len(factors)), np.nan, dtype=np.float32)
+
+    for t, df in enumerate(frames):
+        rows = ts_codes.get_indexer(df['ts_code'])
+        for k, factor in enumerate(factors):
+            if factor in df.columns:
+                panel[t, rows, k] = df[factor].to_numpy(dtype=np.float32, na_value=np.nan)
+
+    return dates, ts_codes, panel
+
+
+def load_return_panel(dates: List[str], ts_codes: pd.Index) -> np.ndarray:
+    """
+    加载与因子面板对齐的日收益率面板
+
+    Args:
+        dates: 交易日列表 (YYYYMMDD)
+        ts_codes: 股票代码索引
+
+    Returns:
+        收益率面板 (日期, 股票), float32, 单位为小数
+    """
+    date_index = pd.Index(dates)
+    returns = np.full((len(dates), len(ts_codes)), np.nan, dtype=np.float32)
+
+    for j, ts_code in enumerate(ts_codes):
+        path = TUSHARE_DATA_DIR / "daily" / f"date={ts_code}" / "data.parquet"
+        if not path.exists():
+            continue
+        try:
+            df = pd.read_parquet(path, columns=['trade_date', 'pct_chg'])
+        except Exception:
+            continue
+        rows = date_index.get_indexer(df['trade_date'].astype(str))
+        valid = rows >= 0
+        returns[rows[valid], j] = df['pct_chg'].to_numpy(dtype=np.float32)[valid] / 100.0
+
+    return returns
+
+
+def rowwise_corr(a: np.ndarray, b: np.ndarray, min_obs: int = MIN_CROSS_SECTION) -> np.ndarray:
+    """
+    逐行Pearson相关系数 (NaN-aware, 仅使用两侧均有效的样本)
+
+    Args:
+        a: 形状 (T, N) 的数组
+        b: 形状 (T, N) 的数组
+        min_obs: 每行最少有效样本数, 不足返回NaN
+
+    Returns:
+        长度为T的相关系数数组
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    mask = np.isfinite(a) & np.isfinite(b)
+    n = mask.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_a = np.where(mask, a, 0.0).sum(axis=1) / n
+        mean_b = np.where(mask, b, 0.0).sum(axis=1) / n
+        da = np.where(mask, a - mean_a[:, None], 0.0)
+        db = np.where(mask, b - mean_b[:, None], 0.0)
+        corr = (da * db).sum(axis=1) / np.sqrt((da ** 2).sum(axis=1) * (db ** 2).sum(axis=1))
+
+    corr[n < min_obs] = np.nan
+    return corr
+
+
+def cross_sectional_rank(values: np.ndarray) -> np.ndarray:
+    """
+    逐行横截面分位数排名 (0~1], 并列取平均排名, NaN保持NaN
+
+    Args:
+        values: 形状 (T, N) 的数组
+
+    Returns:
+        分位数排名数组 (T, N)
+    """
+    return pd.DataFrame(values).rank(axis=1, pct=True).to_numpy(dtype=np.float64)
+
+
+def compute_rank_ic(panel: np.ndarray, returns: np.ndarray) -> np.ndarray:
+    """
+    计算每个因子的Rank IC: corr(rank(X_t), rank(R_{t+1}))
+
+    Args:
+        panel: 因子暴露面板 (T, N, K)
+        returns: 收益率面板 (T, N)
+
+    Returns:
+        IC矩阵 (T, K), 最后一个交易日没有下一日收益, 为NaN
+    """
+    T, _, K = panel.shape
+    ic = np.full((T, K), np.nan)
+    if T < 2:
+        return ic
+
+    forward_rank = cross_sectional_rank(returns[1:])
+    for k in range(K):
+        ic[:-1, k] = rowwise_corr(cross_sectional_rank(panel[:-1, :, k]), forward_rank)
+    return ic
+
+
+def compute_exposure_stability(panel: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算因子暴露稳定性
+
+    Args:
+        panel: 因子暴露面板 (T, N, K)
+
+    Returns:
+        (autocorr, turnover) 均为 (T, K):
+            autocorr: 相邻交易日横截面暴露相关系数 (Barra因子稳定性系数)
+            turnover: 相邻交易日分位数排名平均绝对变化
+        第一个交易日为NaN
+    """
+    T, _, K = panel.shape
+    autocorr = np.full((T, K), np.nan)
+    turnover = np.full((T, K), np.nan)
+    if T < 2:
+        return autocorr, turnover
+
+    for k in range(K):
+        exposures = panel[:, :, k]
+        autocorr[1:, k] = rowwise_corr(exposures[1:], exposures[:-1])
+
+        ranks = cross_sectional_rank(exposures)
+        change = np.abs(ranks[1:] - ranks[:-1])
+        valid = np.isfinite(change)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_change = np.where(valid, change, 0.0).sum(axis=1) / valid.sum(axis=1)
+        mean_change[valid.sum(axis=1) < MIN_CROSS_SECTION] = np.nan
+        turnover[1:, k] = mean_change
+
+    return autocorr, turnover
+
+
+def compute_bias_statistics(realized: pd.DataFrame, half_life: int = 90,
+                            window: int = 252, min_periods: int = 21) -> pd.DataFrame:
+    """
+    滚动偏差统计量
+
+    对每一列: z_t = r_t / σ_{t|t-1}, σ为指数加权波动率 (只使用t-1及之前的数据),
+    B_t = 滚动窗口内 z 的标准差。
+
+    Args:
+        realized: 已实现收益 (日期 × 序列)
+        half_life: 波动率预测的半衰期
+        window: 偏差统计量滚动窗口
+        min_periods: 波动率预测和偏差统计的最少样本数
+
+    Returns:
+        偏差统计量 (日期 × 序列)
+    """
+    predicted_vol = np.sqrt(
+        realized.ewm(halflife=half_life, min_periods=min_periods).var().shift(1)
+    )
+    standardized = realized / predicted_vol.where(predicted_vol > 0)
+    return standardized.rolling(window, min_periods=min_periods).std()
+
+
+def compute_specific_bias(residuals: pd.DataFrame, half_life: int = 90,
+                          window: int = 252, min_periods: int = 21) -> pd.DataFrame:
+    """
+    特质风险偏差统计量的横截面汇总
+
+    Args:
+        residuals: 残差长表 (trade_date, ts_code, residual)
+
+    Returns:
+        DataFrame(index=trade_date, columns=[specific_bias_mean, specific_bias_median, specific_bias_stocks])
+    """
+    columns = ['specific_bias_mean', 'specific_bias_median', 'specific_bias_stocks']
+    if residuals is None or len(residuals) == 0:
+        return pd.DataFrame(columns=columns)
+
+    wide = residuals.pivot_table(index='trade_date', columns='ts_code', values='residual', aggfunc='last')
+    wide.index = pd.Index(wide.index.astype(str))
+    wide = wide.sort_index().astype(np.float64)
+
+    bias = compute_bias_statistics(wide, half_life, window, min_periods)
+    return pd.DataFrame({
+        'specific_bias_mean': bias.mean(axis=1),
+        'specific_bias_median': bias.median(axis=1),
+        'specific_bias_stocks': bias.notna().sum(axis=1)
+    })
+
+
+def summarize_diagnostics(ic: pd.DataFrame, autocorr: pd.DataFrame, turnover: pd.DataFrame,
+                          factor_bias: pd.DataFrame) -> pd.DataFrame:
+    """
+    汇总每个因子的诊断指标
+
+    Returns:
+        DataFrame(index=factor): ic_mean, ic_std, ic_ir, ic_t_stat, ic_hit_rate,
+        autocorr_mean, turnover_mean, bias_mean, bias_latest
+    """
+    ic_mean = ic.mean()
+    ic_std = ic.std()
+    ic_count = ic.count()
+
+    summary = pd.DataFrame({
+        'ic_mean': ic_mean,
+        'ic_std': ic_std,
+        'ic_ir': ic_mean / ic_std.where(ic_std > 0),
+        'ic_t_stat': ic_mean / ic_std.where(ic_std > 0) * np.sqrt(ic_count),
+        'ic_hit_rate': (ic > 0).sum() / ic_count.where(ic_count > 0),
+        'autocorr_mean': autocorr.mean(),
+        'turnover_mean': turnover.mean()
+    })
+    summary['bias_mean'] = factor_bias.mean().reindex(summary.index)
+    summary['bias_latest'] = factor_bias.ffill().iloc[-1].reindex(summary.index) if len(factor_bias) else np.nan
+    summary.index.name = 'factor'
+    return summary
+
+
+def _to_frame(values: np.ndarray, dates: List[str], factors: List[str]) -> pd.DataFrame:
+    """(T, K) 数组转换为以trade_date为索引的DataFrame"""
+    return pd.DataFrame(values, index=pd.Index(dates, name='trade_date'), columns=factors)
+
+
+def _save_wide(df: pd.DataFrame, path: Path) -> None:
+    """以float32压缩格式保存宽表"""
+    out = df.astype(np.float32).reset_index()
+    out.to_parquet(path, index=False, compression='zstd')
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Barra CNE5 因子诊断")
+    parser.add_argument('--half-life', type=int, default=90, help='风险预测半衰期 (天数)')
+    parser.add_argument('--bias-window', type=int, default=252, help='偏差统计量滚动窗口 (天数)')
+    parser.add_argument('--ic-window', type=int, default=63, help='滚动IC窗口 (天数)')
+    args = parser.parse_args()
+
+    DIAGNOSTICS_DIR.mkdir(parents=True, exist_ok=True)
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(REPORTS_DIR / "step5_diagnostics.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    logger.info("=" * 60)
+    logger.info("Barra CNE5 因子诊断 - Rank IC / 暴露稳定性 / 偏差统计量")
+    logger.info("=" * 60)
+
+    # 1. 加载面板数据
+    date_files = sorted(FACTOR_BY_DATE_DIR.glob("*.parquet"))
+    if len(date_files) < 2:
+        logger.error("因子文件不足, 请先运行 step2_transpose_factors.py")
+        return
+
+    perf = PerfRecorder('step5_diagnostics')
+
+    with perf.phase('load_panels') as phase:
+        dates, ts_codes, panel = load_exposure_panel(date_files, STYLE_FACTORS)
+        returns = load_return_panel(dates, ts_codes)
+        phase['rows'] = len(dates) * len(ts_codes)
+    logger.info(f"因子面板: {len(dates)} 个交易日 × {len(ts_codes)} 只股票 × {len(STYLE_FACTORS)} 个因子")
+    logger.info(f"收益率面板有效样本: {int(np.isfinite(returns).sum())}")
+
+    # 2. Rank IC 与暴露稳定性
+    with perf.phase('ic_stability', rows=len(dates) * len(ts_codes)):
+        ic = _to_frame(compute_rank_ic(panel, returns), dates, STYLE_FACTORS)
+        autocorr_arr, turnover_arr = compute_exposure_stability(panel)
+        autocorr = _to_frame(autocorr_arr, dates, STYLE_FACTORS)
+        turnover = _to_frame(turnover_arr, dates, STYLE_FACTORS)
+
+    # 3. 偏差统计量
+    with perf.phase('bias_statistics') as phase:
+        factor_bias = pd.DataFrame(index=ic.index)
+        if has_factor_returns(RISK_DIR):
+            factor_returns = load_factor_returns(RISK_DIR)
+            factor_returns['trade_date'] = factor_returns['trade_date'].dt.strftime('%Y%m%d')
+            factor_returns = factor_returns.set_index('trade_date')
+            style = [f for f in STYLE_FACTORS if f in factor_returns.columns]
+            factor_bias = compute_bias_statistics(factor_returns[style], args.half_life, args.bias_window)
+        else:
+            logger.warning(f"找不到因子收益率文件: {RISK_DIR / 'factor_returns.parquet'}")
+
+        residuals = load_residuals(RISK_DIR)
+        specific_bias = compute_specific_bias(residuals, args.half_life, args.bias_window)
+        phase['rows'] = len(residuals)
+
+    bias_stats = factor_bias.add_prefix('bias_').join(specific_bias, how='outer')
+    bias_stats.index.name = 'trade_date'
+
+    # 4. 汇总与保存
+    summary = summarize_diagnostics(ic, autocorr, turnover, factor_bias)
+    rolling_ic = ic.rolling(args.ic_window, min_periods=args.ic_window // 3)
+    summary['rolling_ic_ir_latest'] = (rolling_ic.mean() / rolling_ic.std()).ffill().iloc[-1]
+
+    _save_wide(ic, DIAGNOSTICS_DIR / "factor_ic.parquet")
+    _save_wide(autocorr, DIAGNOSTICS_DIR / "exposure_autocorr.parquet")
+    _save_wide(turnover, DIAGNOSTICS_DIR / "exposure_turnover.parquet")
+    _save_wide(bias_stats, DIAGNOSTICS_DIR / "bias_stats.parquet")
+    summary.reset_index().to_parquet(DIAGNOSTICS_DIR / "summary.parquet", index=False)
+
+    logger.info("=" * 60)
+    logger.info("因子诊断汇总:")
+    for factor, row in summary.iterrows():
+        logger.info(f"  {factor}: IC={row['ic_mean']:.4f}, IC-IR={row['ic_ir']:.3f}, "
+                    f"自相关={row['autocorr_mean']:.3f}, 偏差统计量={row['bias_mean']:.3f}")
+    if len(specific_bias):
+        logger.info(f"  特质风险偏差统计量 (最新中位数): {specific_bias['specific_bias_median'].ffill().iloc[-1]:.3f}")
+    logger.info(f"输出目录: {DIAGNOSTICS_DIR}")
+    logger.info("=" * 60)
+
+    stats = {
+        'timestamp': datetime.now().isoformat(),
+        'performance': perf.finish(rows=len(dates) * len(ts_codes)),
+        'trading_days': len(dates),
+        'stocks': len(ts_codes),
+        'half_life': args.half_life,
+        'bias_window': args.bias_window,
+        'output_directory': str(DIAGNOSTICS_DIR)
+    }
+    with open(REPORTS_DIR / "step5_diagnostics_results.json", 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ Barra CNE5 因子计算脚本 - Step 5: 验证数据质量
     4. 生成HTML验证报告
 
 执行方式:
-    python step5_validate.py
+    python step5_validate.py [--parallel N]
 
 输入:
     /data/barra_factors/by_stock/*.parquet
@@ -17,33 +17,42 @@ Barra CNE5 因子计算脚本 - Step 5: 验证数据质量
     /data/barra_risk/factor_returns.parquet
     /data/barra_risk/risk_params_latest.json
     /data/barra_risk/specific_risks.parquet
+    /data/barra_risk/diagnostics/*.parquet (可选, 由 step5_diagnostics.py 生成)
 
 输出:
     /data/barra_reports/validation_report.html
     /data/barra_reports/step5_validation.log
+    /data/barra_reports/chart_cache/*.b64 (图表缓存, 按输入数据哈希复用)
 """
 
-import base64
+import argparse
 import json
 import logging
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # 非GUI后端
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+from report_charts import (ChartJob, render_charts, render_correlation_heatmap, render_diagnostics,
+                           render_factor_distribution, render_factor_returns, render_specific_risk)
+from instrumentation import PerfRecorder, load_perf_records, summarize_perf
+from risk_store import has_factor_returns, list_increment_dates, load_factor_returns, load_residuals
+from streaming_validator import DEFAULT_BATCH_SIZE, scan_factor_dataset, summarize_scan
 
 # 配置路径
 DATA_ROOT = Path("/home/project/ccleana/data")
 FACTOR_BY_STOCK_DIR = DATA_ROOT / "barra_factors/by_stock"
 FACTOR_BY_DATE_DIR = DATA_ROOT / "barra_factors/by_date"
 RISK_DIR = DATA_ROOT / "barra_risk"
+DIAGNOSTICS_DIR = RISK_DIR / "diagnostics"
 REPORTS_DIR = DATA_ROOT / "barra_reports"
+CHART_CACHE_DIR = REPORTS_DIR / "chart_cache"
+
+# 阶段耗时较上次运行增加超过该比例时在报告中标记
+PERF_REGRESSION_THRESHOLD = 0.2
 
 # 设置日志
 logging.basicConfig(
@@ -110,19 +119,18 @@ class DataValidator:
         results['by_date_files'] = len(by_date_files)
         logger.info(f"  by_date文件数: {len(by_date_files)}")
 
-        # 检查factor_returns
-        factor_returns_path = RISK_DIR / "factor_returns.parquet"
-        if factor_returns_path.exists():
-            df = pd.read_parquet(factor_returns_path)
+        # 检查factor_returns (基础文件 + step6增量分区)
+        if has_factor_returns(RISK_DIR):
+            df = load_factor_returns(RISK_DIR)
             results['factor_returns_rows'] = len(df)
-            logger.info(f"  factor_returns行数: {len(df)}")
+            results['factor_returns_increments'] = len(list_increment_dates(RISK_DIR))
+            logger.info(f"  factor_returns行数: {len(df)} (增量分区: {results['factor_returns_increments']})")
         else:
             self.validation_results['issues'].append("缺少factor_returns.parquet")
 
         # 检查residuals
-        residuals_path = RISK_DIR / "residuals.parquet"
-        if residuals_path.exists():
-            df = pd.read_parquet(residuals_path)
+        df = load_residuals(RISK_DIR)
+        if len(df) > 0:
             results['residuals_rows'] = len(df)
             logger.info(f"  residuals行数: {len(df)}")
         else:
@@ -146,81 +154,47 @@ class DataValidator:
         self.validation_results['completeness'] = results
         return results
 
-    def check_data_quality(self, sample_stocks: int = 100) -> Dict:
-        """检查数据质量"""
-        logger.info("检查数据质量...")
+    def check_data_quality(self, n_workers: int = 4, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+        """
+        检查数据质量 (全量流式扫描by_date因子数据)
 
-        results = {
-            'missing_ratio': {},
-            'outlier_ratio': {},
-            'factor_stats': {}
-        }
+        Args:
+            n_workers: 并行进程数 (按日期分区并行)
+            batch_size: 每批读取行数
+        """
+        logger.info("检查数据质量...")
 
-        # 采样检查
-        by_stock_files = list(FACTOR_BY_STOCK_DIR.glob("*.parquet"))[:sample_stocks]
+        date_files = sorted(FACTOR_BY_DATE_DIR.glob("*.parquet"))
+        logger.info(f"  全量扫描 {len(date_files)} 个日期分区 (并行进程数: {n_workers})")
 
-        missing_ratios = []
-        outlier_ratios = []
+        scan = scan_factor_dataset(date_files, STYLE_FACTORS, n_workers, batch_size)
+        results = summarize_scan(scan)
 
-        for file_path in by_stock_files:
-            try:
-                df = pd.read_parquet(file_path)
+        if results['failed_dates']:
+            logger.warning(f"  读取失败的日期分区: {len(results['failed_dates'])}")
+            self.validation_results['issues'].append(f"因子文件读取失败: {len(results['failed_dates'])} 个日期")
 
-                for factor in STYLE_FACTORS:
-                    if factor in df.columns:
-                        # 缺失值比例
-                        missing_ratio = df[factor].isna().sum() / len(df)
-                        missing_ratios.append(missing_ratio)
-
-                        # 异常值比例 (超过3倍标准差)
-                        if df[factor].notna().sum() > 0:
-                            mean = df[factor].mean()
-                            std = df[factor].std()
-                            if std > 0:
-                                outlier_count = ((df[factor] - mean).abs() > 3 * std).sum()
-                                outlier_ratio = outlier_count / len(df)
-                                outlier_ratios.append(outlier_ratio)
-
-                        # 因子统计
-                        if factor not in results['factor_stats']:
-                            results['factor_stats'][factor] = {
-                                'samples': 0,
-                                'means': [],
-                                'stds': []
-                            }
-
-                        if df[factor].notna().sum() > 0:
-                            results['factor_stats'][factor]['samples'] += 1
-                            results['factor_stats'][factor]['means'].append(df[factor].mean())
-                            results['factor_stats'][factor]['stds'].append(df[factor].std())
-
-            except Exception as e:
-                logger.warning(f"检查文件失败 {file_path.name}: {e}")
-
-        # 汇总统计
-        if missing_ratios:
-            results['missing_ratio'] = {
-                'mean': float(np.mean(missing_ratios)),
-                'max': float(np.max(missing_ratios))
-            }
+        if results['missing_ratio']:
             logger.info(f"  缺失值比例 - 均值: {results['missing_ratio']['mean']:.4f}, 最大: {results['missing_ratio']['max']:.4f}")
 
             if results['missing_ratio']['mean'] > 0.05:
                 self.validation_results['issues'].append(f"缺失值比例过高: {results['missing_ratio']['mean']:.2%}")
 
-        if outlier_ratios:
-            results['outlier_ratio'] = {
-                'mean': float(np.mean(outlier_ratios)),
-                'max': float(np.max(outlier_ratios))
-            }
+        if results['outlier_ratio']:
             logger.info(f"  异常值比例 - 均值: {results['outlier_ratio']['mean']:.4f}, 最大: {results['outlier_ratio']['max']:.4f}")
 
-        # 计算各因子汇总统计
+        coverage = results['date_coverage']
+        if coverage:
+            logger.info(f"  日期覆盖 - 股票数: [{coverage['min_stocks']}, {coverage['max_stocks']}], "
+                        f"最低覆盖率: {coverage['min_coverage']:.4f}")
+
+            if coverage['low_coverage_dates']:
+                self.validation_results['issues'].append(
+                    f"因子覆盖率低于80%的交易日: {len(coverage['low_coverage_dates'])} 个")
+
         for factor, stats in results['factor_stats'].items():
-            if stats['means']:
-                results['factor_stats'][factor]['mean'] = float(np.mean(stats['means']))
-                results['factor_stats'][factor]['std'] = float(np.mean(stats['stds']))
-                logger.info(f"  {factor}: 均值={results['factor_stats'][factor]['mean']:.4f}, 标准差={results['factor_stats'][factor]['std']:.4f}")
+            if stats['mean'] is not None:
+                logger.info(f"  {factor}: 均值={stats['mean']:.4f}, 标准差={stats['std']:.4f}")
 
         self.validation_results['quality'] = results
         return results
@@ -264,9 +238,8 @@ class DataValidator:
                     self.validation_results['issues'].append("协方差矩阵非正定")
 
             # 检查因子收益率均值
-            factor_returns_path = RISK_DIR / "factor_returns.parquet"
-            if factor_returns_path.exists():
-                df = pd.read_parquet(factor_returns_path)
+            if has_factor_returns(RISK_DIR):
+                df = load_factor_returns(RISK_DIR)
                 for factor in STYLE_FACTORS:
                     if factor in df.columns:
                         mean_return = df[factor].mean()
@@ -289,51 +262,26 @@ class DataValidator:
         self.validation_results['math_properties'] = results
         return results
 
-    def generate_factor_distribution_plot(self) -> str:
-        """生成因子分布图"""
-        logger.info("生成因子分布图...")
-
+    def _factor_distribution_job(self) -> Optional[ChartJob]:
+        """准备因子分布图的输入数据"""
         by_stock_files = list(FACTOR_BY_STOCK_DIR.glob("*.parquet"))[:50]
 
-        fig, axes = plt.subplots(2, 5, figsize=(15, 8))
-        fig.suptitle('Barra CNE5 风格因子分布', fontsize=14)
-
-        for i, factor in enumerate(STYLE_FACTORS):
-            ax = axes[i // 5, i % 5]
-
-            factor_values = []
-            for file_path in by_stock_files:
-                try:
-                    df = pd.read_parquet(file_path)
+        factor_values = {factor: [] for factor in STYLE_FACTORS}
+        for file_path in by_stock_files:
+            try:
+                df = pd.read_parquet(file_path)
+                for factor in STYLE_FACTORS:
                     if factor in df.columns:
-                        factor_values.extend(df[factor].dropna().tolist())
-                except:
-                    pass
-
-            if factor_values:
-                ax.hist(factor_values, bins=50, alpha=0.7, edgecolor='black')
-                ax.set_title(f'{factor}')
-                ax.set_xlabel('Value')
-                ax.set_ylabel('Frequency')
-                ax.grid(True, alpha=0.3)
-
-        plt.tight_layout()
-
-        # 保存为base64
-        import io
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        plt.close()
+                        factor_values[factor].append(df[factor].dropna().to_numpy(dtype=np.float64))
+            except:
+                pass
 
-        return img_base64
+        inputs = {factor: np.concatenate(chunks) for factor, chunks in factor_values.items() if chunks}
+        inputs['factors'] = np.array(STYLE_FACTORS)
+        return render_factor_distribution, inputs
 
-    def generate_correlation_heatmap(self) -> str:
-        """生成因子相关性热力图"""
-        logger.info("生成因子相关性热力图...")
-
-        # 收集因子数据
+    def _correlation_heatmap_job(self) -> Optional[ChartJob]:
+        """准备因子相关性热力图的输入数据"""
         factor_data = []
         by_stock_files = list(FACTOR_BY_STOCK_DIR.glob("*.parquet"))[:100]
 
@@ -348,99 +296,172 @@ class DataValidator:
                 pass
 
         if not factor_data:
-            return ""
+            return None
 
         df = pd.DataFrame(factor_data)
-        corr = df[STYLE_FACTORS].corr()
-
-        fig, ax = plt.subplots(figsize=(10, 8))
-        sns.heatmap(corr, annot=True, fmt='.2f', cmap='coolwarm', center=0,
-                   square=True, linewidths=0.5, cbar_kws={"shrink": 0.8},
-                   ax=ax)
-        ax.set_title('Barra CNE5 风格因子相关性矩阵', fontsize=14)
+        corr = df[STYLE_FACTORS].astype(float).corr()
+        return render_correlation_heatmap, {
+            'factors': np.array(STYLE_FACTORS),
+            'corr': corr.to_numpy(dtype=np.float64)
+        }
 
-        plt.tight_layout()
+    def _factor_returns_job(self) -> Optional[ChartJob]:
+        """准备因子收益率时间序列图的输入数据"""
+        if not has_factor_returns(RISK_DIR):
+            return None
 
-        # 保存为base64
-        import io
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        plt.close()
+        df = load_factor_returns(RISK_DIR)
+        factors = [f for f in STYLE_FACTORS if f in df.columns]
 
-        return img_base64
+        return render_factor_returns, {
+            'factors': np.array(factors),
+            'dates': df['trade_date'].to_numpy(dtype='datetime64[ns]'),
+            'cumulative': df[factors].cumsum().to_numpy(dtype=np.float64)
+        }
 
-    def generate_factor_returns_plot(self) -> str:
-        """生成因子收益率时间序列图"""
-        logger.info("生成因子收益率时间序列图...")
+    def _specific_risk_job(self) -> Optional[ChartJob]:
+        """准备特质风险分布图的输入数据"""
+        specific_risks_path = RISK_DIR / "specific_risks.parquet"
+        if not specific_risks_path.exists():
+            return None
 
-        factor_returns_path = RISK_DIR / "factor_returns.parquet"
-        if not factor_returns_path.exists():
-            return ""
+        df = pd.read_parquet(specific_risks_path)
+        return render_specific_risk, {'specific_risk': df['specific_risk'].to_numpy(dtype=np.float64)}
+
+    def _diagnostics_job(self) -> Optional[ChartJob]:
+        """准备因子诊断图 (累计Rank IC与偏差统计量) 的输入数据"""
+        ic_path = DIAGNOSTICS_DIR / "factor_ic.parquet"
+        bias_path = DIAGNOSTICS_DIR / "bias_stats.parquet"
+        if not ic_path.exists():
+            return None
+
+        ic = pd.read_parquet(ic_path)
+        bias = pd.read_parquet(bias_path) if bias_path.exists() else pd.DataFrame({'trade_date': []})
+        ic_factors = [f for f in STYLE_FACTORS if f in ic.columns]
+        bias_factors = [f for f in STYLE_FACTORS if f'bias_{f}' in bias.columns]
+
+        return render_diagnostics, {
+            'ic_factors': np.array(ic_factors),
+            'ic_dates': pd.to_datetime(ic['trade_date'], format='%Y%m%d').to_numpy(dtype='datetime64[ns]'),
+            'cumulative_ic': ic[ic_factors].fillna(0).cumsum().to_numpy(dtype=np.float64),
+            'bias_factors': np.array(bias_factors),
+            'bias_dates': pd.to_datetime(bias['trade_date'], format='%Y%m%d').to_numpy(dtype='datetime64[ns]'),
+            'factor_bias': bias[[f'bias_{f}' for f in bias_factors]].to_numpy(dtype=np.float64),
+            'specific_bias': (bias['specific_bias_median'].to_numpy(dtype=np.float64)
+                              if 'specific_bias_median' in bias.columns else np.array([]))
+        }
 
-        df = pd.read_parquet(factor_returns_path)
-        df['trade_date'] = pd.to_datetime(df['trade_date'])
+    def _chart_jobs(self) -> Dict[str, Optional[ChartJob]]:
+        """准备所有图表的渲染任务 (数据加载在主进程, 渲染在进程池)"""
+        return {
+            'distribution': self._factor_distribution_job(),
+            'correlation': self._correlation_heatmap_job(),
+            'factor_returns': self._factor_returns_job(),
+            'specific_risk': self._specific_risk_job(),
+            'diagnostics': self._diagnostics_job()
+        }
 
-        fig, axes = plt.subplots(2, 5, figsize=(15, 8))
-        fig.suptitle('Barra CNE5 风格因子收益率时间序列', fontsize=14)
+    def generate_charts(self, n_workers: int = 4) -> Dict[str, str]:
+        """
+        并行生成所有图表, 输入数据未变化的图表直接读取磁盘缓存
 
-        for i, factor in enumerate(STYLE_FACTORS):
-            ax = axes[i // 5, i % 5]
+        Args:
+            n_workers: 渲染进程数
 
-            if factor in df.columns:
-                ax.plot(df['trade_date'], df[factor].cumsum(), linewidth=1)
-                ax.set_title(f'{factor}')
-                ax.set_xlabel('Date')
-                ax.set_ylabel('Cumulative Return')
-                ax.grid(True, alpha=0.3)
+        Returns:
+            {图表名称: base64 PNG}
+        """
+        logger.info("生成图表...")
+        jobs = self._chart_jobs()
+        charts, hits = render_charts(jobs, CHART_CACHE_DIR, n_workers)
+        rendered = sum(1 for job in jobs.values() if job is not None) - hits
+        logger.info(f"  图表缓存命中: {hits}, 重新渲染: {rendered}")
+        return charts
+
+    def _generate_chart(self, name: str, job: Optional[ChartJob]) -> str:
+        """在当前进程生成单张图表 (使用磁盘缓存)"""
+        charts, _ = render_charts({name: job}, CHART_CACHE_DIR, n_workers=1)
+        return charts[name]
 
-        plt.tight_layout()
+    def generate_factor_distribution_plot(self) -> str:
+        """生成因子分布图"""
+        logger.info("生成因子分布图...")
+        return self._generate_chart('distribution', self._factor_distribution_job())
 
-        # 保存为base64
-        import io
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        plt.close()
+    def generate_correlation_heatmap(self) -> str:
+        """生成因子相关性热力图"""
+        logger.info("生成因子相关性热力图...")
+        return self._generate_chart('correlation', self._correlation_heatmap_job())
 
-        return img_base64
+    def generate_factor_returns_plot(self) -> str:
+        """生成因子收益率时间序列图"""
+        logger.info("生成因子收益率时间序列图...")
+        return self._generate_chart('factor_returns', self._factor_returns_job())
 
     def generate_specific_risk_plot(self) -> str:
         """生成特质风险分布图"""
         logger.info("生成特质风险分布图...")
+        return self._generate_chart('specific_risk', self._specific_risk_job())
+
+    def generate_diagnostics_plot(self) -> str:
+        """生成因子诊断图 (累计Rank IC与偏差统计量)"""
+        logger.info("生成因子诊断图...")
+        return self._generate_chart('diagnostics', self._diagnostics_job())
+
+    def generate_diagnostics_table(self) -> str:
+        """生成因子诊断汇总表HTML"""
+        summary_path = DIAGNOSTICS_DIR / "summary.parquet"
+        if not summary_path.exists():
+            return '<p style="color: #666;">未找到因子诊断结果, 请运行 step5_diagnostics.py</p>'
+
+        summary = pd.read_parquet(summary_path)
+        rows = ''.join(
+            f"<tr><td>{row['factor']}</td><td>{row['ic_mean']:.4f}</td><td>{row['ic_ir']:.3f}</td>"
+            f"<td>{row['ic_hit_rate']:.2%}</td><td>{row['autocorr_mean']:.3f}</td>"
+            f"<td>{row['turnover_mean']:.4f}</td><td>{row['bias_mean']:.3f}</td></tr>"
+            for _, row in summary.iterrows()
+        )
+        return f"""<table>
+            <tr><th>因子</th><th>IC均值</th><th>IC-IR</th><th>IC胜率</th><th>暴露自相关</th><th>排名换手</th><th>偏差统计量</th></tr>
+            {rows}
+        </table>"""
+
+    def generate_perf_table(self) -> str:
+        """生成流水线性能指标表HTML (各阶段最近一次运行, 与上一次运行对比)"""
+        summary = summarize_perf(load_perf_records())
+        if not summary:
+            return '<p style="color: #666;">未找到性能记录 (perf_metrics.jsonl)</p>'
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else '-'
+
+        rows = []
+        for row in summary:
+            change = row['wall_change']
+            if change is None:
+                change_html = '-'
+            elif change > PERF_REGRESSION_THRESHOLD:
+                change_html = f'<span class="status-warn">{change:+.1%}</span>'
+            else:
+                change_html = f'{change:+.1%}'
+            rows.append(
+                f"<tr><td>{row['step']}</td><td>{row['phase']}</td><td>{row['wall_s']:.2f}</td>"
+                f"<td>{change_html}</td><td>{row['cpu_s']:.2f}</td><td>{fmt(row['rows_per_s'], ',.0f')}</td>"
+                f"<td>{row['peak_rss_mb']:.0f}</td><td>{row['read_bytes'] / 2**20:,.1f} / {row['write_bytes'] / 2**20:,.1f}</td>"
+                f"<td>{fmt(row['worker_utilization'], '.0%')}</td></tr>"
+            )
+        return f"""<table>
+            <tr><th>步骤</th><th>阶段</th><th>耗时 (s)</th><th>较上次</th><th>CPU (s)</th><th>行/秒</th><th>峰值RSS (MB)</th><th>读/写 (MB)</th><th>进程利用率</th></tr>
+            {''.join(rows)}
+        </table>"""
+
+    def generate_html_report(self, n_workers: int = 4) -> str:
+        """
+        生成HTML验证报告
 
-        specific_risks_path = RISK_DIR / "specific_risks.parquet"
-        if not specific_risks_path.exists():
-            return ""
-
-        df = pd.read_parquet(specific_risks_path)
-
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.hist(df['specific_risk'], bins=50, alpha=0.7, edgecolor='black')
-        ax.set_title('特质风险分布', fontsize=14)
-        ax.set_xlabel('Specific Risk')
-        ax.set_ylabel('Frequency')
-        ax.axvline(df['specific_risk'].mean(), color='red', linestyle='--',
-                  label=f'Mean: {df["specific_risk"].mean():.4f}')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-
-        plt.tight_layout()
-
-        # 保存为base64
-        import io
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        plt.close()
-
-        return img_base64
-
-    def generate_html_report(self) -> str:
-        """生成HTML验证报告"""
+        Args:
+            n_workers: 图表渲染进程数
+        """
         logger.info("生成HTML验证报告...")
 
         completeness = self.validation_results.get('completeness', {})
@@ -449,10 +470,14 @@ class DataValidator:
         issues = self.validation_results.get('issues', [])
 
         # 生成图表
-        dist_plot = self.generate_factor_distribution_plot()
-        corr_plot = self.generate_correlation_heatmap()
-        returns_plot = self.generate_factor_returns_plot()
-        risk_plot = self.generate_specific_risk_plot()
+        charts = self.generate_charts(n_workers)
+        dist_plot = charts['distribution']
+        corr_plot = charts['correlation']
+        returns_plot = charts['factor_returns']
+        risk_plot = charts['specific_risk']
+        diagnostics_plot = charts['diagnostics']
+        diagnostics_table = self.generate_diagnostics_table()
+        perf_table = self.generate_perf_table()
 
         # 构建HTML
         html = f"""<!DOCTYPE html>
@@ -559,6 +584,9 @@ class DataValidator:
             <tr><td>缺失值比例 (最大)</td><td>{quality.get('missing_ratio', {}).get('max', 0):.2%}</td></tr>
             <tr><td>异常值比例 (均值)</td><td>{quality.get('outlier_ratio', {}).get('mean', 0):.2%}</td></tr>
             <tr><td>异常值比例 (最大)</td><td>{quality.get('outlier_ratio', {}).get('max', 0):.2%}</td></tr>
+            <tr><td>扫描交易日数</td><td>{quality.get('date_coverage', {}).get('dates', 0)}</td></tr>
+            <tr><td>每日股票数 (最少/最多)</td><td>{quality.get('date_coverage', {}).get('min_stocks', 0)} / {quality.get('date_coverage', {}).get('max_stocks', 0)}</td></tr>
+            <tr><td>因子覆盖率 (最低)</td><td>{quality.get('date_coverage', {}).get('min_coverage', 0):.2%}</td></tr>
         </table>
 
         <h2>3. 数学性质</h2>
@@ -592,7 +620,18 @@ class DataValidator:
             <img src="data:image/png;base64,{risk_plot}" alt="特质风险分布">
         </div>
 
-        <h2>5. 问题列表</h2>
+        <h2>5. 因子诊断</h2>
+        {diagnostics_table}
+
+        <div class="chart">
+            <h3>5.1 累计Rank IC与偏差统计量</h3>
+            <img src="data:image/png;base64,{diagnostics_plot}" alt="因子诊断">
+        </div>
+
+        <h2>6. 性能指标</h2>
+        {perf_table}
+
+        <h2>7. 问题列表</h2>
         """
 
         if issues:
@@ -611,6 +650,10 @@ class DataValidator:
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="验证Barra CNE5数据质量")
+    parser.add_argument('--parallel', type=int, default=4, help='并行进程数')
+    args = parser.parse_args()
+
     logger.info("=" * 60)
     logger.info("Barra CNE5 因子计算 - Step 5: 数据验证")
     logger.info("=" * 60)
@@ -621,22 +664,30 @@ def main():
         logger.error("请先运行 step1_calculate_factors.py")
         return
 
+    perf = PerfRecorder('step5_validate')
+
     # 创建验证器
     validator = DataValidator()
 
     # 执行各项检查
-    validator.check_completeness()
-    validator.check_data_quality(sample_stocks=100)
-    validator.check_math_properties()
-
-    # 生成HTML报告
+    with perf.phase('completeness'):
+        validator.check_completeness()
+    with perf.phase('quality_scan', workers=args.parallel) as phase:
+        validator.check_data_quality(n_workers=args.parallel)
+        phase['rows'] = validator.validation_results['quality'].get('date_coverage', {}).get('dates')
+    with perf.phase('math_properties'):
+        validator.check_math_properties()
+
+    # 生成HTML报告 (报告阶段本身的耗时在下一次运行的报告中体现)
     logger.info("生成验证报告...")
-    html_report = validator.generate_html_report()
+    with perf.phase('report', workers=args.parallel):
+        html_report = validator.generate_html_report(n_workers=args.parallel)
 
     # 保存报告
     report_path = REPORTS_DIR / "validation_report.html"
     with open(report_path, 'w', encoding='utf-8') as f:
         f.write(html_report)
+    perf.finish()
 
     logger.info(f"验证报告已保存到: {report_path}")
 
@@ -4,11 +4,15 @@ Barra CNE5 因子增量更新脚本 - Step 6: Incremental Update
 
 功能:
     1. 检测自上次运行以来的新交易日
-    2. 仅计算新交易日的因子
-    3. 追加到现有by_date文件
+    2. 每只股票只加载一次尾部窗口行情, 一次计算出所有新交易日的因子
+    3. 写入新交易日的by_date文件, 并追加到by_stock文件
     4. 增量更新factor_returns和risk_params
     5. 运行验证检查
 
+说明:
+    尾部窗口为新交易日之前 HISTORY_TRADING_DAYS 个交易日, 覆盖最长的252日滚动窗口并为停牌留出余量。
+    step1中1%/99%分位数截断在尾部窗口内计算, 与全历史重算的截断边界可能略有差异。
+
 执行方式:
     python step6_incremental_update.py [--verbose]
 
@@ -19,7 +23,9 @@ Barra CNE5 因子增量更新脚本 - Step 6: Incremental Update
 
 输出:
     /data/barra_factors/by_date/{new_date}.parquet (新因子文件)
-    /data/barra_risk/factor_returns.parquet (更新)
+    /data/barra_factors/by_stock/{ts_code}.parquet (追加新交易日)
+    /data/barra_risk/factor_returns_inc/{new_date}.parquet (新交易日因子收益)
+    /data/barra_risk/residuals_inc/{new_date}.parquet (新交易日残差)
     /data/barra_risk/risk_params_latest.json (更新)
     /data/barra_reports/incremental_update.log
 """
@@ -30,17 +36,22 @@ import logging
 import sys
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from multiprocessing import Pool, cpu_count
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from instrumentation import PerfRecorder
+from risk_store import (append_factor_returns, compact_store, list_increment_dates,
+                        load_factor_returns, load_residuals)
+
 # 配置路径
 DATA_ROOT = Path("/home/project/ccleana/data")
 TUSHARE_DATA_DIR = Path("/home/project/tushare-downloader/tushare_data")
 FACTOR_DIR = DATA_ROOT / "barra_factors/by_date"
+FACTOR_BY_STOCK_DIR = DATA_ROOT / "barra_factors/by_stock"
 RISK_DIR = DATA_ROOT / "barra_risk"
 REPORTS_DIR = DATA_ROOT / "barra_reports"
 
@@ -60,6 +71,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 增量计算加载的历史交易日数: 最长滚动窗口 (252日) 的两倍, 为停牌留出余量
+HISTORY_TRADING_DAYS = 2 * 252
+
+# 随因子一起输出的行情列, 供新交易日的横截面回归使用 (不写入因子文件)
+REGRESSION_INPUT_COLUMNS = ['pct_chg', 'total_mv']
+
+# 增量分区超过该数量时合并回基础文件
+COMPACT_THRESHOLD = 60
+
+# 子进程中的因子计算器 (由 init_factor_worker 设置, 每个进程只pickle一次)
+_WORKER_CALCULATOR = None
+
 
 def get_latest_factor_date() -> str:
     """
@@ -84,6 +107,49 @@ def get_latest_factor_date() -> str:
     return latest_date
 
 
+def get_trading_calendar() -> List[str]:
+    """
+    获取A股交易日历
+
+    Returns:
+        按升序排列的交易日列表 (YYYYMMDD)
+    """
+    trade_cal_file = TUSHARE_DATA_DIR / "trade_cal/data.parquet"
+
+    if not trade_cal_file.exists():
+        logger.error(f"Trade calendar not found: {trade_cal_file}")
+        return []
+
+    df_cal = pd.read_parquet(trade_cal_file)
+
+    # 筛选A股交易日
+    df_cal = df_cal[
+        (df_cal['exchange'] == 'SSE') &
+        (df_cal['is_open'] == 1)
+    ]
+
+    return sorted(df_cal['cal_date'].astype(str).unique().tolist())
+
+
+def get_history_start_date(first_date: str, calendar: List[str],
+                           history_days: int = HISTORY_TRADING_DAYS) -> str:
+    """
+    计算尾部窗口的起始日期
+
+    Args:
+        first_date: 第一个新交易日 (YYYYMMDD)
+        calendar: 交易日历
+        history_days: 需要的历史交易日数
+
+    Returns:
+        起始日期 (YYYYMMDD)
+    """
+    earlier = [d for d in calendar if d < first_date]
+    if len(earlier) >= history_days:
+        return earlier[-history_days]
+    return earlier[0] if earlier else first_date
+
+
 def get_new_trading_days(since_date: str = None) -> List[str]:
     """
     获取需要计算的新交易日
@@ -101,81 +167,81 @@ def get_new_trading_days(since_date: str = None) -> List[str]:
         logger.error("Cannot determine starting date")
         return []
 
-    # 从trade_cal获取交易日历
-    trade_cal_file = TUSHARE_DATA_DIR / "trade_cal/data.parquet"
+    calendar = get_trading_calendar()
+    new_dates = [d for d in calendar if d > since_date]
 
-    if not trade_cal_file.exists():
-        logger.error(f"Trade calendar not found: {trade_cal_file}")
-        return []
+    logger.info(f"Found {len(new_dates)} new trading days since {since_date}")
 
-    df_cal = pd.read_parquet(trade_cal_file)
+    return new_dates
 
-    # 筛选A股交易日
-    df_cal = df_cal[
-        (df_cal['exchange'] == 'SSE') &
-        (df_cal['is_open'] == 1) &
-        (df_cal['cal_date'] > since_date)
-    ].sort_values('cal_date')
 
-    new_dates = df_cal['cal_date'].tolist()
+def normalize_trade_date(values: pd.Series) -> pd.Series:
+    """将trade_date列 (字符串或datetime) 统一为 YYYYMMDD 字符串"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime('%Y%m%d')
+    return values.astype(str)
 
-    logger.info(f"Found {len(new_dates)} new trading days since {since_date}")
 
-    return new_dates
+def init_factor_worker(calculator):
+    """
+    子进程初始化函数: 接收因子计算器
 
+    Args:
+        calculator: FactorCalculator 实例
+    """
+    global _WORKER_CALCULATOR
+    _WORKER_CALCULATOR = calculator
 
-def process_date_factors(args: Tuple) -> Tuple[str, bool, pd.DataFrame]:
+
+def compute_stock_increment(args: Tuple) -> Optional[pd.DataFrame]:
     """
-    并行处理单个日期的因子计算
+    计算单只股票在所有新交易日的因子 (用于多进程)
+
+    只加载尾部窗口的行情数据, 一次计算后筛选出新交易日的行。
 
     Args:
-        args: (trade_date, calculator, stock_list) 元组
+        args: (ts_code, start_date, new_dates) 元组
 
     Returns:
-        (trade_date, success, df_factors)
+        新交易日的因子DataFrame (含ts_code列和回归输入列, trade_date为YYYYMMDD字符串), 无数据返回None
     """
-    trade_date, calculator, stock_list = args
+    ts_code, start_date, new_dates = args
 
     try:
-        all_factors = []
-
-        for ts_code in stock_list:
-            try:
-                factors = calculator.calculate_stock_factors(ts_code)
-
-                if factors is not None:
-                    factors_date = factors[factors['trade_date'] == trade_date]
-
-                    if len(factors_date) > 0:
-                        all_factors.append(factors_date)
+        factors = _WORKER_CALCULATOR.calculate_stock_factors(
+            ts_code, start_date=start_date, extra_columns=REGRESSION_INPUT_COLUMNS
+        )
+        if factors is None:
+            return None
 
-            except Exception:
-                pass
+        factors['trade_date'] = normalize_trade_date(factors['trade_date'])
+        factors = factors[factors['trade_date'].isin(new_dates)]
+        if len(factors) == 0:
+            return None
 
-        if len(all_factors) == 0:
-            return (trade_date, False, None)
-
-        df_all = pd.concat(all_factors, ignore_index=True)
-        return (trade_date, True, df_all)
+        factors.insert(0, 'ts_code', ts_code)
+        return factors
 
     except Exception:
-        return (trade_date, False, None)
+        return None
 
 
-def calculate_factors_for_dates_parallel(trade_dates: List[str], n_cores: int = 4) -> List[Tuple[str, pd.DataFrame]]:
+def calculate_factors_incremental(trade_dates: List[str], n_cores: int = 4) -> Dict[str, pd.DataFrame]:
     """
-    并行计算多个日期的因子
+    增量计算新交易日的因子: 每只股票只计算一次, 覆盖全部新交易日
 
     Args:
-        trade_dates: 交易日期列表
+        trade_dates: 新交易日列表 (YYYYMMDD)
         n_cores: 使用的CPU核心数
 
     Returns:
-        [(trade_date, df_factors)] 列表
+        {trade_date: 当日横截面因子DataFrame}
     """
     from step1_calculate_factors import FactorCalculator, load_benchmark_data
 
-    logger.info(f"开始并行计算 {len(trade_dates)} 个日期的因子...")
+    calendar = get_trading_calendar()
+    start_date = get_history_start_date(min(trade_dates), calendar)
+    logger.info(f"增量计算 {len(trade_dates)} 个交易日的因子 (尾部窗口起点: {start_date})...")
 
     benchmark_data = load_benchmark_data()
     calculator = FactorCalculator(benchmark_data)
@@ -190,26 +256,37 @@ def calculate_factors_for_dates_parallel(trade_dates: List[str], n_cores: int =
     ]
 
     stock_list = df_stocks['ts_code'].tolist()
-
-    tasks = [(date, calculator, stock_list) for date in trade_dates]
+    new_dates = set(trade_dates)
+    tasks = [(ts_code, start_date, new_dates) for ts_code in stock_list]
 
     actual_cores = min(n_cores, cpu_count())
-    logger.info(f"使用 {actual_cores} 个CPU核心进行并行计算")
-
-    results = []
-
-    with Pool(processes=actual_cores) as pool:
-        task_results = list(tqdm(
-            pool.imap_unordered(process_date_factors, tasks),
-            total=len(tasks),
-            desc=f"计算因子 [{actual_cores}核并行]"
-        ))
-
-    for trade_date, success, df_factors in task_results:
-        if success and df_factors is not None:
-            results.append((trade_date, df_factors))
-
-    logger.info(f"成功计算 {len(results)} 个日期的因子")
+    logger.info(f"使用 {actual_cores} 个CPU核心并行计算 {len(stock_list)} 只股票")
+
+    with Pool(
+        processes=actual_cores,
+        initializer=init_factor_worker,
+        initargs=(calculator,)
+    ) as pool:
+        stock_results = [
+            df for df in tqdm(
+                pool.imap_unordered(compute_stock_increment, tasks, chunksize=16),
+                total=len(tasks),
+                desc=f"计算因子 [{actual_cores}核并行]"
+            )
+            if df is not None
+        ]
+
+    if not stock_results:
+        logger.warning("没有计算出任何新交易日的因子")
+        return {}
+
+    df_all = pd.concat(stock_results, ignore_index=True)
+    results = {
+        trade_date: df_date.reset_index(drop=True)
+        for trade_date, df_date in df_all.groupby('trade_date', sort=True)
+    }
+
+    logger.info(f"成功计算 {len(results)} 个日期的因子, 共 {len(df_all)} 条记录")
     return results
 
 
@@ -218,55 +295,125 @@ def save_factor_data(df: pd.DataFrame, trade_date: str):
     保存因子数据到by_date文件
 
     Args:
-        df: 因子DataFrame
+        df: 因子DataFrame (含ts_code列)
         trade_date: 交易日期 (YYYYMMDD)
     """
     output_file = FACTOR_DIR / f"{trade_date}.parquet"
 
-    df.to_parquet(output_file, index=False)
+    # 与step2输出格式一致: ts_code + 因子列
+    drop_cols = ['trade_date'] + [c for c in REGRESSION_INPUT_COLUMNS if c in df.columns]
+    df.drop(columns=drop_cols).to_parquet(output_file, index=False)
 
     logger.info(f"Saved factors to {output_file}")
 
 
-def update_factor_returns(new_dates: List[str]):
+def append_stock_factor_files(results: Dict[str, pd.DataFrame]):
     """
-    增量更新因子收益
+    将新交易日的因子追加到by_stock文件 (按trade_date去重, 新数据优先)
 
     Args:
-        new_dates: 新交易日列表
+        results: {trade_date: 当日横截面因子DataFrame}
+    """
+    if not results:
+        return
+
+    df_new = pd.concat(results.values(), ignore_index=True)
+    FACTOR_BY_STOCK_DIR.mkdir(parents=True, exist_ok=True)
+
+    drop_cols = ['ts_code'] + [c for c in REGRESSION_INPUT_COLUMNS if c in df_new.columns]
+
+    for ts_code, df_stock in tqdm(df_new.groupby('ts_code'), desc="追加by_stock文件"):
+        df_stock = df_stock.drop(columns=drop_cols)
+        stock_file = FACTOR_BY_STOCK_DIR / f"{ts_code}.parquet"
+
+        if stock_file.exists():
+            df_existing = pd.read_parquet(stock_file)
+            df_existing['trade_date'] = normalize_trade_date(df_existing['trade_date'])
+            df_stock = pd.concat([df_existing, df_stock], ignore_index=True)
+
+        df_stock = (df_stock
+                    .drop_duplicates(subset=['trade_date'], keep='last')
+                    .sort_values('trade_date')
+                    .reset_index(drop=True))
+        df_stock.to_parquet(stock_file, index=False)
+
+    logger.info(f"已追加 {df_new['ts_code'].nunique()} 只股票的by_stock文件")
+
+
+def update_factor_returns(results: Dict[str, pd.DataFrame]):
     """
-    logger.info("Updating factor returns...")
+    增量更新因子收益: 只对新交易日做step3的横截面回归, 结果写入增量分区
 
-    # 加载现有因子收益
-    factor_returns_file = RISK_DIR / "factor_returns.parquet"
+    收益率 (pct_chg) 和市值权重 (total_mv) 直接取自因子计算时加载的同一批行情数据,
+    不再重新读取全部股票的行情文件。
 
-    if factor_returns_file.exists():
-        df_returns = pd.read_parquet(factor_returns_file)
-    else:
-        df_returns = pd.DataFrame()
+    Args:
+        results: {trade_date: 当日横截面因子DataFrame (含回归输入列)}
+    """
+    from step3_factor_returns import ALL_FACTORS, cross_sectional_regression
 
-    # 计算新日期的因子收益
-    # 这里简化实现，实际应该调用step3的代码
-    logger.info(f"Calculating factor returns for {len(new_dates)} new dates")
+    logger.info(f"Calculating factor returns for {len(results)} new dates")
 
-    # TODO: 实现增量因子收益计算
+    updated = 0
+    for trade_date, df in sorted(results.items()):
+        df = df.dropna(subset=['pct_chg'])
+        if len(df) < 50:  # 与step3一致: 至少50只股票才进行回归
+            logger.warning(f"{trade_date}: 收益率数据不足 ({len(df)} 只股票), 跳过")
+            continue
 
-    # 保存更新后的因子收益
-    df_returns.to_parquet(factor_returns_file, index=False)
+        factor_df = df[['ts_code'] + [f for f in ALL_FACTORS if f in df.columns]]
+        returns_df = df[['ts_code', 'pct_chg']].rename(columns={'pct_chg': 'return'})
+        market_caps = dict(zip(df['ts_code'], df['total_mv'].fillna(0.0)))
 
-    logger.info("Factor returns updated")
+        factor_returns, residuals = cross_sectional_regression(factor_df, returns_df, market_caps)
+
+        df_returns = pd.DataFrame([[float(x) for x in factor_returns]], columns=ALL_FACTORS)
+        df_returns.insert(0, 'trade_date', pd.to_datetime(trade_date, format='%Y%m%d'))
+        df_residuals = pd.DataFrame({
+            'trade_date': trade_date,
+            'ts_code': list(residuals.keys()),
+            'residual': list(residuals.values())
+        })
+
+        append_factor_returns(trade_date, df_returns, df_residuals, RISK_DIR)
+        updated += 1
+
+    logger.info(f"Factor returns updated for {updated} dates")
+
+    n_increments = len(list_increment_dates(RISK_DIR))
+    if n_increments > COMPACT_THRESHOLD:
+        compact_store(RISK_DIR)
+        logger.info(f"已将 {n_increments} 个增量分区合并到基础文件")
 
 
 def update_risk_params():
     """
-    更新风险模型参数
+    更新风险模型参数: 用最新的因子收益率和残差重新估计 (复用step4)
+
+    估计窗口和半衰期沿用上一版 risk_params_latest.json 中的设置。
     """
+    from step4_risk_model import build_risk_params, save_risk_params
+
     logger.info("Updating risk parameters...")
 
-    # 这里简化实现，实际应该调用step4的代码
-    # TODO: 实现增量风险参数更新
+    factor_returns = load_factor_returns(RISK_DIR)
+    residuals = load_residuals(RISK_DIR)
+    if len(factor_returns) == 0 or len(residuals) == 0:
+        logger.warning("Factor returns or residuals not found, skip risk update")
+        return
+
+    estimation_window, half_life = 252, 90
+    risk_params_file = RISK_DIR / "risk_params_latest.json"
+    if risk_params_file.exists():
+        with open(risk_params_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        estimation_window = previous.get('estimation_window', estimation_window)
+        half_life = previous.get('half_life', half_life)
 
-    logger.info("Risk parameters updated")
+    risk_params, specific_risks = build_risk_params(factor_returns, residuals, estimation_window, half_life)
+    save_risk_params(risk_params, specific_risks)
+
+    logger.info(f"Risk parameters updated (estimation date: {risk_params['estimation_date']})")
 
 
 def validate_new_data(new_dates: List[str]):
@@ -331,19 +478,28 @@ def main():
 
     logger.info(f"Processing {len(new_dates)} new trading days")
 
-    results = calculate_factors_for_dates_parallel(new_dates, n_cores=args.parallel)
+    perf = PerfRecorder('step6')
+
+    with perf.phase('compute_factors', workers=args.parallel) as phase:
+        results = calculate_factors_incremental(new_dates, n_cores=args.parallel)
+        phase['rows'] = sum(len(df) for df in results.values())
 
     if not args.dry_run:
-        for trade_date, df_factors in results:
-            save_factor_data(df_factors, trade_date)
+        with perf.phase('save_factors', rows=sum(len(df) for df in results.values())):
+            for trade_date, df_factors in results.items():
+                save_factor_data(df_factors, trade_date)
+            append_stock_factor_files(results)
 
     if not args.dry_run:
-        update_factor_returns(new_dates)
+        with perf.phase('factor_returns', rows=len(results)):
+            update_factor_returns(results)
 
     if not args.dry_run:
-        update_risk_params()
+        with perf.phase('risk_params'):
+            update_risk_params()
 
     validate_new_data(new_dates)
+    perf.finish(rows=sum(len(df) for df in results.values()))
 
     logger.info("=" * 60)
     logger.info("Incremental update complete")
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Barra CNE5 因子数据流式验证 - 全量扫描by_date因子数据
+
+功能:
+    1. 按Arrow record batch流式读取每个日期分区 (by_date/{date}.parquet)
+    2. 单遍计算缺失值比例、3倍标准差异常值比例、因子矩 (均值/标准差/极值)
+    3. 统计每个交易日的股票覆盖率
+    4. 按日期分区多进程并行, 各分区的累加器可合并
+
+说明:
+    异常值按横截面口径统计: 每个日期分区内偏离当日均值超过3倍标准差的样本。
+    单个日期分区只有一个横截面 (约5000只股票), 内存占用有上限, 与历史长度无关。
+
+被 step5_validate.py 调用, 也可单独执行:
+    python streaming_validator.py [--parallel N]
+"""
+
+import argparse
+import json
+import logging
+import math
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pyarrow.parquet as pq
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+FACTOR_BY_DATE_DIR = DATA_ROOT / "barra_factors/by_date"
+
+# 因子列表
+STYLE_FACTORS = [
+    'size', 'beta', 'momentum', 'volatility', 'non_linear_size',
+    'book_to_price', 'liquidity', 'earnings_yield', 'growth', 'leverage'
+]
+
+# 异常值阈值 (倍标准差)
+OUTLIER_SIGMA = 3.0
+
+# 每批读取行数
+DEFAULT_BATCH_SIZE = 65536
+
+logger = logging.getLogger(__name__)
+
+
+class FactorMoments:
+    """
+    单个因子的可合并统计累加器
+
+    使用Chan等人的并行方差算法合并 (count, mean, M2), 数值稳定且与合并顺序无关。
+    """
+
+    __slots__ = ('total', 'missing', 'count', 'mean', 'm2', 'min', 'max', 'outliers')
+
+    def __init__(self):
+        self.total = 0        # 总样本数 (含缺失)
+        self.missing = 0      # 缺失值数 (NaN/None/inf)
+        self.count = 0        # 有效样本数
+        self.mean = 0.0
+        self.m2 = 0.0         # 离差平方和
+        self.min = math.inf
+        self.max = -math.inf
+        self.outliers = 0     # 横截面3倍标准差异常值数
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        用一批数据更新累加器
+
+        Args:
+            values: 因子值数组 (缺失值为NaN)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        valid = values[np.isfinite(values)]
+
+        self.total += len(values)
+        self.missing += len(values) - len(valid)
+
+        if len(valid) == 0:
+            return
+
+        batch = FactorMoments()
+        batch.count = len(valid)
+        batch.mean = float(valid.mean())
+        batch.m2 = float(((valid - batch.mean) ** 2).sum())
+        batch.min = float(valid.min())
+        batch.max = float(valid.max())
+        self._merge_moments(batch)
+
+    def merge(self, other: 'FactorMoments') -> 'FactorMoments':
+        """
+        合并另一个累加器 (原地修改并返回自身)
+
+        Args:
+            other: 另一个分区的累加器
+
+        Returns:
+            合并后的累加器
+        """
+        self.total += other.total
+        self.missing += other.missing
+        self.outliers += other.outliers
+        self._merge_moments(other)
+        return self
+
+    def _merge_moments(self, other: 'FactorMoments') -> None:
+        """合并有效样本的矩统计"""
+        if other.count == 0:
+            return
+
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean
+            self.m2 = other.m2
+        else:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+            self.count = count
+
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        """样本标准差 (ddof=1), 与pandas口径一致"""
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    @property
+    def missing_ratio(self) -> float:
+        """缺失值比例"""
+        return self.missing / self.total if self.total > 0 else 0.0
+
+    @property
+    def outlier_ratio(self) -> float:
+        """异常值比例 (相对总样本数)"""
+        return self.outliers / self.total if self.total > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        """转换为JSON友好的字典"""
+        return {
+            'samples': self.total,
+            'count': self.count,
+            'missing_ratio': self.missing_ratio,
+            'outlier_ratio': self.outlier_ratio,
+            'mean': self.mean if self.count > 0 else None,
+            'std': self.std if self.count > 0 else None,
+            'min': self.min if self.count > 0 else None,
+            'max': self.max if self.count > 0 else None
+        }
+
+
+def count_outliers(values: np.ndarray, moments: FactorMoments,
+                   sigma: float = OUTLIER_SIGMA) -> int:
+    """
+    统计偏离均值超过 sigma 倍标准差的样本数
+
+    Args:
+        values: 因子值数组
+        moments: 同一批数据的统计累加器
+        sigma: 标准差倍数
+
+    Returns:
+        异常值数量
+    """
+    std = moments.std
+    if moments.count < 2 or std <= 0:
+        return 0
+    valid = values[np.isfinite(values)]
+    return int((np.abs(valid - moments.mean) > sigma * std).sum())
+
+
+def scan_date_partition(file_path: Path,
+                        factors: Sequence[str] = STYLE_FACTORS,
+                        batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple[str, int, Dict[str, FactorMoments]]:
+    """
+    流式扫描单个日期分区
+
+    Args:
+        file_path: by_date因子文件路径
+        factors: 需要统计的因子列
+        batch_size: 每批读取行数
+
+    Returns:
+        (date_str, 股票数, {factor: FactorMoments})
+    """
+    file_path = Path(file_path)
+    parquet_file = pq.ParquetFile(file_path)
+    schema_names = set(parquet_file.schema_arrow.names)
+    columns = [f for f in factors if f in schema_names]
+
+    moments = {factor: FactorMoments() for factor in factors}
+    cross_section = {factor: [] for factor in columns}
+    n_rows = 0
+
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns or None):
+        n_rows += batch.num_rows
+        for factor in columns:
+            values = batch.column(factor).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+            moments[factor].update(values)
+            cross_section[factor].append(values)
+
+    # 文件中不存在的因子整列记为缺失
+    for factor in factors:
+        if factor not in cross_section:
+            moments[factor].total = n_rows
+            moments[factor].missing = n_rows
+
+    # 当日横截面异常值
+    for factor, chunks in cross_section.items():
+        if chunks:
+            values = np.concatenate(chunks)
+            moments[factor].outliers = count_outliers(values, moments[factor])
+
+    return file_path.stem, n_rows, moments
+
+
+def _scan_partition_task(args: Tuple) -> Tuple[str, int, Dict[str, FactorMoments]]:
+    """多进程任务包装 (模块级函数, 可pickle)"""
+    file_path, factors, batch_size = args
+    try:
+        return scan_date_partition(file_path, factors, batch_size)
+    except Exception:
+        logger.exception(f"扫描分区失败 {file_path}")
+        return Path(file_path).stem, -1, {}
+
+
+def scan_factor_dataset(date_files: List[Path],
+                        factors: Sequence[str] = STYLE_FACTORS,
+                        n_workers: int = 4,
+                        batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    全量扫描因子数据集并汇总统计
+
+    Args:
+        date_files: by_date因子文件列表
+        factors: 需要统计的因子列
+        n_workers: 并行进程数 (<=1 时串行)
+        batch_size: 每批读取行数
+
+    Returns:
+        {
+            'factors': {factor: FactorMoments} 全样本汇总,
+            'per_date': [{trade_date, stocks, coverage, factor_coverage}],
+            'failed': [date_str]
+        }
+    """
+    tasks = [(Path(f), list(factors), batch_size) for f in date_files]
+
+    if n_workers > 1 and len(tasks) > 1:
+        with Pool(processes=n_workers) as pool:
+            partitions = list(pool.imap_unordered(_scan_partition_task, tasks, chunksize=8))
+    else:
+        partitions = [_scan_partition_task(task) for task in tasks]
+
+    totals = {factor: FactorMoments() for factor in factors}
+    per_date = []
+    failed = []
+
+    # 按日期顺序合并, 保证结果可复现
+    for date_str, n_rows, moments in sorted(partitions, key=lambda p: p[0]):
+        if n_rows < 0:
+            failed.append(date_str)
+            continue
+
+        factor_coverage = {}
+        for factor in factors:
+            totals[factor].merge(moments[factor])
+            factor_coverage[factor] = moments[factor].count / n_rows if n_rows > 0 else 0.0
+
+        per_date.append({
+            'trade_date': date_str,
+            'stocks': n_rows,
+            'coverage': float(np.mean(list(factor_coverage.values()))) if factor_coverage else 0.0,
+            'factor_coverage': factor_coverage
+        })
+
+    return {'factors': totals, 'per_date': per_date, 'failed': failed}
+
+
+def summarize_scan(scan: Dict, min_coverage: float = 0.8) -> Dict:
+    """
+    将扫描结果汇总为验证报告格式
+
+    Args:
+        scan: scan_factor_dataset 的返回值
+        min_coverage: 低覆盖率日期阈值
+
+    Returns:
+        与 DataValidator.validation_results['quality'] 兼容的字典
+    """
+    factor_stats = {factor: m.to_dict() for factor, m in scan['factors'].items() if m.total > 0}
+    missing = [s['missing_ratio'] for s in factor_stats.values()]
+    outliers = [s['outlier_ratio'] for s in factor_stats.values()]
+
+    per_date = scan['per_date']
+    stocks = [d['stocks'] for d in per_date]
+    coverages = [d['coverage'] for d in per_date]
+
+    results = {
+        'missing_ratio': {},
+        'outlier_ratio': {},
+        'factor_stats': factor_stats,
+        'date_coverage': {},
+        'failed_dates': scan['failed']
+    }
+
+    if missing:
+        results['missing_ratio'] = {'mean': float(np.mean(missing)), 'max': float(np.max(missing))}
+    if outliers:
+        results['outlier_ratio'] = {'mean': float(np.mean(outliers)), 'max': float(np.max(outliers))}
+    if per_date:
+        results['date_coverage'] = {
+            'dates': len(per_date),
+            'min_stocks': int(np.min(stocks)),
+            'mean_stocks': float(np.mean(stocks)),
+            'max_stocks': int(np.max(stocks)),
+            'min_coverage': float(np.min(coverages)),
+            'mean_coverage': float(np.mean(coverages)),
+            'low_coverage_dates': [d['trade_date'] for d in per_date if d['coverage'] < min_coverage]
+        }
+
+    return results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="全量流式验证Barra因子数据")
+    parser.add_argument('--parallel', type=int, default=4, help='并行进程数')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批读取行数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    date_files = sorted(FACTOR_BY_DATE_DIR.glob("*.parquet"))
+    print(f"扫描 {len(date_files)} 个日期分区 (并行进程数: {args.parallel})...")
+
+    scan = scan_factor_dataset(date_files, STYLE_FACTORS, args.parallel, args.batch_size)
+    print(json.dumps(summarize_scan(scan), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
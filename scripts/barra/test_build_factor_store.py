@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+测试 build_factor_store.py 的内存映射因子存储
+
+验证股票/因子并集、缺失值为NaN以及重建时替换旧存储
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from build_factor_store import EXPOSURES_FILE, META_FILE, build_store
+
+
+def test_build_store():
+    """测试构建存储: 日期×股票×因子数组与by_date文件一致"""
+    with tempfile.TemporaryDirectory() as tmp:
+        factor_dir, store_dir = Path(tmp) / "by_date", Path(tmp) / "store"
+        factor_dir.mkdir()
+        pd.DataFrame({'ts_code': ['B', 'A'], 'size': [1.0, 2.0], 'beta': [0.5, np.nan]}) \
+            .to_parquet(factor_dir / "20240102.parquet", index=False)
+        pd.DataFrame({'ts_code': ['C', 'A'], 'size': [3.0, 4.0], 'beta': [0.1, 0.2],
+                      'momentum': [0.3, 0.4]}) \
+            .to_parquet(factor_dir / "20240103.parquet", index=False)
+
+        meta = build_store(factor_dir, store_dir, max_workers=2)
+        assert meta['dates'] == ['20240102', '20240103']
+        assert meta['ts_codes'] == ['A', 'B', 'C']
+        assert meta['factors'] == ['size', 'beta', 'momentum']
+
+        exposures = np.load(store_dir / EXPOSURES_FILE, mmap_mode='r')
+        assert exposures.shape == (2, 3, 3) and exposures.dtype == np.float32
+        assert exposures[0, 1, 0] == 1.0 and exposures[1, 0, 2] == np.float32(0.4)
+        assert np.isnan(exposures[0, 0, 1]) and np.isnan(exposures[0, 2]).all()
+        del exposures
+
+        # 重建后替换旧存储, 版本号变化
+        pd.DataFrame({'ts_code': ['A'], 'size': [5.0]}).to_parquet(factor_dir / "20240104.parquet", index=False)
+        new_meta = build_store(factor_dir, store_dir)
+        with open(store_dir / META_FILE) as f:
+            assert json.load(f)['version'] == new_meta['version'] != meta['version']
+        assert np.load(store_dir / EXPOSURES_FILE).shape == (3, 3, 3)
+        assert sorted(p.name for p in Path(tmp).iterdir()) == ['by_date', 'store']
+
+
+if __name__ == "__main__":
+    test_build_store()
+    print("✓ 所有测试通过")
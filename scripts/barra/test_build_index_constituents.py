@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+测试 build_index_constituents.py 的快照读取与区间表构建
+
+验证深市代码合并、进出成分股的区间边界以及最新名单输出
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from build_index_constituents import build_intervals, load_index_weights, save_constituents
+
+
+def _write_snapshot(root: Path, trade_date: str, rows) -> None:
+    path = root / f"date={trade_date}" / "data.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows, columns=['index_code', 'con_code', 'trade_date', 'weight']).to_parquet(path, index=False)
+
+
+def test_build_intervals():
+    """测试快照转区间: 调出的股票区间在下一快照结束, 最新快照区间不封闭"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "index_weight"
+        _write_snapshot(root, '20230103', [
+            ('000300.SH', 'A', '20230103', 0.6), ('000300.SH', 'B', '20230103', 0.4),
+            ('000905.SH', 'X', '20230103', 1.0), ('000016.SH', 'Z', '20230103', 1.0),
+        ])
+        _write_snapshot(root, '20230201', [
+            ('399300.SZ', 'A', '20230201', 0.5), ('399300.SZ', 'C', '20230201', 0.5),
+        ])
+        _write_snapshot(root, '20230301', [
+            ('000300.SH', 'A', '20230301', 0.7), ('000300.SH', 'C', '20230301', 0.3),
+        ])
+
+        weights = load_index_weights(['000300.SH', '000905.SH'], root, max_workers=2)
+        assert set(weights['index_code']) == {'000300.SH', '000905.SH'}
+
+        intervals = build_intervals(weights)
+        csi300 = intervals[intervals['index_code'] == '000300.SH']
+        b = csi300[csi300['ts_code'] == 'B'].iloc[0]
+        assert (b['in_date'], b['out_date']) == ('20230103', '20230201')
+        assert csi300[csi300['in_date'] == '20230301']['out_date'].isna().all()
+        assert len(csi300) == 6
+
+        counts = save_constituents(intervals, Path(tmp) / "config" / "index_constituents.parquet")
+        assert counts == {'000300.SH': 2, '000905.SH': 1}
+        assert (Path(tmp) / "config" / "csi300.txt").read_text().split() == ['A', 'C']
+
+
+if __name__ == "__main__":
+    test_build_intervals()
+    print("✓ 所有测试通过")
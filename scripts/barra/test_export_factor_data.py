@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+测试 export_factor_data.py 的LEAN自定义数据导出
+
+验证CSV格式 (列头 + 日期/股票行) 以及按修改时间的增量导出
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from export_factor_data import export_all
+
+
+def test_export_and_incremental():
+    """测试导出格式与增量导出"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        by_stock, by_date, lean = tmp / "by_stock", tmp / "by_date", tmp / "Data"
+        by_stock.mkdir()
+        by_date.mkdir()
+        pd.DataFrame({'trade_date': ['20240103', '20240102'], 'size': [1.5, 1.0], 'beta': [0.2, None],
+                      'pct_chg': [1.0, 2.0]}).to_parquet(by_stock / "000001.SZ.parquet", index=False)
+        pd.DataFrame({'ts_code': ['000002.SZ', '000001.SZ'], 'size': [2.0, 1.0], 'beta': [0.3, 0.1]}) \
+            .to_parquet(by_date / "20240102.parquet", index=False)
+
+        counts = export_all(by_stock, by_date, lean, max_workers=2)
+        assert counts == {'stocks': 1, 'dates': 1}
+
+        barra = lean / "alternative" / "barra"
+        assert (barra / "factors" / "000001.SZ.csv").read_text().splitlines() == [
+            'date,size,beta', '20240102,1,', '20240103,1.5,0.2'
+        ]
+        assert (barra / "universe" / "20240102.csv").read_text().splitlines() == [
+            'ts_code,size,beta', '000001.SZ,1,0.1', '000002.SZ,2,0.3'
+        ]
+
+        # 源文件未变化时不重写
+        assert export_all(by_stock, by_date, lean) == {'stocks': 0, 'dates': 0}
+
+        # 新增交易日只导出新文件
+        pd.DataFrame({'ts_code': ['000001.SZ'], 'size': [1.5], 'beta': [0.2]}) \
+            .to_parquet(by_date / "20240103.parquet", index=False)
+        assert export_all(by_stock, by_date, lean) == {'stocks': 0, 'dates': 1}
+        assert not [p for p in barra.rglob("*.tmp")]
+
+
+if __name__ == "__main__":
+    test_export_and_incremental()
+    print("✓ 所有测试通过")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试 instrumentation.py 的阶段埋点与运行对比
+
+验证JSON行记录的字段、子进程CPU时间统计以及最近两次运行的汇总
+"""
+
+import sys
+import tempfile
+from multiprocessing import Pool
+from pathlib import Path
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from instrumentation import PerfRecorder, load_perf_records, summarize_perf
+
+
+def _busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def test_phase_records_and_summary():
+    """测试阶段记录写入、并行阶段利用率以及两次运行的对比"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / "perf_metrics.jsonl"
+
+        for run_id in ['run1', 'run2']:
+            perf = PerfRecorder('step_test', log_file=log_file, run_id=run_id)
+            with perf.phase('write', rows=1000) as phase:
+                (Path(tmp) / "data.bin").write_bytes(b'\0' * 2**20)
+                phase['files'] = 1
+            with perf.phase('parallel', workers=2) as phase:
+                with Pool(processes=2) as pool:
+                    pool.map(_busy, [200000] * 4)
+                phase['rows'] = 4
+            perf.finish(rows=1000)
+
+        records = load_perf_records(log_file)
+        assert [r['phase'] for r in records] == ['write', 'parallel', 'total'] * 2
+        write = records[0]
+        assert write['run_id'] == 'run1' and write['files'] == 1
+        assert write['write_bytes'] >= 2**20
+        assert write['rows_per_s'] > 0
+        assert records[1]['children_cpu_s'] > 0
+        assert records[1]['worker_utilization'] is not None
+
+        summary = summarize_perf(records)
+        assert [(r['step'], r['phase']) for r in summary] == [
+            ('step_test', 'write'), ('step_test', 'parallel'), ('step_test', 'total')
+        ]
+        assert all(r['run_id'] == 'run2' and r['previous_wall_s'] is not None for r in summary)
+        assert all(r['wall_change'] is not None for r in summary)
+        # 本进程与子进程的字节数同为块设备口径, 汇总为两者之和
+        latest_write = records[3]
+        assert summary[0]['write_bytes'] == latest_write['write_bytes'] + latest_write['children_write_bytes']
+
+
+def test_failed_phase_is_recorded_but_not_summarized():
+    """测试失败阶段被记录为failed且不参与汇总"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / "perf_metrics.jsonl"
+        perf = PerfRecorder('step_test', log_file=log_file)
+        try:
+            with perf.phase('broken'):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+
+        records = load_perf_records(log_file)
+        assert records[0]['status'] == 'failed'
+        assert summarize_perf(records) == []
+
+
+if __name__ == "__main__":
+    test_phase_records_and_summary()
+    test_failed_phase_is_recorded_but_not_summarized()
+    print("✓ 所有测试通过")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+测试 report_charts.py 的图表磁盘缓存
+
+验证输入不变时命中缓存、输入变化时重新渲染, 以及缓存文件损坏时回退到渲染
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from report_charts import render_charts, render_specific_risk
+
+RENDER_CALLS = []
+
+
+def render_counted(specific_risk: np.ndarray) -> str:
+    """记录调用次数的渲染函数"""
+    RENDER_CALLS.append(1)
+    return render_specific_risk(specific_risk)
+
+
+def test_chart_cache():
+    """测试缓存命中、输入变化与损坏文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp) / "chart_cache"
+        risk = np.array([0.02, 0.03, 0.05])
+        RENDER_CALLS.clear()
+
+        charts, hits = render_charts({'specific_risk': (render_counted, {'specific_risk': risk})}, cache_dir, n_workers=1)
+        assert hits == 0 and len(RENDER_CALLS) == 1
+        first = charts['specific_risk']
+
+        # 输入不变: 直接读取缓存, 不重新渲染
+        charts, hits = render_charts({'specific_risk': (render_counted, {'specific_risk': risk.copy()})}, cache_dir, n_workers=1)
+        assert hits == 1 and len(RENDER_CALLS) == 1
+        assert charts['specific_risk'] == first
+
+        # 输入数组变化: 缓存未命中, 旧缓存文件被替换
+        changed = np.array([0.02, 0.03, 0.06])
+        charts, hits = render_charts({'specific_risk': (render_counted, {'specific_risk': changed})}, cache_dir, n_workers=1)
+        assert hits == 0 and len(RENDER_CALLS) == 2
+        cache_files = list(cache_dir.glob("specific_risk_*.b64"))
+        assert len(cache_files) == 1
+
+        # 缓存文件损坏: 回退到渲染并重写缓存
+        cache_files[0].write_text("not a png", encoding='utf-8')
+        charts, hits = render_charts({'specific_risk': (render_counted, {'specific_risk': changed})}, cache_dir, n_workers=1)
+        assert hits == 0 and len(RENDER_CALLS) == 3
+        assert charts['specific_risk'] != "not a png"
+        assert cache_files[0].read_text(encoding='utf-8') == charts['specific_risk']
+
+
+if __name__ == "__main__":
+    test_chart_cache()
+    print("✓ 所有测试通过")
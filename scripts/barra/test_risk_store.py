@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+测试 risk_store.py 的增量分区存储
+
+验证基础文件与增量分区合并后的结果, 以及合并回基础文件 (compact) 后结果不变
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from risk_store import (append_factor_returns, compact_store, list_increment_dates,
+                        load_factor_returns, load_residuals)
+
+FACTORS = ['size', 'beta']
+
+
+def _factor_returns(dates, value):
+    df = pd.DataFrame(value, index=range(len(dates)), columns=FACTORS)
+    df.insert(0, 'trade_date', pd.to_datetime(dates, format='%Y%m%d'))
+    return df
+
+
+def _residuals(dates, codes, value):
+    return pd.DataFrame([
+        {'trade_date': d, 'ts_code': c, 'residual': value} for d in dates for c in codes
+    ])
+
+
+def test_increments_override_base_and_compact():
+    """测试增量分区追加、同日期覆盖以及合并"""
+    with tempfile.TemporaryDirectory() as tmp:
+        risk_dir = Path(tmp)
+        base_dates = ['20240102', '20240103']
+        _factor_returns(base_dates, 0.0).to_parquet(risk_dir / "factor_returns.parquet", index=False)
+        _residuals(base_dates, ['A', 'B'], 0.0).to_parquet(risk_dir / "residuals.parquet", index=False)
+
+        # 新交易日, 以及对已有日期的重算
+        for date in ['20240104', '20240103']:
+            append_factor_returns(date, _factor_returns([date], 1.0),
+                                  _residuals([date], ['A', 'B', 'C'], 1.0), risk_dir)
+
+        assert list_increment_dates(risk_dir) == ['20240103', '20240104']
+
+        factor_returns = load_factor_returns(risk_dir)
+        assert factor_returns['trade_date'].dt.strftime('%Y%m%d').tolist() == ['20240102', '20240103', '20240104']
+        assert np.allclose(factor_returns['size'], [0.0, 1.0, 1.0])
+
+        residuals = load_residuals(risk_dir)
+        assert len(residuals) == 2 + 3 + 3
+        assert residuals.set_index(['trade_date', 'ts_code']).loc[('20240103', 'A'), 'residual'] == 1.0
+
+        assert compact_store(risk_dir) == 2
+        assert list_increment_dates(risk_dir) == []
+        pd.testing.assert_frame_equal(load_factor_returns(risk_dir), factor_returns)
+        assert len(load_residuals(risk_dir)) == len(residuals)
+
+
+if __name__ == "__main__":
+    test_increments_override_base_and_compact()
+    print("✓ 所有测试通过")
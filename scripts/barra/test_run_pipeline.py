@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试 run_pipeline.py 的分区指纹与执行计划
+
+使用临时目录中的合成行情文件, 验证修改单只股票后只有该股票被重新计算
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+import run_pipeline
+from run_pipeline import plan_step
+
+
+def _touch(path: Path, content: bytes = b'x') -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+def test_plan_only_changed_stock():
+    """测试首次全量、无变化跳过、单只股票变化时增量"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tushare_dir = Path(tmp) / "tushare_data"
+        run_pipeline.TUSHARE_DATA_DIR = tushare_dir
+        run_pipeline.BENCHMARK_FILE = Path(tmp) / "benchmark.parquet"
+
+        stocks = ['000001.SZ', '000002.SZ', '600000.SH']
+        for ts_code in stocks:
+            _touch(tushare_dir / "daily" / f"date={ts_code}" / "data.parquet")
+            _touch(tushare_dir / "daily_basic" / f"date={ts_code}" / "data.parquet")
+        _touch(tushare_dir / "stock_basic" / "data.parquet")
+
+        args = ['--parallel', '4']
+        first = plan_step('step1', None, args)
+        assert first['mode'] == 'full'
+        assert first['changed'] == sorted(stocks)
+
+        second = plan_step('step1', first, args)
+        assert second['mode'] == 'skip'
+
+        # 修正一只股票的数据 (大小变化)
+        _touch(tushare_dir / "daily_basic" / "date=000002.SZ" / "data.parquet", b'fixed')
+        third = plan_step('step1', first, args)
+        assert third['mode'] == 'partial'
+        assert third['changed'] == ['000002.SZ']
+
+        # 参数或共享输入变化时全量重跑
+        assert plan_step('step1', first, ['--parallel', '8'])['mode'] == 'full'
+        _touch(tushare_dir / "stock_basic" / "data.parquet", b'new industries')
+        assert plan_step('step1', first, args)['mode'] == 'full'
+
+
+def test_plan_non_partitioned_step():
+    """测试整体步骤在上游输出变化时重跑"""
+    with tempfile.TemporaryDirectory() as tmp:
+        risk_dir = Path(tmp)
+        run_pipeline.RISK_DIR = risk_dir
+        _touch(risk_dir / "factor_returns.parquet")
+        _touch(risk_dir / "residuals.parquet")
+
+        first = plan_step('step4', None, [])
+        assert first['mode'] == 'full'
+        assert plan_step('step4', first, [])['mode'] == 'skip'
+
+        _touch(risk_dir / "factor_returns_inc" / "20240105.parquet")
+        assert plan_step('step4', first, [])['mode'] == 'full'
+
+        # 内容大小不变、只有修改时间变化也视为变化
+        second = plan_step('step4', None, [])
+        stat = os.stat(risk_dir / "residuals.parquet")
+        os.utime(risk_dir / "residuals.parquet", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert plan_step('step4', second, [])['mode'] == 'full'
+
+
+if __name__ == "__main__":
+    test_plan_only_changed_stock()
+    test_plan_non_partitioned_step()
+    print("✓ 所有测试通过")
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+把按股票分目录的tushare数据压缩为少量大的列式Parquet文件
+
+原始布局 {table}/date={ts_code}/data.parquet 每只股票一个小文件, 读取全市场需要上千次文件打开。
+压缩后的布局:
+    {COMPACT_DIR}/{table}/part-00000.parquet ...   按 (ts_code, 排序键) 排序, 固定行组大小
+    {COMPACT_DIR}/{table}/_index.parquet          ts_code -> (part, row_start, row_end, max_key, row_hash)
+    {COMPACT_DIR}/{table}/_manifest.json          源文件指纹、分片列表、失效行数
+
+增量追加:
+    只处理指纹 (size:mtime) 变化的源文件。排序键不超过已索引最大值的行与索引一致时
+    (行数和行哈希之和都相同), 只把新增的行追加到新分片; 否则 (历史数据被修改)
+    整只股票重新追加, 旧行记为失效。
+    失效行占比或分片数超过阈值时自动全量重建。
+
+使用方法:
+    python compact_tushare.py                       # 增量更新默认表
+    python compact_tushare.py --tables daily --full  # 全量重建指定表
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 配置路径
+DATA_ROOT = Path("/home/project/ccleana/data")
+TUSHARE_DATA_DIR = DATA_ROOT / "tushare_data"
+COMPACT_DIR = DATA_ROOT / "tushare_compact"
+
+# 默认压缩的表
+DEFAULT_TABLES = ['daily', 'daily_basic', 'income', 'fina_indicator']
+
+# 每张表的排序键 (股票内排序, 也用于判断增量行)
+SORT_KEYS = {
+    'daily': 'trade_date',
+    'daily_basic': 'trade_date',
+    'adj_factor': 'trade_date',
+    'income': 'ann_date',
+    'fina_indicator': 'ann_date',
+}
+
+# 每个分片文件的目标行数 (按股票边界切分)
+ROWS_PER_PART = 2_000_000
+
+# 行组大小: 按股票读取时只需解码覆盖该股票行范围的行组
+ROW_GROUP_SIZE = 50_000
+
+# 触发全量重建的阈值
+MAX_DEAD_RATIO = 0.2
+MAX_PARTS = 64
+
+INDEX_FILE = "_index.parquet"
+MANIFEST_FILE = "_manifest.json"
+
+logger = logging.getLogger(__name__)
+
+
+def source_files(source_root: Path, table: str) -> Dict[str, Path]:
+    """
+    列出表的所有源文件
+
+    Returns:
+        {ts_code: data.parquet路径}
+    """
+    table_dir = Path(source_root) / table
+    if not table_dir.exists():
+        return {}
+    files = {}
+    for stock_dir in table_dir.iterdir():
+        if stock_dir.is_dir() and stock_dir.name.startswith('date='):
+            path = stock_dir / "data.parquet"
+            if path.exists():
+                files[stock_dir.name[len('date='):]] = path
+    return files
+
+
+def file_fingerprint(path: Path) -> str:
+    """文件指纹: size:mtime_ns"""
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def sort_key_for(table: str, columns: Iterable[str]) -> Optional[str]:
+    """表的排序键, 未配置时依次尝试 trade_date / ann_date / end_date"""
+    columns = list(columns)
+    key = SORT_KEYS.get(table)
+    if key in columns:
+        return key
+    for candidate in ('trade_date', 'ann_date', 'end_date'):
+        if candidate in columns:
+            return candidate
+    return None
+
+
+def read_source(path: Path, ts_code: str, sort_key: Optional[str]) -> pd.DataFrame:
+    """读取单只股票的源文件, 补充ts_code列并按排序键升序排列"""
+    df = pd.read_parquet(path)
+    if 'ts_code' not in df.columns:
+        df.insert(0, 'ts_code', ts_code)
+    if sort_key is not None and sort_key in df.columns:
+        df = df.sort_values(sort_key, kind='stable')
+    return df.reset_index(drop=True)
+
+
+def read_sources(files: Dict[str, Path], codes: Sequence[str], sort_key: Optional[str],
+                 max_workers: int) -> Iterator[pd.DataFrame]:
+    """
+    按codes顺序并发读取源文件
+
+    同时在途的读取不超过 max_workers * 2 个, 内存中最多保留这么多只股票的数据。
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for code in codes:
+            pending.append(executor.submit(read_source, files[code], code, sort_key))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def key_values(series: pd.Series) -> pd.Series:
+    """排序键的可比较值: 日期和数值保持原类型, 其余转为字符串; 空值保持为空"""
+    if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return series
+    return series.astype('string')
+
+
+def parse_key(value: str, keys: pd.Series) -> Any:
+    """把索引中保存的 max_key 字符串转换回 keys 的类型"""
+    if pd.api.types.is_datetime64_any_dtype(keys):
+        return pd.Timestamp(value)
+    if pd.api.types.is_numeric_dtype(keys):
+        return float(value)
+    return value
+
+
+def _max_key(df: pd.DataFrame, sort_key: Optional[str]) -> Optional[str]:
+    if sort_key is None or sort_key not in df.columns:
+        return None
+    keys = key_values(df[sort_key]).dropna()
+    return str(keys.max()) if len(keys) else None
+
+
+def row_hash(df: pd.DataFrame) -> int:
+    """
+    行哈希之和 (模 2^64, 以int64保存)
+
+    与行顺序无关且可相加, 同一股票多个索引条目的哈希之和可以直接与源数据的哈希比较。
+    """
+    if len(df) == 0:
+        return 0
+    total = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64).sum(dtype=np.uint64)
+    return int(np.uint64(total).astype(np.int64))
+
+
+def _sum_hashes(hashes: Iterable[int]) -> int:
+    total = np.array(list(hashes), dtype=np.int64).view(np.uint64).sum(dtype=np.uint64)
+    return int(np.uint64(total).astype(np.int64))
+
+
+class CompactTable:
+    """
+    单张表的压缩数据集
+
+    负责读写索引与清单、全量重建、增量追加以及按股票读取。
+    """
+
+    def __init__(self, table: str, compact_root: Path = COMPACT_DIR,
+                 source_root: Path = TUSHARE_DATA_DIR):
+        """
+        Args:
+            table: 表名
+            compact_root: 压缩数据根目录
+            source_root: tushare原始数据根目录
+        """
+        self.table = table
+        self.dir = Path(compact_root) / table
+        self.source_root = Path(source_root)
+        self.manifest = self._load_manifest()
+        self.index = self._load_index()
+
+    # ------------------------------------------------------------------
+    # 清单与索引
+    # ------------------------------------------------------------------
+
+    def _load_manifest(self) -> Dict:
+        path = self.dir / MANIFEST_FILE
+        if not path.exists():
+            return {'sources': {}, 'parts': [], 'next_part': 0, 'sort_key': None,
+                    'live_rows': 0, 'dead_rows': 0}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _load_index(self) -> pd.DataFrame:
+        path = self.dir / INDEX_FILE
+        if not path.exists():
+            return pd.DataFrame({'ts_code': pd.Series(dtype=str), 'part': pd.Series(dtype=str),
+                                 'row_start': pd.Series(dtype='int64'),
+                                 'row_end': pd.Series(dtype='int64'),
+                                 'max_key': pd.Series(dtype=str),
+                                 'row_hash': pd.Series(dtype='int64')})
+        return pd.read_parquet(path)
+
+    def _commit(self) -> None:
+        """原子写入索引和清单 (清单最后写, 作为提交点)"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.index = self.index.sort_values(['ts_code', 'part', 'row_start']).reset_index(drop=True)
+        tmp_index = self.dir / f"{INDEX_FILE}.tmp"
+        self.index.to_parquet(tmp_index, index=False)
+        os.replace(tmp_index, self.dir / INDEX_FILE)
+
+        tmp_manifest = self.dir / f"{MANIFEST_FILE}.tmp"
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_manifest, self.dir / MANIFEST_FILE)
+
+    @property
+    def exists(self) -> bool:
+        return (self.dir / MANIFEST_FILE).exists()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _new_part_name(self) -> str:
+        name = f"part-{self.manifest['next_part']:05d}.parquet"
+        self.manifest['next_part'] += 1
+        return name
+
+    def _write_part(self, frames: List[pd.DataFrame]) -> List[Dict]:
+        """
+        把若干股票的数据 (已按ts_code排序, 股票内按排序键排序) 写成一个分片
+
+        Returns:
+            新增的索引条目
+        """
+        name = self._new_part_name()
+        data = pd.concat(frames, ignore_index=True)
+        tmp_path = self.dir / f"{name}.tmp"
+        pq.write_table(pa.Table.from_pandas(data, preserve_index=False), tmp_path,
+                       row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_path, self.dir / name)
+        self.manifest['parts'].append(name)
+
+        entries = []
+        offset = 0
+        sort_key = self.manifest['sort_key']
+        for frame in frames:
+            entries.append({'ts_code': str(frame['ts_code'].iloc[0]), 'part': name,
+                            'row_start': offset, 'row_end': offset + len(frame),
+                            'max_key': _max_key(frame, sort_key),
+                            'row_hash': row_hash(frame)})
+            offset += len(frame)
+        return entries
+
+    def _write_stocks(self, frames: Iterable[pd.DataFrame]) -> List[Dict]:
+        """按 ROWS_PER_PART 在股票边界处切分并写出分片"""
+        entries = []
+        batch, batch_rows = [], 0
+        for frame in frames:
+            if len(frame) == 0:
+                continue
+            batch.append(frame)
+            batch_rows += len(frame)
+            if batch_rows >= ROWS_PER_PART:
+                entries.extend(self._write_part(batch))
+                batch, batch_rows = [], 0
+        if batch:
+            entries.extend(self._write_part(batch))
+        return entries
+
+    def rebuild(self, max_workers: int = 8) -> Dict:
+        """
+        全量重建: 读取所有源文件, 重写分片、索引和清单
+
+        Args:
+            max_workers: 并发读取源文件的线程数
+
+        Returns:
+            统计信息 {'stocks', 'rows', 'parts'}
+        """
+        files = source_files(self.source_root, self.table)
+        codes = sorted(files)
+        old_parts = list(self.manifest['parts'])
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        sort_key = None
+        if codes:
+            sort_key = sort_key_for(self.table, pq.read_schema(files[codes[0]]).names)
+        self.manifest = {'sources': {}, 'parts': [], 'next_part': self.manifest['next_part'],
+                         'sort_key': sort_key, 'live_rows': 0, 'dead_rows': 0}
+
+        entries = self._write_stocks(read_sources(files, codes, sort_key, max_workers))
+
+        self.manifest['sources'] = {code: file_fingerprint(files[code]) for code in codes}
+        self.index = pd.DataFrame(entries, columns=self.index.columns)
+        self.manifest['live_rows'] = int((self.index['row_end'] - self.index['row_start']).sum())
+        self._commit()
+
+        for name in old_parts:
+            (self.dir / name).unlink(missing_ok=True)
+
+        logger.info(f"{self.table}: 全量重建 {len(codes)} 只股票, "
+                    f"{self.manifest['live_rows']} 行, {len(self.manifest['parts'])} 个分片")
+        return {'stocks': len(codes), 'rows': self.manifest['live_rows'],
+                'parts': len(self.manifest['parts'])}
+
+    def update(self, max_workers: int = 8) -> Dict:
+        """
+        增量追加: 只处理指纹变化的源文件
+
+        Args:
+            max_workers: 并发读取源文件的线程数
+
+        Returns:
+            统计信息 {'changed', 'appended_rows', 'dead_rows', 'rebuilt'}
+        """
+        if not self.exists:
+            stats = self.rebuild(max_workers)
+            return {'changed': stats['stocks'], 'appended_rows': stats['rows'],
+                    'dead_rows': 0, 'rebuilt': True}
+
+        files = source_files(self.source_root, self.table)
+        sources = self.manifest['sources']
+        changed = sorted(code for code, path in files.items() if sources.get(code) != file_fingerprint(path))
+        removed = sorted(set(sources) - set(files))
+        sort_key = self.manifest['sort_key']
+
+        dead_codes = set(removed)
+        appends = []
+        by_code = self.index.groupby('ts_code')
+        for code, df in zip(changed, read_sources(files, changed, sort_key, max_workers)):
+            if code not in by_code.groups:
+                appends.append(df)
+                continue
+            entries = self.index.loc[by_code.groups[code]]
+            indexed_rows = int((entries['row_end'] - entries['row_start']).sum())
+
+            if sort_key is not None and sort_key in df.columns and entries['max_key'].notna().any():
+                keys = key_values(df[sort_key])
+                max_key = max(parse_key(value, keys) for value in entries['max_key'].dropna())
+                # 排序键为空的行无法排序, 视为历史行参与校验
+                newer = (keys > max_key).fillna(False).astype(bool)
+                old = df[~newer]
+                if len(old) == indexed_rows and row_hash(old) == _sum_hashes(entries['row_hash']):
+                    appends.append(df[newer])
+                    continue
+            # 历史行有变化: 整只股票重新追加
+            dead_codes.add(code)
+            appends.append(df)
+
+        dead_mask = self.index['ts_code'].isin(dead_codes)
+        dead_rows = int((self.index.loc[dead_mask, 'row_end'] - self.index.loc[dead_mask, 'row_start']).sum())
+        self.index = self.index[~dead_mask]
+
+        appended_rows = sum(len(df) for df in appends)
+        if appended_rows:
+            new_entries = self._write_stocks(df for df in appends if len(df) > 0)
+            self.index = pd.concat([self.index, pd.DataFrame(new_entries, columns=self.index.columns)],
+                                   ignore_index=True)
+
+        for code in changed:
+            sources[code] = file_fingerprint(files[code])
+        for code in removed:
+            sources.pop(code, None)
+        self.manifest['dead_rows'] += dead_rows
+        self.manifest['live_rows'] = int((self.index['row_end'] - self.index['row_start']).sum())
+
+        total = self.manifest['live_rows'] + self.manifest['dead_rows']
+        if (total and self.manifest['dead_rows'] / total > MAX_DEAD_RATIO) or \
+                len(self.manifest['parts']) > MAX_PARTS:
+            self._commit()
+            logger.info(f"{self.table}: 失效行 {self.manifest['dead_rows']}/{total}, "
+                        f"分片 {len(self.manifest['parts'])}, 触发全量重建")
+            self.rebuild(max_workers)
+            return {'changed': len(changed), 'appended_rows': appended_rows,
+                    'dead_rows': dead_rows, 'rebuilt': True}
+
+        self._commit()
+        logger.info(f"{self.table}: {len(changed)} 只股票有变化, 追加 {appended_rows} 行, "
+                    f"失效 {dead_rows} 行")
+        return {'changed': len(changed), 'appended_rows': appended_rows,
+                'dead_rows': dead_rows, 'rebuilt': False}
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def read(self, ts_codes: Optional[Sequence[str]] = None,
+             columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        按索引读取数据 (只解码覆盖所需行范围的行组, 跳过失效行)
+
+        Args:
+            ts_codes: 股票代码列表, None表示全部
+            columns: 读取的列, None表示全部
+
+        Returns:
+            按 (ts_code, 排序键) 排序的数据
+        """
+        index = self.index
+        if ts_codes is not None:
+            index = index[index['ts_code'].isin(list(ts_codes))]
+        if len(index) == 0:
+            return pd.DataFrame(columns=list(columns) if columns else None)
+
+        pieces = []
+        for part, entries in index.groupby('part', sort=False):
+            pf = pq.ParquetFile(self.dir / part)
+            bounds = [0]
+            for i in range(pf.metadata.num_row_groups):
+                bounds.append(bounds[-1] + pf.metadata.row_group(i).num_rows)
+
+            # 每个行范围覆盖的行组 [first, last]
+            ranges = sorted(zip(entries['row_start'].astype(int), entries['row_end'].astype(int)))
+            groups = sorted({g for start, end in ranges
+                             for g in range(bisect.bisect_right(bounds, start) - 1,
+                                            bisect.bisect_left(bounds, end))})
+            table = pf.read_row_groups(groups, columns=list(columns) if columns else None)
+
+            # 读取结果中每个行组的起始位置; 一个行范围覆盖的行组是连续读取的
+            group_offsets, offset = {}, 0
+            for g in groups:
+                group_offsets[g] = offset
+                offset += bounds[g + 1] - bounds[g]
+            for start, end in ranges:
+                g = bisect.bisect_right(bounds, start) - 1
+                pieces.append(table.slice(group_offsets[g] + start - bounds[g], end - start))
+
+        df = pa.concat_tables(pieces, promote_options='default').to_pandas()
+        sort_cols = [c for c in ('ts_code', self.manifest['sort_key']) if c and c in df.columns]
+        if sort_cols:
+            df = df.sort_values(sort_cols, kind='stable')
+        return df.reset_index(drop=True)
+
+
+def read_compact(table: str, ts_codes: Optional[Sequence[str]] = None,
+                 columns: Optional[Sequence[str]] = None,
+                 compact_root: Path = COMPACT_DIR) -> pd.DataFrame:
+    """
+    读取压缩后的表
+
+    Args:
+        table: 表名
+        ts_codes: 股票代码列表, None表示全部
+        columns: 读取的列
+        compact_root: 压缩数据根目录
+
+    Returns:
+        数据
+    """
+    return CompactTable(table, compact_root).read(ts_codes, columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩tushare分股票目录为列式数据集")
+    parser.add_argument('--tables', nargs='+', default=DEFAULT_TABLES, help='要压缩的表')
+    parser.add_argument('--source', type=Path, default=TUSHARE_DATA_DIR, help='tushare数据根目录')
+    parser.add_argument('--output', type=Path, default=COMPACT_DIR, help='压缩数据输出目录')
+    parser.add_argument('--full', action='store_true', help='全量重建')
+    parser.add_argument('--workers', type=int, default=8, help='并发读取线程数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    for table in args.tables:
+        compact = CompactTable(table, args.output, args.source)
+        if args.full:
+            stats = compact.rebuild(args.workers)
+        else:
+            stats = compact.update(args.workers)
+        logger.info(f"{table}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
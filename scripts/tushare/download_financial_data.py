@@ -2,37 +2,469 @@
 """
 下载Tushare财务数据用于Barra CNE5 Growth和Leverage因子计算
 
+功能:
+    1. 线程池并发下载 income / fina_indicator, 并发数有上限
+    2. 令牌桶限流, 按接口配额 (每分钟调用次数) 平滑发出请求
+    3. 失败请求指数退避重试
+    4. 检查点文件记录已完成的 (表, 股票), 中断后重跑自动续传
+    5. 增量模式: 记录每个 (表, 股票) 已有的最新 ann_date / end_date, 只请求之后公告的数据,
+       与已存数据按 (ts_code, end_date, update_flag) 去重合并
+
 使用方法:
-    python download_financial_data.py --token YOUR_TUSHARE_TOKEN
+    python download_financial_data.py --token YOUR_TUSHARE_TOKEN [--rate 200] [--workers 8] [--restart]
+    python download_financial_data.py --token YOUR_TUSHARE_TOKEN --incremental   # 每日增量更新
 
 注意: 需要Tushare积分权限才能下载财务数据
 """
 
 import argparse
+import json
 import logging
+import os
+import random
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
 
 import pandas as pd
-import tushare as ts
 from tqdm import tqdm
 
 # 配置路径
 DATA_ROOT = Path("/home/project/ccleana/data")
 TUSHARE_DATA_DIR = DATA_ROOT / "tushare_data"
+CHECKPOINT_DIR = TUSHARE_DATA_DIR / "_checkpoints"
+CHECKPOINT_FILE = CHECKPOINT_DIR / "financial_download.json"
+STATE_FILE = CHECKPOINT_DIR / "financial_state.json"
+INCREMENTAL_CHECKPOINT_FILE = CHECKPOINT_DIR / "financial_incremental.json"
+
+# 下载的财务数据表 (pro_api 接口名)
+FINANCIAL_TABLES = ['income', 'fina_indicator']
+
+# 合并去重键: 同一报告期的更正公告 update_flag 不同, 都保留
+DEDUP_KEYS = ['ts_code', 'end_date', 'update_flag']
+
+# 默认接口配额: 每分钟调用次数
+DEFAULT_RATE_PER_MINUTE = 200
+
+# 检查点每完成多少个任务写一次盘
+CHECKPOINT_INTERVAL = 50
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器
+
+    令牌以 rate_per_minute / 60 的速度补充, 桶容量为 burst。
+    每次接口调用前 acquire() 取一个令牌, 没有令牌时阻塞等待。
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        初始化限流器
+
+        Args:
+            rate_per_minute: 每分钟允许的调用次数
+            burst: 桶容量 (允许的瞬时突发调用数)
+            clock: 时钟函数 (测试时可替换)
+            sleep: 等待函数 (测试时可替换)
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        取一个令牌 (必要时阻塞)
+
+        Returns:
+            本次等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                wait = (1.0 - self.tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+class DownloadCheckpoint:
+    """
+    下载检查点: 记录已完成的 (表, 股票)
+
+    文件格式: {"completed": {table: [ts_code, ...]}}, 原子写入。
+    """
+
+    def __init__(self, path: Path, interval: int = CHECKPOINT_INTERVAL):
+        """
+        初始化检查点 (文件存在时加载)
+
+        Args:
+            path: 检查点文件路径
+            interval: 每完成多少个任务写一次盘
+        """
+        self.path = Path(path)
+        self.interval = interval
+        self.completed: Dict[str, set] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.completed = {table: set(codes) for table, codes in data.get('completed', {}).items()}
+
+    def is_done(self, table: str, ts_code: str) -> bool:
+        """是否已完成"""
+        return ts_code in self.completed.get(table, ())
+
+    def mark_done(self, table: str, ts_code: str) -> None:
+        """标记完成, 达到写盘间隔时保存"""
+        with self._lock:
+            self.completed.setdefault(table, set()).add(ts_code)
+            self._pending += 1
+            if self._pending >= self.interval:
+                self._save_locked()
+
+    def save(self) -> None:
+        """立即保存"""
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'completed': {t: sorted(c) for t, c in self.completed.items()}}, f)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+
+    def clear(self) -> None:
+        """清空检查点 (重新开始完整下载)"""
+        with self._lock:
+            self.completed = {}
+            self._pending = 0
+            if self.path.exists():
+                self.path.unlink()
+
+
+class FetchState:
+    """
+    增量下载状态: 每个 (表, 股票) 已存数据的最新公告日期和报告期
+
+    文件格式: {table: {ts_code: {"ann_date": "YYYYMMDD", "end_date": "YYYYMMDD"}}}, 原子写入。
+    状态缺失时从已存的parquet文件推断。
+    """
+
+    def __init__(self, path: Path, output_root: Path = TUSHARE_DATA_DIR):
+        """
+        初始化状态 (文件存在时加载)
+
+        Args:
+            path: 状态文件路径
+            output_root: tushare数据根目录 (用于推断缺失的状态)
+        """
+        self.path = Path(path)
+        self.output_root = Path(output_root)
+        self.state: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def get(self, table: str, ts_code: str) -> Optional[Dict[str, str]]:
+        """
+        获取 (表, 股票) 的最新日期
+
+        Returns:
+            {'ann_date', 'end_date'}, 没有已存数据时返回None
+        """
+        with self._lock:
+            entry = self.state.get(table, {}).get(ts_code)
+        if entry is not None:
+            return entry
+
+        existing = read_stored(self.output_root, table, ts_code)
+        if existing is None:
+            return None
+        self.update(table, ts_code, existing)
+        return self.get(table, ts_code)
+
+    def update(self, table: str, ts_code: str, df: pd.DataFrame) -> None:
+        """用合并后的数据更新最新日期"""
+        entry = {}
+        for column in ('ann_date', 'end_date'):
+            if column in df.columns and df[column].notna().any():
+                entry[column] = str(df[column].dropna().astype(str).max())
+        if not entry:
+            return
+        with self._lock:
+            self.state.setdefault(table, {})[ts_code] = entry
+
+    def save(self) -> None:
+        """保存状态文件"""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+
+
+def read_stored(output_root: Path, table: str, ts_code: str) -> Optional[pd.DataFrame]:
+    """读取已存的单只股票表数据, 不存在返回None"""
+    path = Path(output_root) / table / f"date={ts_code}" / "data.parquet"
+    if not path.exists():
+        return None
+    return pd.read_parquet(path)
+
+
+def merge_statements(existing: Optional[pd.DataFrame], new: pd.DataFrame) -> pd.DataFrame:
+    """
+    合并已存数据与新下载的数据
+
+    按 (ts_code, end_date, update_flag) 去重, 新数据优先; 表中没有的键列不参与去重。
+    结果按 end_date、ann_date 降序排列 (与接口返回顺序一致)。
+
+    Args:
+        existing: 已存数据 (None表示没有)
+        new: 新下载的数据
+
+    Returns:
+        合并后的数据
+    """
+    if existing is None or len(existing) == 0:
+        merged = new
+    elif new is None or len(new) == 0:
+        return existing
+    else:
+        merged = pd.concat([existing, new], ignore_index=True)
+
+    keys = [k for k in DEDUP_KEYS if k in merged.columns]
+    if keys:
+        merged = merged.drop_duplicates(subset=keys, keep='last')
+
+    sort_cols = [c for c in ('end_date', 'ann_date') if c in merged.columns]
+    if sort_cols:
+        merged = merged.sort_values(sort_cols, ascending=False)
+    return merged.reset_index(drop=True)
+
+
+def call_with_retry(func: Callable[..., pd.DataFrame], limiter: TokenBucket,
+                    max_retries: int = 3, backoff: float = 2.0,
+                    sleep: Callable[[float], None] = time.sleep, **kwargs) -> pd.DataFrame:
+    """
+    限流调用接口, 失败后指数退避重试
+
+    Args:
+        func: pro_api 接口方法 (如 pro.income)
+        limiter: 令牌桶限流器
+        max_retries: 最大重试次数
+        backoff: 首次重试等待秒数 (之后每次翻倍, 加随机抖动)
+        sleep: 等待函数 (测试时可替换)
+        **kwargs: 接口参数
+
+    Returns:
+        接口返回的DataFrame
+
+    Raises:
+        最后一次调用的异常
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            return func(**kwargs)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1.0 + random.random() * 0.25)
+            logger.warning(f"{getattr(func, '__name__', 'api')}({kwargs}) 失败: {e}, {delay:.1f}s 后重试")
+            sleep(delay)
+
+
+def write_table(df: pd.DataFrame, output_root: Path, table: str, ts_code: str) -> Path:
+    """
+    原子写入单只股票的表数据 (保持 {table}/date={ts_code}/data.parquet 布局)
+
+    Args:
+        df: 数据
+        output_root: tushare数据根目录
+        table: 表名
+        ts_code: 股票代码
+
+    Returns:
+        输出文件路径
+    """
+    output_dir = output_root / table / f"date={ts_code}"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / "data.parquet"
+    tmp_path = output_dir / f"data.{threading.get_ident()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def download_stock(pro, ts_code: str, tables: Sequence[str], limiter: TokenBucket,
+                   checkpoint: DownloadCheckpoint, output_root: Path,
+                   max_retries: int = 3, backoff: float = 2.0,
+                   state: Optional[FetchState] = None) -> Dict[str, int]:
+    """
+    下载单只股票的所有财务表 (已在检查点中的表跳过)
+
+    增量模式 (state不为None) 下只请求最新 ann_date 之后 (含当天) 公告的数据并与已存数据合并;
+    没有已存数据的 (表, 股票) 下载全部历史。
+
+    Args:
+        pro: tushare pro_api 对象 (或提供同名方法的桩对象)
+        ts_code: 股票代码
+        tables: 表名列表
+        limiter: 令牌桶限流器
+        checkpoint: 下载检查点
+        output_root: tushare数据根目录
+        max_retries: 最大重试次数
+        backoff: 首次重试等待秒数
+        state: 增量下载状态, None表示全量下载
+
+    Returns:
+        {table: 新下载的行数}, 失败的表为 -1
+    """
+    rows = {}
+    for table in tables:
+        if checkpoint.is_done(table, ts_code):
+            continue
+
+        params = {'ts_code': ts_code}
+        latest = state.get(table, ts_code) if state is not None else None
+        if latest is not None and 'ann_date' in latest:
+            # 含当天: 同一天的更正公告也会被取回, 合并时去重
+            params['start_date'] = latest['ann_date']
+
+        try:
+            df = call_with_retry(getattr(pro, table), limiter, max_retries, backoff, **params)
+        except Exception as e:
+            logger.error(f"Error downloading {table} {ts_code}: {e}")
+            rows[table] = -1
+            continue
+
+        rows[table] = 0 if df is None else len(df)
+        if rows[table] > 0:
+            if latest is not None:
+                df = merge_statements(read_stored(output_root, table, ts_code), df)
+            write_table(df, output_root, table, ts_code)
+            if state is not None:
+                state.update(table, ts_code, df)
+        # 空结果也记为完成, 续传时不再请求
+        checkpoint.mark_done(table, ts_code)
+    return rows
+
+
+def download_financial_data(pro, stock_list: List[str], tables: Sequence[str] = FINANCIAL_TABLES,
+                            output_root: Path = TUSHARE_DATA_DIR,
+                            checkpoint_path: Path = CHECKPOINT_FILE,
+                            rate_per_minute: float = DEFAULT_RATE_PER_MINUTE,
+                            max_workers: int = 8, max_retries: int = 3, backoff: float = 2.0,
+                            restart: bool = False, limiter: Optional[TokenBucket] = None,
+                            state_path: Optional[Path] = None) -> Dict:
+    """
+    并发下载所有股票的财务数据
+
+    指定 state_path 时为增量模式: 每个 (表, 股票) 只请求最新公告日期之后的数据。
+    增量模式下全部请求成功后删除检查点, 下一次运行重新请求所有股票;
+    有失败时保留检查点, 重新运行只续传未完成的部分。
+
+    Args:
+        pro: tushare pro_api 对象
+        stock_list: 股票代码列表
+        tables: 表名列表
+        output_root: tushare数据根目录
+        checkpoint_path: 检查点文件路径
+        rate_per_minute: 接口配额 (每分钟调用次数)
+        max_workers: 最大并发线程数
+        max_retries: 最大重试次数
+        backoff: 首次重试等待秒数
+        restart: 忽略已有检查点, 重新下载
+        limiter: 自定义限流器 (默认按 rate_per_minute 创建)
+        state_path: 增量状态文件路径, None表示全量下载
+
+    Returns:
+        {'stocks', 'requests', 'rows', 'failed': [(table, ts_code)], 'skipped', 'elapsed'}
+    """
+    checkpoint = DownloadCheckpoint(checkpoint_path)
+    if restart:
+        checkpoint.clear()
+
+    todo = [code for code in stock_list if not all(checkpoint.is_done(t, code) for t in tables)]
+    skipped = len(stock_list) - len(todo)
+    if skipped:
+        logger.info(f"检查点中已完成 {skipped} 只股票, 续传剩余 {len(todo)} 只")
+
+    # 突发容量不超过并发数, 避免启动瞬间超出配额
+    limiter = limiter or TokenBucket(rate_per_minute, burst=max_workers)
+    state = FetchState(state_path, output_root) if state_path is not None else None
+
+    summary = {'stocks': len(todo), 'requests': 0, 'rows': 0, 'failed': [], 'skipped': skipped}
+    start = time.time()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(download_stock, pro, code, tables, limiter, checkpoint,
+                                Path(output_root), max_retries, backoff, state): code
+                for code in todo
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="下载财务数据"):
+                code = futures[future]
+                for table, n_rows in future.result().items():
+                    summary['requests'] += 1
+                    if n_rows < 0:
+                        summary['failed'].append((table, code))
+                    else:
+                        summary['rows'] += n_rows
+    finally:
+        checkpoint.save()
+        if state is not None:
+            state.save()
+
+    if state is not None and not summary['failed']:
+        checkpoint.clear()
+
+    summary['elapsed'] = time.time() - start
+    return summary
+
+
 def main():
     parser = argparse.ArgumentParser(description="下载Tushare财务数据")
     parser.add_argument('--token', type=str, required=True, help='Tushare API token')
     parser.add_argument('--limit', type=int, help='限制下载数量（测试用）')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE_PER_MINUTE, help='接口配额: 每分钟调用次数')
+    parser.add_argument('--workers', type=int, default=8, help='最大并发线程数')
+    parser.add_argument('--retries', type=int, default=3, help='失败重试次数')
+    parser.add_argument('--restart', action='store_true', help='忽略检查点, 重新下载全部')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式: 只下载最新公告日期之后的数据并合并')
     args = parser.parse_args()
 
+    import tushare as ts
+
     # 初始化Tushare
     ts.set_token(args.token)
     pro = ts.pro_api()
@@ -45,36 +477,31 @@ def main():
     if args.limit:
         stock_list = stock_list[:args.limit]
 
-    logger.info(f"Downloading financial data for {len(stock_list)} stocks...")
-
-    # 创建目录
-    for subdir in ['income', 'fina_indicator', 'balancesheet']:
-        (TUSHARE_DATA_DIR / subdir).mkdir(parents=True, exist_ok=True)
+    logger.info(f"Downloading financial data for {len(stock_list)} stocks "
+                f"(rate={args.rate:.0f}/min, workers={args.workers})...")
 
-    # 下载数据
-    for ts_code in tqdm(stock_list):
-        try:
-            # 下载利润表
-            df_income = pro.income(ts_code=ts_code)
-            if len(df_income) > 0:
-                output_dir = TUSHARE_DATA_DIR / "income" / f"date={ts_code}"
-                output_dir.mkdir(parents=True, exist_ok=True)
-                df_income.to_parquet(output_dir / "data.parquet", index=False)
-
-            # 下载财务指标
-            df_fina = pro.fina_indicator(ts_code=ts_code)
-            if len(df_fina) > 0:
-                output_dir = TUSHARE_DATA_DIR / "fina_indicator" / f"date={ts_code}"
-                output_dir.mkdir(parents=True, exist_ok=True)
-                df_fina.to_parquet(output_dir / "data.parquet", index=False)
-
-            # API限流
-            time.sleep(0.3)
+    if args.incremental:
+        checkpoint_path = INCREMENTAL_CHECKPOINT_FILE
+        state_path = STATE_FILE
+    else:
+        checkpoint_path = CHECKPOINT_FILE
+        state_path = None
 
-        except Exception as e:
-            logger.error(f"Error downloading {ts_code}: {e}")
+    summary = download_financial_data(
+        pro, stock_list,
+        checkpoint_path=checkpoint_path,
+        rate_per_minute=args.rate,
+        max_workers=args.workers,
+        max_retries=args.retries,
+        restart=args.restart,
+        state_path=state_path
+    )
 
-    logger.info("Download complete!")
+    logger.info(f"Download complete! {summary['requests']} requests, {summary['rows']} rows, "
+                f"{summary['elapsed']:.0f}s")
+    if summary['failed']:
+        logger.warning(f"{len(summary['failed'])} 个请求失败, 重新运行将只下载失败部分")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
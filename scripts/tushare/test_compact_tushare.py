@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+测试 compact_tushare.py 的全量压缩、按股票读取与增量追加
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+import compact_tushare
+from compact_tushare import CompactTable, read_compact
+
+
+def _write_stock(root: Path, table: str, ts_code: str, dates, close=1.0) -> None:
+    path = root / table / f"date={ts_code}" / "data.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = pd.DataFrame({'ts_code': ts_code, 'trade_date': list(dates), 'close': close})
+    # 接口返回为日期降序
+    df.iloc[::-1].to_parquet(path, index=False)
+    # 保证mtime变化被指纹识别
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def _dates(start, n):
+    return [d.strftime('%Y%m%d') for d in pd.bdate_range(start, periods=n)]
+
+
+def test_rebuild_and_read():
+    """测试全量压缩: 分片与行组切分, 按股票只读取所需行组"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = Path(tmp) / "src", Path(tmp) / "out"
+        codes = [f"{i:06d}.SZ" for i in range(12)]
+        for code in codes:
+            _write_stock(source, 'daily', code, _dates('2023-01-02', 30))
+
+        old_rows, old_group = compact_tushare.ROWS_PER_PART, compact_tushare.ROW_GROUP_SIZE
+        compact_tushare.ROWS_PER_PART, compact_tushare.ROW_GROUP_SIZE = 100, 7
+        try:
+            stats = CompactTable('daily', output, source).rebuild(max_workers=4)
+        finally:
+            compact_tushare.ROWS_PER_PART, compact_tushare.ROW_GROUP_SIZE = old_rows, old_group
+
+        assert stats == {'stocks': 12, 'rows': 360, 'parts': 3}
+        df = read_compact('daily', ['000005.SZ', '000011.SZ'], compact_root=output)
+        assert df['ts_code'].unique().tolist() == ['000005.SZ', '000011.SZ']
+        assert df.groupby('ts_code')['trade_date'].apply(lambda s: s.is_monotonic_increasing).all()
+        assert len(df) == 60
+
+        full = read_compact('daily', compact_root=output)
+        assert len(full) == 360 and full['ts_code'].is_monotonic_increasing
+
+
+def test_incremental_append_and_rewrite():
+    """测试增量追加: 新交易日只追加新行, 历史修改整只股票重写, 新股票直接追加"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = Path(tmp) / "src", Path(tmp) / "out"
+        codes = [f"{i:06d}.SZ" for i in range(1, 11)]
+        for code in codes:
+            _write_stock(source, 'daily', code, _dates('2023-01-02', 20))
+        CompactTable('daily', output, source).update()
+
+        _write_stock(source, 'daily', '000001.SZ', _dates('2023-01-02', 22))
+        _write_stock(source, 'daily', '000002.SZ', _dates('2023-01-02', 20), close=2.0)
+        _write_stock(source, 'daily', '000099.SZ', _dates('2023-01-02', 5))
+
+        stats = CompactTable('daily', output, source).update()
+        assert stats == {'changed': 3, 'appended_rows': 2 + 20 + 5, 'dead_rows': 20, 'rebuilt': False}
+
+        df = read_compact('daily', compact_root=output)
+        sizes = df.groupby('ts_code').size()
+        assert sizes['000001.SZ'] == 22 and sizes['000002.SZ'] == 20 and sizes['000099.SZ'] == 5
+        assert len(df) == 207
+        assert (df.loc[df['ts_code'] == '000002.SZ', 'close'] == 2.0).all()
+        assert df.loc[df['ts_code'] == '000001.SZ', 'trade_date'].is_monotonic_increasing
+
+        # 未变化时不追加
+        stats = CompactTable('daily', output, source).update()
+        assert stats['changed'] == 0 and stats['appended_rows'] == 0
+
+        # 失效行超过阈值后自动重建, 旧分片被删除
+        for code in codes[2:5]:
+            _write_stock(source, 'daily', code, _dates('2023-01-02', 20), close=3.0)
+        stats = CompactTable('daily', output, source).update()
+        assert stats['rebuilt']
+        table = CompactTable('daily', output, source)
+        assert table.manifest['dead_rows'] == 0
+        assert sorted(p.name for p in (output / 'daily').glob('part-*.parquet')) == table.manifest['parts']
+        assert len(table.read()) == 207
+
+
+def test_incremental_with_null_keys():
+    """测试排序键为空的行: 视为历史行, 新公告只追加新行而不是重写整只股票"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = Path(tmp) / "src", Path(tmp) / "out"
+        path = source / 'income' / "date=000001.SZ" / "data.parquet"
+        path.parent.mkdir(parents=True)
+
+        old = pd.DataFrame({'ts_code': '000001.SZ', 'ann_date': ['20230830', None, '20231030'],
+                            'end_date': ['20230630', '20221231', '20230930'], 'value': [1.0, 2.0, 3.0]})
+        old.to_parquet(path, index=False)
+        CompactTable('income', output, source).update(max_workers=1)
+        assert CompactTable('income', output, source).index['max_key'].tolist() == ['20231030']
+
+        new = pd.concat([old, pd.DataFrame({'ts_code': ['000001.SZ'], 'ann_date': ['20240330'],
+                                            'end_date': ['20231231'], 'value': [4.0]})])
+        new.to_parquet(path, index=False)
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        stats = CompactTable('income', output, source).update(max_workers=1)
+        assert stats == {'changed': 1, 'appended_rows': 1, 'dead_rows': 0, 'rebuilt': False}
+        df = read_compact('income', compact_root=output)
+        assert sorted(df['value'].tolist()) == [1.0, 2.0, 3.0, 4.0]
+
+
+if __name__ == "__main__":
+    test_rebuild_and_read()
+    test_incremental_append_and_rewrite()
+    test_incremental_with_null_keys()
+    print("✓ 所有测试通过")
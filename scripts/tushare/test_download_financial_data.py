@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+测试 download_financial_data.py 的并发下载、限流、重试与续传
+
+使用本地桩对象代替 tushare pro_api, 不需要网络和token
+"""
+
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# 添加脚本路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from download_financial_data import TokenBucket, download_financial_data, merge_statements
+
+
+class StubProApi:
+    """模拟 pro_api: 按股票返回固定数据, 可让指定股票前几次调用失败"""
+
+    def __init__(self, failures=None, records=None):
+        self.failures = dict(failures or {})
+        # 公告记录 [(ann_date, end_date, update_flag, value)], 按 start_date 过滤
+        self.records = records
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _query(self, table, ts_code, start_date=None):
+        with self._lock:
+            self.calls.append((table, ts_code) if start_date is None else (table, ts_code, start_date))
+            if self.failures.get((table, ts_code), 0) > 0:
+                self.failures[(table, ts_code)] -= 1
+                raise RuntimeError("抱歉，您每分钟最多访问该接口200次")
+        if self.records is None:
+            return pd.DataFrame({'ts_code': [ts_code] * 2, 'end_date': ['20231231', '20230930'],
+                                 'table': [table] * 2})
+        rows = [r for r in self.records if start_date is None or r[0] >= start_date]
+        return pd.DataFrame(rows, columns=['ann_date', 'end_date', 'update_flag', 'value']).assign(ts_code=ts_code)
+
+    def income(self, ts_code, start_date=None):
+        return self._query('income', ts_code, start_date)
+
+    def fina_indicator(self, ts_code, start_date=None):
+        return self._query('fina_indicator', ts_code, start_date)
+
+
+class FakeClock:
+    """可控时钟: sleep 只推进时间"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_rate():
+    """测试令牌桶: 突发容量用完后按配额速率放行"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_minute=120, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(2 + 10):
+        bucket.acquire()
+    # 2次突发 + 10次按 2次/秒 放行
+    assert abs(clock.now - 5.0) < 1e-9
+
+
+def test_download_retry_and_resume():
+    """测试并发下载、失败重试以及中断后续传"""
+    stocks = [f"{i:06d}.SZ" for i in range(20)]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        checkpoint = root / "checkpoint.json"
+
+        # 第一次: 一个请求可重试成功, 一个请求始终失败
+        pro = StubProApi(failures={('income', stocks[3]): 1, ('fina_indicator', stocks[5]): 99})
+        summary = download_financial_data(pro, stocks, output_root=root, checkpoint_path=checkpoint,
+                                          rate_per_minute=60000, max_workers=4, max_retries=2, backoff=0.0)
+        assert summary['failed'] == [('fina_indicator', stocks[5])]
+        assert summary['rows'] == 2 * (2 * len(stocks) - 1)
+        assert (root / "income" / f"date={stocks[3]}" / "data.parquet").exists()
+        assert not (root / "fina_indicator" / f"date={stocks[5]}").exists()
+        assert not (root / "balancesheet").exists()
+
+        # 第二次: 只请求上次失败的部分
+        pro = StubProApi()
+        summary = download_financial_data(pro, stocks, output_root=root, checkpoint_path=checkpoint,
+                                          rate_per_minute=60000, max_workers=4, backoff=0.0)
+        assert pro.calls == [('fina_indicator', stocks[5])]
+        assert summary['skipped'] == len(stocks) - 1 and summary['failed'] == []
+
+        df = pd.read_parquet(root / "fina_indicator" / f"date={stocks[5]}" / "data.parquet")
+        assert df['ts_code'].tolist() == [stocks[5]] * 2
+
+
+def test_merge_statements_dedup():
+    """测试合并去重: 同键新数据优先, 更正公告 (update_flag不同) 保留"""
+    existing = pd.DataFrame({'ts_code': ['A'] * 2, 'end_date': ['20230930', '20230630'],
+                             'ann_date': ['20231030', '20230830'], 'update_flag': ['0', '0'],
+                             'value': [1.0, 2.0]})
+    new = pd.DataFrame({'ts_code': ['A'] * 3, 'end_date': ['20231231', '20230930', '20230930'],
+                        'ann_date': ['20240330', '20231030', '20240330'], 'update_flag': ['0', '0', '1'],
+                        'value': [3.0, 1.5, 1.6]})
+    merged = merge_statements(existing, new)
+    assert merged['end_date'].tolist() == ['20231231', '20230930', '20230930', '20230630']
+    assert merged.loc[(merged['end_date'] == '20230930') & (merged['update_flag'] == '0'), 'value'].item() == 1.5
+    assert len(merged) == 4
+
+
+def test_incremental_download():
+    """测试增量下载: 只请求最新公告日期之后的数据, 与已存数据合并"""
+    stocks = ['000001.SZ', '000002.SZ']
+    old = [('20231030', '20230930', '0', 1.0), ('20230830', '20230630', '0', 2.0)]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        state_file = root / "state.json"
+        checkpoint = root / "incremental.json"
+        kwargs = dict(tables=['income'], output_root=root, checkpoint_path=checkpoint,
+                      rate_per_minute=60000, max_workers=2, backoff=0.0, state_path=state_file)
+
+        # 首次: 没有状态, 下载全部历史
+        pro = StubProApi(records=old)
+        download_financial_data(pro, stocks, **kwargs)
+        assert sorted(pro.calls) == [('income', code) for code in stocks]
+        # 全部成功后删除检查点, 次日重新请求所有股票
+        assert not checkpoint.exists()
+
+        # 次日: 新增年报与一条更正公告, 只请求 ann_date >= 20231030 的数据
+        new = old + [('20240330', '20231231', '0', 3.0), ('20240330', '20230930', '1', 1.1)]
+        pro = StubProApi(records=new)
+        summary = download_financial_data(pro, stocks, **kwargs)
+        assert sorted(pro.calls) == [('income', code, '20231030') for code in stocks]
+        assert summary['rows'] == 3 * len(stocks)
+
+        df = pd.read_parquet(root / "income" / f"date={stocks[0]}" / "data.parquet")
+        assert len(df) == 4
+        assert df['end_date'].tolist()[0] == '20231231'
+
+        # 删除状态文件后从已存数据推断最新公告日期
+        state_file.unlink()
+        pro = StubProApi(records=new)
+        download_financial_data(pro, stocks, **kwargs)
+        assert sorted(pro.calls) == [('income', code, '20240330') for code in stocks]
+
+
+if __name__ == "__main__":
+    test_token_bucket_rate()
+    test_download_retry_and_resume()
+    test_merge_statements_dedup()
+    test_incremental_download()
+    print("✓ 所有测试通过")